@@ -0,0 +1,101 @@
+"""Latency benchmark of /book/search against a LIKE '%x%' scan.
+
+Samples words of book titles and author last names from the catalog, makes every other query a typo (one dropped or
+swapped letter) and runs each query through AsyncBookRepository.search_books, as the API does, and through the LIKE
+baseline it replaces. Reports p50/p95 latency and how many queries found the book or author they were sampled from.
+Needs the database configured through the usual db_* variables and seeded with a large catalog, e.g.
+
+    bookz-datagen --scale-factor 100 --seed 42 --load --reset
+    python benchmarks/book_search.py --queries 200 --limit 20
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from sqlalchemy import select, or_, func
+from bookz import db
+from bookz.repositories.orm_models import Author, Book, BookAuthor
+from bookz.repositories.async_repository import AsyncBookRepository
+
+
+def typo(word: str, rng: random.Random) -> str:
+    if len(word) < 5:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    if rng.random() < 0.5:
+        return word[:i] + word[i + 1:]
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+async def sample_queries(session, count: int, rng: random.Random) -> list[tuple[str, int]]:
+    titles = (await session.execute(select(Book.book_id, Book.title).order_by(func.random()).limit(count))).all()
+    authors = (await session.execute(select(BookAuthor.book_id, Author.last_name)
+                                     .join(Author, Author.id == BookAuthor.author_id)
+                                     .order_by(func.random()).limit(count))).all()
+    queries = []
+    for i, (book_id, text) in enumerate(rng.sample(titles + authors, min(count, len(titles) + len(authors)))):
+        word = max(text.split(), key=len)
+        queries.append((typo(word, rng) if i % 2 else word, book_id))
+    return queries
+
+
+async def like_search(session, query: str, limit: int) -> list[int]:
+    pattern = f"%{query}%"
+    stmt = (select(Book.book_id)
+            .outerjoin(BookAuthor, BookAuthor.book_id == Book.book_id)
+            .outerjoin(Author, Author.id == BookAuthor.author_id)
+            .where(or_(Book.title.ilike(pattern), Book.publisher.ilike(pattern),
+                       Author.first_name.ilike(pattern), Author.last_name.ilike(pattern)))
+            .distinct()
+            .limit(limit))
+    return list((await session.scalars(stmt)).all())
+
+
+async def measure(name: str, search, queries: list[tuple[str, int]]) -> dict:
+    latencies = []
+    found = 0
+    for query, book_id in queries:
+        start = time.perf_counter()
+        book_ids = await search(query)
+        latencies.append((time.perf_counter() - start) * 1e3)
+        found += book_id in book_ids
+    latencies.sort()
+    return {
+        "search": name,
+        "queries": len(queries),
+        "found_source_book": found,
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+        "max_ms": round(latencies[-1], 2),
+    }
+
+
+async def run(query_count: int, limit: int, seed: int) -> dict:
+    async with db.async_session_scope() as session:
+        repo = AsyncBookRepository(session)
+
+        async def search_books(query: str) -> list[int]:
+            return [book.book_id for book, _ in await repo.search_books(query, limit)]
+
+        books = await session.scalar(select(func.count()).select_from(Book))
+        queries = await sample_queries(session, query_count, random.Random(seed))
+        results = [
+            await measure("search_books", search_books, queries),
+            await measure("ilike", lambda query: like_search(session, query, limit), queries),
+        ]
+    await db.close_async_db()
+    return {"books": books, "results": results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20, help="results per query")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.queries, args.limit, args.seed)), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Throughput and memory benchmark of the streaming catalog exports.
+
+Drains each CatalogExporter stream against the configured database and reports rows/sec, bytes/sec and the
+tracemalloc peak, which should stay flat as the dataset grows. Needs the database configured through the usual db_*
+variables, e.g. seeded with bookz-datagen --load.
+
+    python benchmarks/catalog_export.py --format ndjson csv --batch-size 1000
+"""
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+from bookz import db
+from bookz.enums.enums import ExportFormat
+from bookz.services.export import CatalogExporter
+
+EXPORTS = ("books", "book_copies", "customers")
+
+
+async def drain(exporter: CatalogExporter, export: str) -> dict:
+    rows = size = 0
+    tracemalloc.start()
+    start = time.perf_counter()
+    async for chunk in getattr(exporter, export)():
+        size += len(chunk)
+        rows += chunk.count(b"\n")
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if exporter.file_format == ExportFormat.CSV and rows:
+        rows -= 1
+    return {
+        "export": export,
+        "format": exporter.file_format.value,
+        "batch_size": exporter.batch_size,
+        "rows": rows,
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(rows / seconds, 1) if seconds else 0.0,
+        "megabytes_per_second": round(size / seconds / 2 ** 20, 2) if seconds else 0.0,
+        "peak_memory_mb": round(peak / 2 ** 20, 2),
+    }
+
+
+async def run(formats: list[ExportFormat], batch_size: int) -> list[dict]:
+    results = [await drain(CatalogExporter(file_format, batch_size), export)
+               for file_format in formats for export in EXPORTS]
+    await db.close_async_db()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--format", type=ExportFormat, nargs="+", default=list(ExportFormat), dest="formats")
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows fetched per server-side cursor batch")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.formats, args.batch_size)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
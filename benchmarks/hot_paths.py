@@ -0,0 +1,205 @@
+"""Microbenchmarks of the per-request hot paths, with allocation tracking and stored baselines.
+
+Times CustomORMMapper.map_recursively over detached ORM graphs built in memory, PhoneMapper phone normalization,
+PhoneValidator and EmailValidator, and Pydantic construction of response and request DTOs. Each case reports the best
+time per operation over --repeat runs and, from one more run under tracemalloc, the peak memory it allocated and the
+blocks it left allocated. No database is needed.
+
+Absolute times depend on the machine and its load, so every case is also timed relative to a fixed pure Python
+calibration loop measured right before it. --save-baseline stores the results in --baseline, --compare checks a run
+of the same parameters against it on the relative time and the peak memory per operation, and exits with status 1
+when a case got worse than --tolerance allows, so a mapper or DTO change can come with its numbers. Baselines are
+not committed, generate one on your machine from the commit you compare against:
+
+    git stash && python benchmarks/hot_paths.py --save-baseline && git stash pop
+    python benchmarks/hot_paths.py --compare --output hot_paths.json
+
+The JSON report is the only output on stdout, the log lines of the app go to stderr.
+"""
+import argparse
+import gc
+import json
+import logging
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+from bookz.mappers.mappers import CustomORMMapper, BookMapper, BookCopyMapper, CustomerMapper, PhoneMapper
+from bookz.services.dto_models import BookCopyDTO, NewCustomerDTO
+from bookz.validators.validators import PhoneValidator, EmailValidator
+from mapper_compilation import build_books, build_customers
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baselines" / "hot_paths.json"
+CALIBRATION_ITERATIONS = 200_000
+# Each timed run repeats the case until it lasts this long, short runs are mostly noise
+MIN_RUN_SECONDS = 0.2
+PHONE_FORMATS = ("+38066{:07d}", "066{:07d}", "+38 (066) {:07d}", "066-{:07d}", "38.066.{:07d}")
+
+
+class Case(NamedTuple):
+    name: str
+    operation: Callable
+    inputs: list
+
+
+def phone_numbers(count: int, rng: random.Random) -> list[str]:
+    return [rng.choice(PHONE_FORMATS).format(rng.randrange(10 ** 7)) for _ in range(count)]
+
+
+def emails(count: int, rng: random.Random) -> list[str]:
+    domains = ("example.com", "mail.example.org", "ukr.net", "bad_domain", "example.c")
+    return [f"user.{rng.randrange(10 ** 6)}+{i % 7}@{rng.choice(domains)}" for i in range(count)]
+
+
+def build_cases(copies: int, copies_per_book: int, authors_per_book: int, values: int, seed: int) -> list[Case]:
+    rng = random.Random(seed)
+    books = build_books(copies, copies_per_book, authors_per_book)
+    book_copies = [book_copy for book in books for book_copy in book.book_copies]
+    customers = build_customers(book_copies[::2])
+    phones = phone_numbers(values, rng)
+    addresses = emails(values, rng)
+    copy_dicts = [BookCopyMapper.book_copy_trusted_converter(book_copy).model_dump() for book_copy in book_copies]
+    customer_bodies = [{"full_name": {"first_name": "John", "last_name": f"Doe{i}"}, "email": email, "phone": phone}
+                       for i, (email, phone) in enumerate(zip(addresses, phones))
+                       if EmailValidator.validate_email(email)]
+    return [
+        Case("map_recursively.book_copy",
+             lambda instance: CustomORMMapper.map_recursively(instance, BookCopyMapper.book_copy_config), book_copies),
+        Case("map_recursively.book",
+             lambda instance: CustomORMMapper.map_recursively(instance, BookMapper.book_config), books),
+        Case("map_recursively.customer",
+             lambda instance: CustomORMMapper.map_recursively(instance, CustomerMapper.customer_config), customers),
+        Case("compiled.book_copy", BookCopyMapper.book_copy_converter, book_copies),
+        Case("PhoneMapper.phone_number_to_united_style", PhoneMapper.phone_number_to_united_style, phones),
+        Case("PhoneValidator.validate_phone_number", PhoneValidator.validate_phone_number, phones),
+        Case("EmailValidator.validate_email", EmailValidator.validate_email, addresses),
+        Case("BookCopyDTO.model_validate", BookCopyDTO.model_validate, copy_dicts),
+        Case("NewCustomerDTO.model_validate", NewCustomerDTO.model_validate, customer_bodies),
+    ]
+
+
+def calibration_loop() -> int:
+    """Dict, string and integer work of the interpreter, the unit of the relative times."""
+    names: dict[int, str] = {}
+    total = 0
+    for i in range(CALIBRATION_ITERATIONS):
+        names[i & 1023] = str(i)
+        total += len(names[i & 1023])
+    return total
+
+
+def best_time(run: Callable, repeat: int) -> float:
+    """Best time of one call of run over repeat runs of at least MIN_RUN_SECONDS each."""
+    start = time.perf_counter()
+    run()
+    loops = max(1, round(MIN_RUN_SECONDS / max(time.perf_counter() - start, 1e-9)))
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        for _ in range(loops):
+            run()
+        best = min(best, (time.perf_counter() - start) / loops)
+    return best
+
+
+def run_case(case: Case, repeat: int) -> dict:
+    operation, inputs = case.operation, case.inputs
+    calibration = best_time(calibration_loop, repeat)
+    best = best_time(lambda: [operation(item) for item in inputs], repeat)
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    blocks = len(tracemalloc.take_snapshot().traces)
+    results = [operation(item) for item in inputs]
+    current, peak = tracemalloc.get_traced_memory()
+    retained_blocks = len(tracemalloc.take_snapshot().traces) - blocks
+    tracemalloc.stop()
+    del results
+    return {
+        "case": case.name,
+        "operations": len(inputs),
+        "us_per_op": round(best / len(inputs) * 1e6, 3),
+        "relative_per_op": round(best / len(inputs) / calibration * 1e6, 3),
+        "calibration_ms": round(calibration * 1e3, 2),
+        "peak_kib": round((peak - before) / 1024, 1),
+        "peak_bytes_per_op": round((peak - before) / len(inputs), 1),
+        "retained_bytes_per_op": round((current - before) / len(inputs), 1),
+        "retained_blocks_per_op": round(retained_blocks / len(inputs), 2),
+    }
+
+
+def compare(results: list[dict], baseline: dict, tolerance: float) -> bool:
+    """Adds the ratios to the baseline to every result and tells if any case regressed beyond the tolerance.
+
+    Times are compared relative to the calibration loop and memory per operation, both independent of the machine's
+    speed and of the number of operations.
+    """
+    baseline_cases = {result["case"]: result for result in baseline["results"]}
+    regressed = False
+    for result in results:
+        reference = baseline_cases.get(result["case"])
+        if reference is None:
+            continue
+        result["time_ratio"] = round(result["relative_per_op"] / reference["relative_per_op"], 3)
+        result["memory_ratio"] = (round(result["peak_bytes_per_op"] / reference["peak_bytes_per_op"], 3)
+                                  if reference["peak_bytes_per_op"] else None)
+        result["regressed"] = (result["time_ratio"] > 1 + tolerance
+                               or (result["memory_ratio"] or 0) > 1 + tolerance)
+        regressed = regressed or result["regressed"]
+    return regressed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=1000, help="book copies of the mapped ORM graph")
+    parser.add_argument("--copies-per-book", type=int, default=5)
+    parser.add_argument("--authors-per-book", type=int, default=2)
+    parser.add_argument("--values", type=int, default=10_000, help="phone numbers and emails validated")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case, the best one is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--case", nargs="+", help="run only the cases whose name starts with one of these")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--compare", action="store_true", help="compare with the baseline, exit 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown or memory growth, 0.15 = 15%%")
+    parser.add_argument("--output", type=Path, help="also write the JSON report to this file")
+    args = parser.parse_args()
+    # The mappers log at DEBUG on every call, the benchmark would time console writes
+    logging.getLogger("app").setLevel(logging.WARNING)
+
+    cases = build_cases(args.copies, args.copies_per_book, args.authors_per_book, args.values, args.seed)
+    if args.case:
+        cases = [case for case in cases if case.name.startswith(tuple(args.case))]
+    report = {
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()}",
+        "parameters": {"copies": args.copies, "copies_per_book": args.copies_per_book,
+                       "authors_per_book": args.authors_per_book, "values": args.values, "repeat": args.repeat},
+        "results": [run_case(case, args.repeat) for case in cases],
+    }
+    regressed = False
+    if args.compare:
+        if not args.baseline.is_file():
+            parser.error(f"No baseline at {args.baseline}, create it with --save-baseline")
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        if baseline["parameters"] != report["parameters"]:
+            parser.error(f"Baseline parameters {baseline['parameters']} differ from {report['parameters']}, "
+                         f"run with the same ones")
+        regressed = compare(report["results"], baseline, args.tolerance)
+    text = json.dumps(report, indent=2) + "\n"
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(text, encoding="utf-8")
+    if args.output:
+        args.output.write_text(text, encoding="utf-8")
+    sys.stdout.write(text)
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
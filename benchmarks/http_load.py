@@ -0,0 +1,325 @@
+"""End-to-end HTTP load test of the API with a mixed read and write workload.
+
+Starts bookz.main:app under uvicorn in a subprocess, samples ids, isbns and emails from the configured database and
+drives it from --concurrency client threads with keep-alive connections: lookups by id, isbn and email, status
+listings, borrows and returns of copies and book creation, in the proportions of WORKLOAD. Reports requests,
+throughput and p50/p95/p99 latency per endpoint as JSON, tagged with the git commit, so that runs of two commits can
+be compared. Needs PostgreSQL configured through the usual db_* variables; --reset seeds it again from
+config/init_db_config.yaml with init_db, otherwise the app seeds it on startup only when the database doesn't exist.
+
+    python benchmarks/http_load.py --reset --concurrency 16 --duration 30 --output load.json
+    python benchmarks/http_load.py --url http://127.0.0.1:8000 --duration 60
+"""
+import argparse
+import http.client
+import json
+import math
+import random
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import quote, urlsplit
+from sqlalchemy import select, func
+from bookz import db
+from bookz.enums.enums import BookStatus, BookStatement
+from bookz.repositories.init_db import init_db_with_reset, read_depository_config
+from bookz.repositories.orm_models import Author, Book, BookCopy, Customer
+
+# Relative frequency of each operation, named after the route template it is reported under
+WORKLOAD = {
+    "GET /api/author/{author_id}": 10,
+    "GET /api/book/{book_id}": 20,
+    "GET /api/book/isbn/{isbn}": 15,
+    "GET /api/customer/{customer_id}": 10,
+    "GET /api/customer/email/{email}": 10,
+    "GET /api/book-copy/status/{status}": 8,
+    "GET /api/book-copy/statement/{statement}": 5,
+    "POST /api/book-copy/borrow": 8,
+    "POST /api/book-copy/return": 8,
+    "POST /api/book/": 6,
+}
+SAMPLE_SIZE = 2000
+STARTUP_TIMEOUT = 120.0
+
+
+def percentile(latencies: list[float], q: float) -> float:
+    """Nearest-rank percentile of sorted latencies."""
+    return latencies[max(0, math.ceil(q * len(latencies)) - 1)]
+
+
+class Dataset:
+    """Keys sampled from the catalog, and the pools of copies that the borrows and returns move between."""
+
+    def __init__(self, session, size: int, rng: random.Random) -> None:
+        def sample(stmt) -> list:
+            return list(session.execute(stmt.order_by(func.random()).limit(size)).all())
+
+        self.author_ids = [row.id for row in sample(select(Author.id))]
+        books = sample(select(Book.book_id, Book.isbn))
+        self.book_ids = [row.book_id for row in books]
+        self.isbns = [row.isbn for row in books if row.isbn]
+        customers = sample(select(Customer.customer_id, Customer.email))
+        self.customer_ids = [row.customer_id for row in customers]
+        self.emails = [row.email for row in customers]
+        self.available = [row.copy_id for row in sample(select(BookCopy.copy_id)
+                                                        .where(BookCopy.status == BookStatus.AVAILABLE))]
+        self.borrowed = [row.copy_id for row in sample(select(BookCopy.copy_id)
+                                                       .where(BookCopy.status == BookStatus.BORROWED))]
+        rng.shuffle(self.available)
+        rng.shuffle(self.borrowed)
+        self.lock = threading.Lock()
+        self.created = 0
+
+    def take(self, pool: list[int]) -> int | None:
+        with self.lock:
+            return pool.pop() if pool else None
+
+    def put(self, pool: list[int], copy_id: int) -> None:
+        with self.lock:
+            pool.insert(0, copy_id)
+
+    def next_isbn(self, run_id: int) -> str:
+        with self.lock:
+            self.created += 1
+            return f"979-{run_id:06d}-{self.created:07d}"
+
+
+class Client:
+    """One client thread: a keep-alive connection and the latencies it measured per endpoint."""
+
+    def __init__(self, host: str, port: int, dataset: Dataset, rng: random.Random, run_id: int) -> None:
+        self.host = host
+        self.port = port
+        self.dataset = dataset
+        self.rng = rng
+        self.run_id = run_id
+        self.connection = http.client.HTTPConnection(host, port, timeout=60)
+        self.latencies: dict[str, list[float]] = {}
+        self.statuses: dict[str, dict[int, int]] = {}
+        self.failures: dict[str, int] = {}
+
+    def reconnect(self) -> None:
+        self.connection.close()
+        self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+
+    def request(self, method: str, path: str, body: dict | None = None) -> tuple[int, bytes]:
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        # A keep-alive connection the server closed since the last response fails on its next request, that one is
+        # sent once more on a new connection before it counts as a failure of the endpoint
+        for attempt in range(2):
+            try:
+                self.connection.request(method, path, None if body is None else json.dumps(body), headers)
+                response = self.connection.getresponse()
+                payload = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self.reconnect()
+                if attempt:
+                    raise
+                continue
+            except (http.client.HTTPException, OSError):
+                self.reconnect()
+                raise
+            # e.g. uvicorn closes the connection after a 500
+            if response.will_close:
+                self.reconnect()
+            return response.status, payload
+
+    def call(self, operation: str, path: str, body: dict | None = None) -> tuple[int, bytes] | None:
+        start = time.perf_counter()
+        try:
+            status, payload = self.request(operation.split(" ", 1)[0], path, body)
+        except (http.client.HTTPException, OSError):
+            self.failures[operation] = self.failures.get(operation, 0) + 1
+            return None
+        self.latencies.setdefault(operation, []).append((time.perf_counter() - start) * 1e3)
+        statuses = self.statuses.setdefault(operation, {})
+        statuses[status] = statuses.get(status, 0) + 1
+        return status, payload
+
+    def run_operation(self, operation: str) -> None:
+        data, rng = self.dataset, self.rng
+        match operation:
+            case "GET /api/author/{author_id}":
+                self.call(operation, f"/api/author/{rng.choice(data.author_ids)}")
+            case "GET /api/book/{book_id}":
+                self.call(operation, f"/api/book/{rng.choice(data.book_ids)}")
+            case "GET /api/book/isbn/{isbn}":
+                self.call(operation, f"/api/book/isbn/{quote(rng.choice(data.isbns), safe='')}")
+            case "GET /api/customer/{customer_id}":
+                self.call(operation, f"/api/customer/{rng.choice(data.customer_ids)}")
+            case "GET /api/customer/email/{email}":
+                self.call(operation, f"/api/customer/email/{quote(rng.choice(data.emails), safe='')}")
+            case "GET /api/book-copy/status/{status}":
+                status = rng.choice((BookStatus.AVAILABLE, BookStatus.BORROWED))
+                self.call(operation, f"/api/book-copy/status/{status.value}?limit=20")
+            case "GET /api/book-copy/statement/{statement}":
+                self.call(operation, f"/api/book-copy/statement/{rng.choice(list(BookStatement)).value}?limit=20")
+            case "POST /api/book-copy/borrow":
+                copy_id = data.take(data.available)
+                if copy_id is None:
+                    return
+                result = self.call(operation, "/api/book-copy/borrow",
+                                   {"customer_id": rng.choice(data.customer_ids), "copy_ids": [copy_id]})
+                if result is not None and result[0] == 200:
+                    data.put(data.borrowed, copy_id)
+            case "POST /api/book-copy/return":
+                copy_id = data.take(data.borrowed)
+                if copy_id is None:
+                    return
+                result = self.call(operation, "/api/book-copy/return", {"copy_ids": [copy_id]})
+                if result is not None and result[0] == 200:
+                    data.put(data.available, copy_id)
+            case "POST /api/book/":
+                self.call(operation, "/api/book/", {
+                    "title": f"Load test {self.run_id}", "publisher": "Bookz Bench", "place_of_publication": "Kyiv",
+                    "published_year": rng.randint(1950, 2025), "isbn": data.next_isbn(self.run_id),
+                    "pages": rng.randint(50, 900), "price": round(rng.uniform(50, 1500), 2), "new_copies": 1,
+                })
+
+    def run(self, operations: list[str], weights: list[int], deadline: float) -> None:
+        while time.perf_counter() < deadline:
+            self.run_operation(self.rng.choices(operations, weights)[0])
+        self.connection.close()
+
+
+def run_load(host: str, port: int, dataset: Dataset, concurrency: int, duration: float, seed: int,
+             warmup: float) -> tuple[list[Client], float]:
+    operations, weights = list(WORKLOAD), list(WORKLOAD.values())
+    # Part of the isbns of the created books, unique per run so that runs against one database don't collide
+    run_id = int(time.time()) % 1_000_000
+    if warmup > 0:
+        warm = [Client(host, port, dataset, random.Random(f"warmup-{seed}-{i}"), run_id) for i in range(concurrency)]
+        deadline = time.perf_counter() + warmup
+        threads = [threading.Thread(target=client.run, args=(operations, weights, deadline)) for client in warm]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    clients = [Client(host, port, dataset, random.Random(f"{seed}-{i}"), run_id) for i in range(concurrency)]
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client.run, args=(operations, weights, start + duration)) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return clients, time.perf_counter() - start
+
+
+def summarize(operation: str, latencies: list[float], statuses: dict[int, int], failures: int,
+              seconds: float) -> dict:
+    latencies.sort()
+    result = {
+        "endpoint": operation,
+        "requests": len(latencies),
+        "failures": failures,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "throughput_rps": round(len(latencies) / seconds, 1) if seconds else 0.0,
+    }
+    if latencies:
+        result.update({
+            "p50_ms": round(percentile(latencies, 0.50), 2),
+            "p95_ms": round(percentile(latencies, 0.95), 2),
+            "p99_ms": round(percentile(latencies, 0.99), 2),
+            "max_ms": round(latencies[-1], 2),
+        })
+    return result
+
+
+def report(clients: list[Client], seconds: float) -> list[dict]:
+    results = []
+    all_latencies, all_statuses, all_failures = [], {}, 0
+    for operation in WORKLOAD:
+        latencies = [latency for client in clients for latency in client.latencies.get(operation, [])]
+        statuses: dict[int, int] = {}
+        for client in clients:
+            for status, count in client.statuses.get(operation, {}).items():
+                statuses[status] = statuses.get(status, 0) + count
+                all_statuses[status] = all_statuses.get(status, 0) + count
+        failures = sum(client.failures.get(operation, 0) for client in clients)
+        all_latencies.extend(latencies)
+        all_failures += failures
+        if latencies or failures:
+            results.append(summarize(operation, latencies, statuses, failures, seconds))
+    results.append(summarize("total", all_latencies, all_statuses, all_failures, seconds))
+    return results
+
+
+def start_server(host: str, port: int, workers: int) -> subprocess.Popen:
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "bookz.main:app", "--host", host, "--port", str(port),
+                               "--workers", str(workers), "--log-level", "warning", "--no-access-log"])
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with code {server.returncode} during startup")
+        try:
+            connection = http.client.HTTPConnection(host, port, timeout=2)
+            connection.request("GET", "/health")
+            if connection.getresponse().status == 200:
+                connection.close()
+                return server
+        except OSError:
+            time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError(f"API not up on {host}:{port} after {STARTUP_TIMEOUT}s")
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="load an already running API instead of starting one")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes of the started API")
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads, each with one connection")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="unmeasured seconds before, to fill the caches")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reset", action="store_true", help="drop the database and seed it again with init_db")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    if args.reset:
+        init_db_with_reset(read_depository_config())
+    db.start_db()
+    with db.SessionLocal() as session:
+        dataset = Dataset(session, SAMPLE_SIZE, random.Random(args.seed))
+    db.close_db()
+
+    server = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        host, port = args.host, args.port
+        server = start_server(host, port, args.workers)
+    try:
+        clients, seconds = run_load(host, port, dataset, args.concurrency, args.duration, args.seed, args.warmup)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    result = {
+        "commit": git_commit(),
+        "concurrency": args.concurrency,
+        "workers": None if args.url else args.workers,
+        "duration_s": round(seconds, 3),
+        "seed": args.seed,
+        "workload": WORKLOAD,
+        "endpoints": report(clients, seconds),
+    }
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Microbenchmark of ORM to DTO mapping.
+
+Maps transient ORM graphs shaped like the /book-copy/status/{status} and /customer/{id} responses with the
+config-walking CustomORMMapper.map_recursively and with the converters compiled from the same config, checks that
+both give identical DTOs and reports the time per mapped instance. No database is needed.
+
+    python benchmarks/mapper_compilation.py --copies 1000 --repeat 5
+"""
+import argparse
+import json
+import time
+from bookz.enums.enums import BookStatus, BookStatement, PlacementStatus
+from bookz.mappers.mappers import CustomORMMapper, BookCopyMapper, CustomerMapper
+from bookz.repositories.orm_models import Author, Book, BookCopy, Customer, Placement
+
+
+def build_books(copies: int, copies_per_book: int = 5, authors_per_book: int = 2) -> list[Book]:
+    books = []
+    for book_id in range(1, copies // copies_per_book + 1):
+        book = Book(book_id=book_id, title=f"Title {book_id}", publisher="Penguin", place_of_publication="London",
+                    published_year=2008, isbn=f"978-{book_id:012d}", pages=336, price=854.0, language="en")
+        book.authors = [Author(id=book_id * authors_per_book + i, first_name=f"First{i}", last_name=f"Last{book_id}",
+                               middle_name=None) for i in range(authors_per_book)]
+        for i in range(copies_per_book):
+            copy_id = (book_id - 1) * copies_per_book + i + 1
+            placement = Placement(id=copy_id, line_id="A", column_id=1 + copy_id % 9, shelf_id="B",
+                                  position=1 + copy_id % 20, status=PlacementStatus.OCCUPIED)
+            BookCopy(copy_id=copy_id, book=book, status=BookStatus.AVAILABLE, statement=BookStatement.GOOD,
+                     placement=placement)
+        books.append(book)
+    return books
+
+
+def build_customers(copies: list[BookCopy], borrowed_per_customer: int = 3) -> list[Customer]:
+    customers = []
+    for customer_id, start in enumerate(range(0, len(copies), borrowed_per_customer), start=1):
+        customer = Customer(customer_id=customer_id, first_name="John", last_name=f"Doe{customer_id}",
+                            middle_name=None, email=f"john.doe{customer_id}@example.com",
+                            phone=f"+38066{customer_id:07d}")
+        for book_copy in copies[start:start + borrowed_per_customer]:
+            book_copy.status = BookStatus.BORROWED
+            book_copy.customer = customer
+        customers.append(customer)
+    return customers
+
+
+def measure(convert, instances: list, repeat: int) -> tuple[float, list]:
+    best = float("inf")
+    result = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = [convert(instance) for instance in instances]
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def compare(name: str, config: dict, converter, instances: list, repeat: int) -> dict:
+    reflective_seconds, reflective = measure(lambda instance: CustomORMMapper.map_recursively(instance, config),
+                                             instances, repeat)
+    compiled_seconds, compiled = measure(converter, instances, repeat)
+    return {
+        "mapping": name,
+        "instances": len(instances),
+        "identical": reflective == compiled,
+        "reflective_us_per_instance": round(reflective_seconds / len(instances) * 1e6, 2),
+        "compiled_us_per_instance": round(compiled_seconds / len(instances) * 1e6, 2),
+        "speedup": round(reflective_seconds / compiled_seconds, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=1000, help="book copies in the mapped list")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per mapper, the best one is reported")
+    args = parser.parse_args()
+    books = build_books(args.copies)
+    copies = [book_copy for book in books for book_copy in book.book_copies]
+    results = [compare("BOOK_COPY", BookCopyMapper.book_copy_config, BookCopyMapper.book_copy_converter, copies,
+                       args.repeat)]
+    customers = build_customers(copies)
+    results.append(compare("CUSTOMER", CustomerMapper.customer_config, CustomerMapper.customer_converter, customers,
+                           args.repeat))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
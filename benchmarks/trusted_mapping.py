@@ -0,0 +1,60 @@
+"""Microbenchmark of validated and trusted ORM to DTO mapping.
+
+Maps a listing of transient ORM copies, their books or their authors with the validating converter and with the
+trusted one that builds DTOs without validation, checks that both serialize to the same JSON and reports the time per
+listing. No database is needed. The application maps authors and books validated, as trusting them gains nothing.
+
+    python benchmarks/trusted_mapping.py --copies 10000 --repeat 5 --entity books
+"""
+import argparse
+import json
+from pydantic import TypeAdapter
+from bookz.mappers.mappers import AuthorMapper, BookMapper, BookCopyMapper, CustomORMMapper
+from bookz.services.dto_models import AuthorDTO, BookDTO, BookCopyDTO
+from mapper_compilation import build_books, build_customers, measure
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=10_000, help="book copies in the mapped listing")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per mode, the best one is reported")
+    parser.add_argument("--borrowed", action="store_true", help="give every copy a customer, so EmailStr and the "
+                                                                "phone pattern are validated too")
+    parser.add_argument("--entity", choices=("book_copies", "books", "authors"), default="book_copies",
+                        help="entities of the mapped listing")
+    args = parser.parse_args()
+    books = build_books(args.copies)
+    copies = [book_copy for book in books for book_copy in book.book_copies]
+    if args.borrowed:
+        build_customers(copies)
+    match args.entity:
+        case "book_copies":
+            instances, dto_class = copies, BookCopyDTO
+            validating, trusting = BookCopyMapper.book_copy_converter, BookCopyMapper.book_copy_trusted_converter
+        case "books":
+            instances, dto_class = books, BookDTO
+            validating = BookMapper.book_converter
+            trusting = CustomORMMapper.compile(BookMapper.book_config, trusted=True)
+        case _:
+            instances, dto_class = [author for book in books for author in book.authors], AuthorDTO
+            validating = AuthorMapper.author_converter
+            trusting = CustomORMMapper.compile(AuthorMapper.author_config, trusted=True)
+    listing = TypeAdapter(list[dto_class])
+
+    validated_seconds, validated = measure(validating, instances, args.repeat)
+    trusted_seconds, trusted = measure(trusting, instances, args.repeat)
+    result = {
+        "entity": args.entity,
+        "instances": len(instances),
+        "copies": len(copies),
+        "borrowed": args.borrowed,
+        "identical_json": listing.dump_json(validated) == listing.dump_json(trusted),
+        "validated_ms": round(validated_seconds * 1e3, 1),
+        "trusted_ms": round(trusted_seconds * 1e3, 1),
+        "speedup": round(validated_seconds / trusted_seconds, 2),
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Bulk book import from publisher feeds.
+
+Every file is imported in its own transaction through staging tables. Books need title, publisher,
+place_of_publication, published_year, isbn, pages and new_copies, authors is a list of {"full_name": {...}} objects
+(a JSON array in a CSV column). Rejected rows are listed in the JSON report with their row number and reason.
+
+    bookz-import feed.ndjson
+    bookz-import feed_1.csv feed_2.csv --report import_report.json
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+from ..db import start_db
+from ..enums.enums import ExportFormat
+from ..exceptions.exceptions import BookPresentInDatabase
+from ..services.book_import import import_books
+from ..logger import app_logger
+
+
+def feed_format(path: Path, file_format: ExportFormat | None) -> ExportFormat:
+    if file_format is not None:
+        return file_format
+    return ExportFormat.CSV if path.suffix.lower() == ".csv" else ExportFormat.NDJSON
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="bookz-import", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", type=Path, nargs="+", help="CSV or NDJSON feeds")
+    parser.add_argument("--format", "-f", type=ExportFormat, default=None, dest="file_format",
+                        help="feed format, taken from the file extension by default")
+    parser.add_argument("--report", type=Path, default=None, help="write the JSON import report to this file")
+    args = parser.parse_args(argv)
+    for path in args.files:
+        if not path.is_file():
+            parser.error(f"{path} is not a file")
+    return args
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    start_db()
+    reports = {}
+    for path in args.files:
+        app_logger.info(f"Importing books from {path}")
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            try:
+                reports[str(path)] = import_books(f, feed_format(path, args.file_format)).model_dump()
+            except BookPresentInDatabase as e:
+                app_logger.error(str(e))
+                return 1
+    if args.report:
+        args.report.write_text(json.dumps(reports, indent=2), encoding="utf-8")
+    else:
+        json.dump(reports, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
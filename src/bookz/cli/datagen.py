@@ -0,0 +1,167 @@
+"""Load-test dataset generator.
+
+Builds a depository of the shape given in config/init_db_config.yaml multiplied by a TPC-style scale factor and
+either writes it to CSV/NDJSON files or loads it straight into the database.
+
+    bookz-datagen --scale-factor 100 --seed 42 --output ./datasets/sf100 --format csv
+    bookz-datagen --scale-factor 10 --seed 42 --load --reset
+"""
+import argparse
+import csv
+import json
+import random
+import sys
+from enum import Enum
+from itertools import chain
+from pathlib import Path
+from typing import Iterable, Iterator
+from sqlalchemy import exists, select
+from ..db import start_db, get_session
+from ..enums.enums import PlacementStatus
+from ..repositories.bulk_loader import PhaseTimer
+from ..repositories.data_generator.data_generator import (iter_fake_author_batches, iter_fake_book_batches,
+                                                          iter_fake_customer_batches, AUTHOR_COLUMNS, BOOK_COLUMNS,
+                                                          CUSTOMER_COLUMNS)
+from ..repositories.init_db import (init_db, init_db_with_reset, read_depository_config, scale_depository,
+                                    book_author_rows, book_copy_rows, BOOK_COPY_COLUMNS)
+from ..repositories.orm_models import Author, Book, BookCopy, Customer, Placement
+from ..services.dto_models import NewDepositoryDTO
+from ..logger import app_logger
+
+SCALE_FACTORS = (1, 10, 100, 1000)
+FORMATS = ("csv", "ndjson")
+PLACEMENT_COLUMNS = ["id", "line_id", "column_id", "shelf_id", "position", "status"]
+# Tables init_db fills, --load without --reset only goes into a database where they are all empty
+LOADED_MODELS = (Placement, Author, Book, Customer, BookCopy)
+
+
+def placement_rows(depo: NewDepositoryDTO, free_placements: set[int]) -> Iterator[tuple]:
+    placement_id = 0
+    for line in range(depo.lines):
+        for column in range(1, depo.columns + 1):
+            for shelf in range(depo.shelves):
+                for position in range(1, depo.positions + 1):
+                    placement_id += 1
+                    status = PlacementStatus.FREE if placement_id in free_placements else PlacementStatus.OCCUPIED
+                    yield placement_id, chr(65 + line), column, chr(65 + shelf), position, status
+
+
+def numbered(rows: Iterable[tuple]) -> Iterator[tuple]:
+    for row_id, row in enumerate(rows, start=1):
+        yield row_id, *row
+
+
+def write_rows(path: Path, file_format: str, columns: list[str], rows: Iterable[tuple]) -> int:
+    written = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if file_format == "csv":
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for row in rows:
+                writer.writerow(value.value if isinstance(value, Enum) else value for value in row)
+                written += 1
+        else:
+            for row in rows:
+                record = {column: value.value if isinstance(value, Enum) else value
+                          for column, value in zip(columns, row)}
+                f.write(json.dumps(record, ensure_ascii=False))
+                f.write("\n")
+                written += 1
+    return written
+
+
+def write_dataset(depo: NewDepositoryDTO, output: Path, file_format: str, workers: int | None) -> dict:
+    """Writes the dataset with ids assigned in generation order, as the database would assign them on load."""
+    output.mkdir(parents=True, exist_ok=True)
+    timer = PhaseTimer()
+    rng = random.Random(depo.seed)
+
+    def target(name: str) -> Path:
+        return output / f"{name}.{file_format}"
+
+    with timer.measure("authors") as phase:
+        phase.rows = write_rows(target("authors"), file_format, ["id", *AUTHOR_COLUMNS], numbered(
+            chain.from_iterable(iter_fake_author_batches(depo.authors_number, seed=depo.seed, workers=workers))))
+    with timer.measure("books") as phase:
+        phase.rows = write_rows(target("books"), file_format, ["book_id", *BOOK_COLUMNS], numbered(
+            chain.from_iterable(iter_fake_book_batches(depo.books_number, seed=depo.seed, workers=workers))))
+    with timer.measure("customers") as phase:
+        phase.rows = write_rows(target("customers"), file_format, ["customer_id", *CUSTOMER_COLUMNS], numbered(
+            chain.from_iterable(iter_fake_customer_batches(depo.customers_number, seed=depo.seed,
+                                                           workers=workers))))
+
+    book_ids = range(1, depo.books_number + 1)
+    with timer.measure("book_author") as phase:
+        phase.rows = write_rows(target("book_author"), file_format, ["book_id", "author_id"],
+                                book_author_rows(book_ids, range(1, depo.authors_number + 1), rng))
+    placements = list(range(1, depo.lines * depo.columns * depo.shelves * depo.positions + 1))
+    rng.shuffle(placements)
+    with timer.measure("book_copies") as phase:
+        phase.rows = write_rows(target("book_copies"), file_format, ["copy_id", *BOOK_COPY_COLUMNS], numbered(
+            book_copy_rows(book_ids, placements, range(1, depo.customers_number + 1),
+                           depo.max_books_copies_per_book, rng)))
+    # Available copies took their placements off the list, what is left stays free
+    with timer.measure("placements") as phase:
+        phase.rows = write_rows(target("placements"), file_format, PLACEMENT_COLUMNS,
+                                placement_rows(depo, set(placements)))
+    return timer.report()
+
+
+def is_database_loaded() -> bool:
+    with get_session() as session:
+        return any(session.scalar(select(exists().select_from(model))) for model in LOADED_MODELS)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="bookz-datagen", description="Generate repeatable load-test datasets.")
+    parser.add_argument("--scale-factor", "-s", type=int, default=1,
+                        help=f"multiplier of the config/init_db_config.yaml depository, presets: {SCALE_FACTORS}")
+    parser.add_argument("--seed", type=int, default=0, help="fake data seed, the same seed gives the same dataset")
+    parser.add_argument("--workers", "-w", type=int, default=None,
+                        help="fake data generation processes, defaults to the number of CPUs")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--output", "-o", type=Path, help="directory for generated files")
+    target.add_argument("--load", action="store_true", help="load the dataset straight into the database")
+    parser.add_argument("--format", "-f", choices=FORMATS, default="csv", help="file format used with --output")
+    parser.add_argument("--reset", action="store_true",
+                        help="drop and recreate the database before --load, required unless the database is empty")
+    parser.add_argument("--report", type=Path, default=None, help="write the JSON timing report to this file")
+    args = parser.parse_args(argv)
+    if args.scale_factor < 1:
+        parser.error("--scale-factor must be a positive integer")
+    if args.seed < 0:
+        parser.error("--seed must not be negative")
+    return args
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    base = read_depository_config()
+    if base is None:
+        return 1
+    depo = scale_depository(base, args.scale_factor).model_copy(update={"seed": args.seed})
+    app_logger.info(f"Generating dataset for scale factor {args.scale_factor}: {depo}")
+    if args.load:
+        if args.reset:
+            report = init_db_with_reset(depo, workers=args.workers)
+        else:
+            start_db()
+            if is_database_loaded():
+                app_logger.error("The database already has a depository, use --reset to replace it")
+                return 1
+            report = init_db(depo, workers=args.workers)
+        if report is None:
+            return 1
+    else:
+        report = write_dataset(depo, args.output, args.format, args.workers)
+    report.update(scale_factor=args.scale_factor, seed=args.seed)
+    if args.report:
+        args.report.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
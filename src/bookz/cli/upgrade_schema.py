@@ -0,0 +1,40 @@
+"""Brings the schema of an existing database up to date.
+
+create_all only creates missing tables, so the objects added to existing tables later never reach a database that
+was created before them. This creates them, and can be run any number of times: pg_trgm, the full-text and trigram
+search indexes, and the change feed function with the triggers that notify the other workers of every write.
+Building the GIN indexes of a large catalog blocks writes to its tables for a while, run it in a quiet moment.
+
+    bookz-upgrade-schema
+"""
+import argparse
+import json
+import sys
+from .. import db
+from ..repositories.schema_upgrade import install_search_indexes, install_change_feed
+from ..logger import app_logger
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="bookz-upgrade-schema", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parse_args(argv)
+    if not db.is_database_exists():
+        app_logger.error("Database doesn't exist, it gets the whole schema when it is created")
+        return 1
+    db.start_db()
+    with db.engine.begin() as connection:
+        report = {"search_indexes": install_search_indexes(connection),
+                  "change_feed_tables": install_change_feed(connection)}
+    db.close_db()
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,23 +1,47 @@
-from contextlib import contextmanager
+from contextlib import contextmanager, asynccontextmanager
 from sqlalchemy.orm import declarative_base, sessionmaker
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy_utils import create_database, database_exists, drop_database
 from dotenv import load_dotenv
 import os
+import uuid
 
 from bookz.logger import app_logger
+from bookz.metrics import instrument_engine
+from bookz.query_audit import audit_engine, QUERY_AUDIT_ENABLED
+from bookz.slow_query import log_slow_queries
 
 load_dotenv()
 
 DATABASE_URL = (f"postgresql+psycopg2://{os.getenv('db_user')}:{os.getenv('db_password')}"
                 f"@{os.getenv('db_url')}:{os.getenv('db_port')}/{os.getenv('db_name')}"
                 f"?client_encoding=utf8")
+ASYNC_DATABASE_URL = (f"postgresql+psycopg://{os.getenv('db_user')}:{os.getenv('db_password')}"
+                      f"@{os.getenv('db_url')}:{os.getenv('db_port')}/{os.getenv('db_name')}"
+                      f"?client_encoding=utf8")
 app_logger.debug(f"DATABASE_URL={DATABASE_URL}")
+app_logger.debug(f"ASYNC_DATABASE_URL={ASYNC_DATABASE_URL}")
 
 # Define Base at the top level
 Base = declarative_base()
 engine = None
 SessionLocal = None
+async_engine = None
+AsyncSessionLocal = None
+
+# Unique per process, pids repeat across containers. Forked workers draw their own
+PROCESS_ID = uuid.uuid4().hex
+
+def _new_process_id():
+    global PROCESS_ID
+    PROCESS_ID = uuid.uuid4().hex
+
+os.register_at_fork(after_in_child=_new_process_id)
+
+def application_name() -> str:
+    """Name of this process's database connections, the change feed uses it to skip its own changes."""
+    return f"bookz-{PROCESS_ID}"
 
 def start_db():
     app_logger.debug(f"Calling start_db function")
@@ -25,17 +49,41 @@ def start_db():
     if not database_exists(DATABASE_URL):
         app_logger.debug(f"Database don't exist. Creating database {DATABASE_URL}")
         create_database(DATABASE_URL)
-    engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+    engine = create_engine(DATABASE_URL, pool_pre_ping=True, connect_args={"application_name": application_name()})
+    instrument_engine(engine)
+    if QUERY_AUDIT_ENABLED:
+        audit_engine(engine)
+    log_slow_queries(engine, DATABASE_URL)
     app_logger.debug(f"Created database engine {engine.url}")
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     Base.metadata.create_all(bind=engine)
+    start_async_db()
+
+def start_async_db():
+    app_logger.debug(f"Calling start_async_db function")
+    global async_engine, AsyncSessionLocal
+    if async_engine:
+        return
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, pool_pre_ping=True,
+                                       connect_args={"application_name": application_name()})
+    instrument_engine(async_engine.sync_engine)
+    if QUERY_AUDIT_ENABLED:
+        audit_engine(async_engine.sync_engine)
+    log_slow_queries(async_engine.sync_engine, DATABASE_URL)
+    app_logger.debug(f"Created async database engine {async_engine.url}")
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, class_=AsyncSession, autoflush=False,
+                                           expire_on_commit=False)
 
 def reset_db():
     app_logger.debug(f"Calling reset_db function")
     global engine
     if not engine:
         close_db()
-    engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+    engine = create_engine(DATABASE_URL, pool_pre_ping=True, connect_args={"application_name": application_name()})
+    instrument_engine(engine)
+    if QUERY_AUDIT_ENABLED:
+        audit_engine(engine)
+    log_slow_queries(engine, DATABASE_URL)
     if database_exists(engine.url):
         drop_database(engine.url)
     create_database(engine.url)
@@ -49,15 +97,40 @@ def is_database_exists() -> bool:
 @contextmanager
 def get_session():
     """Provides a transactional scope around a series of operations."""
+    if SessionLocal is None:
+        start_db()
     session = SessionLocal()
     try:
         yield session
     finally:
         session.close()
 
+async def get_async_session():
+    """Yields an AsyncSession for FastAPI dependencies, closing it when the request is done."""
+    if AsyncSessionLocal is None:
+        start_async_db()
+    async with AsyncSessionLocal() as session:
+        yield session
+
+@asynccontextmanager
+async def async_session_scope():
+    """Provides an AsyncSession outside of FastAPI dependencies, e.g. for streaming responses."""
+    if AsyncSessionLocal is None:
+        start_async_db()
+    async with AsyncSessionLocal() as session:
+        yield session
+
 def close_db():
     app_logger.debug(f"Calling close_db function")
     global engine
     if engine:
         engine.dispose()
-        engine = None
\ No newline at end of file
+        engine = None
+
+async def close_async_db():
+    app_logger.debug(f"Calling close_async_db function")
+    global async_engine, AsyncSessionLocal
+    if async_engine:
+        await async_engine.dispose()
+        async_engine = None
+        AsyncSessionLocal = None
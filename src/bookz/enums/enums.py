@@ -22,3 +22,15 @@ class PlacementStatus(Enum):
     OCCUPIED = "occupied"
     FREE = "free"
     RESERVED = "reserved"
+
+
+class PlacementLocality(Enum):
+    NONE = "none"
+    LINE = "line"
+    COLUMN = "column"
+    SHELF = "shelf"
+
+
+class ExportFormat(Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
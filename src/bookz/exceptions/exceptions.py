@@ -25,6 +25,11 @@ class BookCopyBorrowed(Exception):
 class BookCopyNotFound(Exception):
     pass
 
+class BookCopyBatchRejected(Exception):
+    def __init__(self, message: str, errors: dict[int, str]):
+        super().__init__(message)
+        self.errors = errors
+
 class CustomerMustBeGiven(Exception):
     pass
 
@@ -53,4 +58,13 @@ class NullValueNotAllowedException(Exception):
     pass
 
 class ProhibitionOfInsertIDException(Exception):
-    pass
\ No newline at end of file
+    pass
+
+class FieldSelectionError(Exception):
+    pass
+
+class NotModified(Exception):
+    pass
+
+class QueryPatternDetected(Exception):
+    pass
@@ -1,5 +1,6 @@
 import logging
 import logging.config
+import sys
 import colorlog
 import yaml
 from pathlib import Path
@@ -11,16 +12,17 @@ def setup_logging():
         with open(config_file, "r", encoding="utf-8") as f:
             config = yaml.safe_load(f)
         logging.config.dictConfig(config)
-        print("Logger initialized successfully.")
+        print("Logger initialized successfully.", file=sys.stderr)
     except FileNotFoundError:
-        print(f"Error: Logging configuration file not found at {config_file}")
+        print(f"Error: Logging configuration file not found at {config_file}", file=sys.stderr)
     except Exception as e:
-        print(f"Error initializing logger: {e}")
+        print(f"Error initializing logger: {e}", file=sys.stderr)
 
 setup_logging()
 
 app_logger = logging.getLogger("app")
 db_logger = logging.getLogger("db")
+slow_query_logger = logging.getLogger("slow_query")
 
 app_logger.info(f"App logger initialized: {app_logger.name}")
 db_logger.info(f"DB logger initialized: {db_logger.name}")
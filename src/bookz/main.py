@@ -1,9 +1,13 @@
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
-from .db import close_db
+from .db import close_db, start_async_db, close_async_db, async_session_scope
 from .repositories.init_db import init_db_from_config
 from .routers.router import router
+from .services.async_service import AsyncBookService
+from .services.change_feed import ChangeFeedListener
+from .services.dto_cache import dto_cache
+from .metrics import RequestMetricsMiddleware, metrics_registry, cache_metric_lines
 from .logger import app_logger
 
 app_logger.info("Start main module")
@@ -12,9 +16,17 @@ app_logger.info("Start main module")
 async def lifespan(app: FastAPI):
     app_logger.info("Starting initialize project database...")
     init_db_from_config()
+    start_async_db()
+    # Listen before the indexes load, so that no change made meanwhile by another worker is missed
+    change_feed = ChangeFeedListener()
+    change_feed.start()
+    async with async_session_scope() as session:
+        await AsyncBookService(session).load_autocomplete_indexes()
     app_logger.info("Initialization complete.")
     yield
+    await change_feed.stop()
     close_db()
+    await close_async_db()
     app_logger.info("Database close complete.")
 
 app = FastAPI(
@@ -25,11 +37,18 @@ app = FastAPI(
 )
 
 app.include_router(router, prefix="/api", tags=["api"])
+app.add_middleware(RequestMetricsMiddleware)
 
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Per route SQL statements, DB time, rows and mapper time, and the DTO cache stats, in Prometheus text format."""
+    return PlainTextResponse(metrics_registry.render(cache_metric_lines("dto_cache", dto_cache.stats().model_dump())),
+                             media_type="text/plain; version=0.0.4")
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
 
@@ -0,0 +1,201 @@
+import threading
+import time
+from contextvars import ContextVar
+from bisect import bisect_left
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Upper bounds of the queries-per-request histogram, a route whose requests drift to the right has an N+1 query
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class RequestStats:
+    """Database and mapping work of one request, collected by the engine events and the mappers."""
+
+    __slots__ = ("queries", "db_seconds", "rows", "mapper_seconds")
+
+    def __init__(self) -> None:
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.mapper_seconds = 0.0
+
+
+request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+class RowCountingCursor:
+    """DBAPI cursor that adds the rows fetched through it to the rows of a counter, request stats or an audit record.
+
+    Used for statements whose driver reports no rowcount, SQLite and server-side cursors, the rows are counted as the
+    result is consumed.
+    """
+
+    def __init__(self, cursor, counter) -> None:
+        self._cursor = cursor
+        self._counter = counter
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._counter.rows += 1
+        return row
+
+    def fetchmany(self, *size):
+        rows = self._cursor.fetchmany(*size)
+        self._counter.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._counter.rows += len(rows)
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    stats = request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        stats.rows += max(cursor.rowcount, 0)
+        # Streamed results are fetched after this hook from context.cursor, their rows are counted as they come
+        if cursor.rowcount < 0 and cursor.description is not None and context is not None:
+            context.cursor = RowCountingCursor(context.cursor, stats)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Counts the statements, their time and rows of this engine into the stats of the current request.
+
+    Pass AsyncEngine.sync_engine for an async engine, its events fire on the underlying sync engine.
+    """
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def timed_mapping(convert):
+    """Wraps a converter so that its time is added to the mapper time of the current request."""
+
+    def timed_convert(orm_instance):
+        stats = request_stats.get()
+        if stats is None:
+            return convert(orm_instance)
+        start = time.perf_counter()
+        try:
+            return convert(orm_instance)
+        finally:
+            stats.mapper_seconds += time.perf_counter() - start
+
+    return timed_convert
+
+
+class RouteMetrics:
+    __slots__ = ("requests", "queries", "db_seconds", "rows", "mapper_seconds", "query_buckets")
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.mapper_seconds = 0.0
+        self.query_buckets = [0] * (len(QUERY_COUNT_BUCKETS) + 1)
+
+
+class MetricsRegistry:
+    """Totals of the request stats per route and method, rendered in the Prometheus text format."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._routes: dict[tuple[str, str], RouteMetrics] = {}
+
+    def record(self, method: str, route: str, stats: RequestStats) -> None:
+        with self._lock:
+            metrics = self._routes.get((method, route))
+            if metrics is None:
+                metrics = self._routes[(method, route)] = RouteMetrics()
+            metrics.requests += 1
+            metrics.queries += stats.queries
+            metrics.db_seconds += stats.db_seconds
+            metrics.rows += stats.rows
+            metrics.mapper_seconds += stats.mapper_seconds
+            metrics.query_buckets[bisect_left(QUERY_COUNT_BUCKETS, stats.queries)] += 1
+
+    def render(self, extra: list[str] | None = None) -> str:
+        with self._lock:
+            routes = sorted(self._routes.items())
+            lines = []
+            for name, kind, help_text, value in (
+                    ("bookz_http_requests_total", "counter", "Requests served", lambda m: m.requests),
+                    ("bookz_db_queries_total", "counter", "SQL statements executed", lambda m: m.queries),
+                    ("bookz_db_seconds_total", "counter", "Time spent in SQL statements",
+                     lambda m: round(m.db_seconds, 6)),
+                    ("bookz_db_rows_total", "counter",
+                     "Rows returned or changed by SQL statements, streamed ones as they are fetched", lambda m: m.rows),
+                    ("bookz_mapper_seconds_total", "counter", "Time spent mapping ORM instances to DTOs",
+                     lambda m: round(m.mapper_seconds, 6))):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(f'{name}{{method="{method}",route="{route}"}} {value(metrics)}'
+                             for (method, route), metrics in routes)
+            lines.append("# HELP bookz_db_queries_per_request SQL statements executed by one request")
+            lines.append("# TYPE bookz_db_queries_per_request histogram")
+            for (method, route), metrics in routes:
+                labels = f'method="{method}",route="{route}"'
+                cumulative = 0
+                for bound, count in zip((*QUERY_COUNT_BUCKETS, "+Inf"), metrics.query_buckets):
+                    cumulative += count
+                    lines.append(f'bookz_db_queries_per_request_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"bookz_db_queries_per_request_sum{{{labels}}} {metrics.queries}")
+                lines.append(f"bookz_db_queries_per_request_count{{{labels}}} {metrics.requests}")
+        return "\n".join(lines + (extra or [])) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._routes.clear()
+
+
+metrics_registry = MetricsRegistry()
+
+CACHE_COUNTERS = ("hits", "misses", "evictions", "expirations", "invalidations")
+
+
+def cache_metric_lines(cache: str, stats: dict[str, float]) -> list[str]:
+    """Prometheus lines of a cache's stats, counters for the CACHE_COUNTERS and gauges for the other values."""
+    lines = []
+    for field, value in stats.items():
+        kind = "counter" if field in CACHE_COUNTERS else "gauge"
+        name = f"bookz_{cache}_{field}{'_total' if kind == 'counter' else ''}"
+        lines.extend((f"# TYPE {name} {kind}", f"{name} {value}"))
+    return lines
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware that collects the stats of each HTTP request and records them under its route template.
+
+    The stats are recorded after the whole response is sent, so streamed exports include the queries of their body.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_stats.reset(token)
+            route = scope.get("route")
+            metrics_registry.record(scope["method"], getattr(route, "path", UNMATCHED_ROUTE), stats)
@@ -0,0 +1,182 @@
+"""Development and test mode that audits the SQL statements of every service call.
+
+Enabled with the query_audit variable: "warn" logs the findings of a call, "raise" raises QueryPatternDetected
+from it, so that a test exercising the call fails. "off", the default, leaves the services untouched and installs no
+hook on the engines. Tests can also install the hooks on their own engine with audit_engine and wrap any code in
+QueryAudit directly:
+
+    with QueryAudit("find_customer_by_id", mode="raise"):
+        service.find_customer_by_id(42)
+
+Two patterns are flagged, each with the code path of the bookz frames that issued the statement:
+  * N+1: the same statement shape (literal IN lists collapsed) runs query_audit_repeats times or more in one call,
+    typically a lazy load fired per instance by a mapper or a __repr__.
+  * Row explosion: a statement returns query_audit_row_ratio times more rows than the most numerous entity it
+    loaded, the cartesian product of joinedloads of two collections.
+"""
+import functools
+import inspect
+import os
+import re
+import traceback
+from contextvars import ContextVar
+from pathlib import Path
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Mapper
+from .exceptions.exceptions import QueryPatternDetected
+from .metrics import RowCountingCursor
+from .logger import app_logger
+
+QUERY_AUDIT_MODE = os.getenv('query_audit', 'off').lower()
+QUERY_AUDIT_ENABLED = QUERY_AUDIT_MODE in ("warn", "raise")
+QUERY_AUDIT_REPEATS = int(os.getenv('query_audit_repeats', '5'))
+QUERY_AUDIT_ROW_RATIO = float(os.getenv('query_audit_row_ratio', '3.0'))
+QUERY_AUDIT_MIN_ROWS = int(os.getenv('query_audit_min_rows', '20'))
+CODE_PATH_DEPTH = 6
+
+PACKAGE_DIR = Path(__file__).resolve().parent
+IN_LIST = re.compile(r"IN \((?:%\(\w+\)s(?:, )?)+\)")
+WHITESPACE = re.compile(r"\s+")
+
+current_audit: ContextVar['QueryAudit | None'] = ContextVar("current_audit", default=None)
+
+
+def statement_shape(statement: str) -> str:
+    return IN_LIST.sub("IN (...)", WHITESPACE.sub(" ", statement).strip())
+
+
+def code_path() -> str:
+    """Innermost bookz frames of the current stack outside of this module, or of the calling code for other callers."""
+    stack = [frame for frame in traceback.extract_stack() if frame.filename != __file__]
+    frames = [frame for frame in stack if frame.filename.startswith(str(PACKAGE_DIR))]
+    if not frames:
+        frames = [frame for frame in stack if "site-packages" not in frame.filename and "<frozen" not in frame.filename]
+    return " <- ".join(f"{frame.filename.removeprefix(str(PACKAGE_DIR) + os.sep)}:{frame.lineno} {frame.name}"
+                       for frame in reversed(frames[-CODE_PATH_DEPTH:]))
+
+
+class StatementRecord:
+    __slots__ = ("shape", "rows", "entities", "code_path")
+
+    def __init__(self, shape: str, rows: int, path: str) -> None:
+        self.shape = shape
+        self.rows = rows
+        self.entities: dict[str, set] = {}
+        self.code_path = path
+
+
+class QueryAudit:
+    """Records the statements run inside it and the entities they load, and reports the patterns found on exit.
+
+    Nested audits join the outermost one, so a service call that calls another is reported once.
+    """
+
+    def __init__(self, name: str, mode: str = "raise", repeats: int = QUERY_AUDIT_REPEATS,
+                 row_ratio: float = QUERY_AUDIT_ROW_RATIO, min_rows: int = QUERY_AUDIT_MIN_ROWS) -> None:
+        self.name = name
+        self.mode = mode
+        self.repeats = repeats
+        self.row_ratio = row_ratio
+        self.min_rows = min_rows
+        self.statements: list[StatementRecord] = []
+        self._token = None
+
+    def __enter__(self) -> 'QueryAudit':
+        if current_audit.get() is None:
+            self._token = current_audit.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self._token is None:
+            return
+        current_audit.reset(self._token)
+        self._token = None
+        findings = self.findings()
+        if not findings or exc_type is not None:
+            return
+        report = f"{self.name} ran {len(self.statements)} statement(s) with query pattern(s):\n" + "\n".join(findings)
+        if self.mode == "raise":
+            raise QueryPatternDetected(report)
+        app_logger.warning(report)
+
+    def record_statement(self, statement: str, rows: int) -> StatementRecord:
+        record = StatementRecord(statement_shape(statement), rows, code_path())
+        self.statements.append(record)
+        return record
+
+    def record_load(self, orm_instance) -> None:
+        if self.statements:
+            entities = self.statements[-1].entities
+            entities.setdefault(orm_instance.__class__.__name__, set()).add(id(orm_instance))
+
+    def findings(self) -> list[str]:
+        findings = []
+        by_shape: dict[str, list[StatementRecord]] = {}
+        for record in self.statements:
+            by_shape.setdefault(record.shape, []).append(record)
+        for shape, records in by_shape.items():
+            if len(records) >= self.repeats:
+                findings.append(f"  N+1: {len(records)}x {shape[:240]}\n    at {records[1].code_path}")
+        for record in self.statements:
+            if record.rows < self.min_rows or not record.entities:
+                continue
+            entity, instances = max(record.entities.items(), key=lambda item: len(item[1]))
+            if record.rows > self.row_ratio * len(instances):
+                findings.append(f"  Row explosion: {record.rows} rows for {len(instances)} distinct {entity}: "
+                                f"{record.shape[:240]}\n    at {record.code_path}")
+        return findings
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    audit = current_audit.get()
+    if audit is None:
+        return
+    record = audit.record_statement(statement, max(cursor.rowcount, 0))
+    # The result is built from context.cursor after this hook, so its rows can still be counted as they are fetched
+    if cursor.rowcount < 0 and cursor.description is not None and context is not None:
+        context.cursor = RowCountingCursor(context.cursor, record)
+
+
+def _on_load(orm_instance, context) -> None:
+    audit = current_audit.get()
+    if audit is not None:
+        audit.record_load(orm_instance)
+
+
+def audit_engine(engine: Engine) -> None:
+    """Feeds the statements of this engine and the instances they load to the active QueryAudit.
+
+    Pass AsyncEngine.sync_engine for async ones. The hooks run on every statement and loaded row, the app installs
+    them only when QUERY_AUDIT_ENABLED, tests install them on their own engine.
+    """
+    if not event.contains(engine, "after_cursor_execute", _after_cursor_execute):
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    if not event.contains(Mapper, "load", _on_load):
+        event.listen(Mapper, "load", _on_load)
+
+
+def audited(cls):
+    """Class decorator that runs every public method of a service in a QueryAudit when query_audit is enabled."""
+    if not QUERY_AUDIT_ENABLED:
+        return cls
+    for name, method in list(vars(cls).items()):
+        if name.startswith("_") or not inspect.isfunction(method):
+            continue
+        setattr(cls, name, _audit_call(method, f"{cls.__name__}.{name}"))
+    return cls
+
+
+def _audit_call(method, name: str):
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def audited_coroutine(*args, **kwargs):
+            with QueryAudit(name, QUERY_AUDIT_MODE):
+                return await method(*args, **kwargs)
+        return audited_coroutine
+
+    @functools.wraps(method)
+    def audited_method(*args, **kwargs):
+        with QueryAudit(name, QUERY_AUDIT_MODE):
+            return method(*args, **kwargs)
+    return audited_method
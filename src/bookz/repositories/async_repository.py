@@ -0,0 +1,475 @@
+from sqlalchemy import select, insert, update, delete, func, values, column, Integer, Row
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncScalarResult
+from sqlalchemy.orm import selectinload, noload, with_loader_criteria
+from .orm_models import Author, Book, BookAuthor, BookCopy, Customer, Placement
+from ..enums.enums import PlacementStatus, BookStatus, BookStatement, PlacementLocality
+from .book_search import book_search_ranking_stmt
+from .placement_allocator import free_places_stmt, anchor_place_stmt, allocation_scopes, DEFAULT_LOCALITY
+from ..mappers.mappers import AuthorMapper, BookMapper, BookCopyMapper, CustomerMapper
+
+
+class AsyncBookRepository:
+    """Queries of the API services.
+
+    Relationships are never lazy loaded under AsyncSession, so every read method eagerly loads the graph that
+    the mappers serialize for its result.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    #Depository
+    async def get_depository_stats(self) -> Row:
+        stmt = (select(func.max(Placement.line_id).label("max_lines"),
+                       func.max(Placement.column_id).label("max_columns"),
+                       func.max(Placement.shelf_id).label("max_shelves"),
+                       func.max(Placement.position).label("max_positions"),
+                       func.count().label("total_places"),
+                       func.count().filter(Placement.status == PlacementStatus.OCCUPIED).label("books_in_storage"),
+                       func.count().filter(Placement.status == PlacementStatus.FREE).label("free_places")))
+        return (await self.session.execute(stmt)).one()
+
+    async def find_free_place(self, number: int, book_id: int | None = None,
+                              locality: PlacementLocality = DEFAULT_LOCALITY) -> list[int]:
+        anchor = None
+        if book_id is not None and locality != PlacementLocality.NONE:
+            anchor = await self.session.scalar(anchor_place_stmt(book_id))
+        places: list[int] = []
+        for scope in allocation_scopes(anchor, locality):
+            stmt = free_places_stmt(number - len(places), anchor=anchor, scope=scope, exclude_ids=places)
+            places.extend((await self.session.scalars(stmt)).all())
+            if len(places) >= number:
+                break
+        return places
+
+    async def change_place_status(self, place_id: int, status: PlacementStatus) -> Placement:
+        stmt = (
+            update(Placement)
+            .where(Placement.id == place_id)
+            .values(status=status)
+            .returning(Placement)
+        )
+        return await self.session.scalar(stmt)
+
+    async def change_places_status(self, place_ids: list[int], status: PlacementStatus) -> list[Placement]:
+        stmt = (
+            update(Placement)
+            .where(Placement.id.in_(place_ids))
+            .values(status=status)
+            .returning(Placement)
+        )
+        return list((await self.session.scalars(stmt)).all())
+
+    #Author
+    async def find_author(self, author: dict) -> Author | None:
+        stmt = (
+            select(Author)
+            .where(
+                (Author.first_name == author["first_name"])
+                & (Author.last_name == author["last_name"])
+                & (Author.middle_name == author["middle_name"])
+            )
+            .options(*AuthorMapper.author_loader_options,
+                     with_loader_criteria(BookCopy, BookCopy.status == BookStatus.AVAILABLE))
+        )
+        return await self.session.scalar(stmt)
+
+    async def find_author_by_id(self, author_id: int, by_update: bool = False,
+                                loader_options: list | None = None) -> Author | None:
+        stmt = (
+            select(Author)
+            .where((Author.id == author_id))
+            .options(*(loader_options or AuthorMapper.author_loader_options),
+                     with_loader_criteria(BookCopy, BookCopy.status == BookStatus.AVAILABLE))
+        )
+        if by_update:
+            stmt = stmt.with_for_update()
+        return await self.session.scalar(stmt)
+
+    async def find_authors_without_book(self, for_update: bool = False) -> list[int]:
+        stmt = (
+            select(Author.id)
+            .outerjoin(Author.books)
+            .filter(Author.books == None)
+        )
+        if for_update:
+            stmt = stmt.with_for_update()
+        return list((await self.session.scalars(stmt)).all())
+
+    async def create_author(self, new_author: dict) -> Author:
+        stmt = (
+            insert(Author)
+            .values(new_author)
+            .returning(Author)
+            .options(noload(Author.books))
+        )
+        return await self.session.scalar(stmt)
+
+    async def update_author(self, new_author: dict) -> Author | None:
+        # The id is GENERATED ALWAYS, PostgreSQL refuses to set it even to its own value
+        stmt = (
+            update(Author)
+            .values({column: value for column, value in new_author.items() if column != "id"})
+            .where(Author.id == new_author["id"])
+            .returning(Author)
+        )
+        return await self.session.scalar(stmt)
+
+    async def delete_author_by_id(self, author_id: int) -> Author:
+        stmt = (
+            delete(Author)
+            .where(Author.id == author_id)
+            .returning(Author)
+            .options(noload(Author.books))
+        )
+        return await self.session.scalar(stmt)
+
+    async def delete_authors_by_ids(self, author_ids: list[int]) -> list[Author]:
+        stmt = (
+            delete(Author)
+            .where(Author.id.in_(author_ids))
+            .returning(Author)
+            .options(noload(Author.books))
+        )
+        return list((await self.session.scalars(stmt)).all())
+
+    async def find_author_names(self, ids: list[int] | None = None) -> list[Row]:
+        stmt = select(Author.id, Author.first_name, Author.last_name, Author.middle_name)
+        if ids is not None:
+            stmt = stmt.where(Author.id.in_(ids))
+        return list((await self.session.execute(stmt)).all())
+
+    async def find_book_author_ids(self, book_ids: list[int]) -> list[int]:
+        stmt = select(BookAuthor.author_id).where(BookAuthor.book_id.in_(book_ids)).distinct()
+        return list((await self.session.scalars(stmt)).all())
+
+    #Book
+    async def find_book_by_id(self, book_id: int, for_update: bool = False,
+                              loader_options: list | None = None) -> Book | None:
+        stmt = (
+            select(Book)
+            .where((Book.book_id == book_id))
+            .options(*(loader_options or BookMapper.book_loader_options))
+        )
+        if for_update:
+            stmt = stmt.with_for_update(of=Book)
+        return (await self.session.scalars(stmt)).one_or_none()
+
+    async def find_book_by_isbn(self, isbn: str, loader_options: list | None = None) -> Book | None:
+        stmt = (
+            select(Book)
+            .where((Book.isbn == isbn))
+            .options(*(loader_options or BookMapper.book_loader_options))
+        )
+        return (await self.session.scalars(stmt)).one_or_none()
+
+    async def find_books_by_isbns(self, isbns: list[str]) -> list[Book]:
+        stmt = (
+            select(Book)
+            .where(Book.isbn.in_(isbns))
+            .options(*BookMapper.book_loader_options)
+        )
+        return list((await self.session.scalars(stmt)).all())
+
+    async def find_book_without_copy(self, for_update: bool = False) -> list[Book]:
+        stmt = (
+            select(Book)
+            .outerjoin(Book.book_copies)
+            .where(Book.book_copies == None)
+            .options(selectinload(Book.authors).options(noload(Author.books)),
+                     noload(Book.book_copies))
+        )
+        if for_update:
+            stmt = stmt.with_for_update(of=Book)
+        return list((await self.session.scalars(stmt)).all())
+
+    async def create_book(self, book: dict) -> Book:
+        stmt = (
+            insert(Book)
+            .values(book)
+            .returning(Book)
+        )
+        return await self.session.scalar(stmt)
+
+    async def delete_books(self, book_ids: list[int]) -> list[Book]:
+        stmt = (
+            delete(Book)
+            .where(Book.book_id.in_(book_ids))
+            .returning(Book)
+            .options(noload(Book.authors), noload(Book.book_copies))
+        )
+        return list((await self.session.scalars(stmt)).all())
+
+    async def delete_book_by_id(self, book_id: int) -> Book:
+        stmt = (
+            delete(Book)
+            .where(Book.book_id == book_id)
+            .returning(Book)
+            .options(noload(Book.authors), noload(Book.book_copies))
+        )
+        return await self.session.scalar(stmt)
+
+    async def search_books(self, query: str, limit: int, offset: int = 0) -> list[Row]:
+        ranking = book_search_ranking_stmt(query, limit, offset).subquery()
+        stmt = (
+            select(Book, ranking.c.rank)
+            .join(ranking, ranking.c.book_id == Book.book_id)
+            .order_by(ranking.c.rank.desc(), Book.book_id)
+            .options(*BookMapper.book_search_loader_options)
+        )
+        return list((await self.session.execute(stmt)).all())
+
+    #Book-Author relation
+    async def find_books_by_author_id(self, author_id: int) -> list[int]:
+        stmt = (
+            select(BookAuthor.book_id)
+            .where(BookAuthor.author_id == author_id)
+        )
+        return list((await self.session.scalars(stmt)).all())
+
+    async def create_author_book_rel(self, book_id: int, author_id: int) -> BookAuthor:
+        stmt = (
+            insert(BookAuthor)
+            .values({"book_id": book_id, "author_id": author_id})
+            .returning(BookAuthor)
+        )
+        return await self.session.scalar(stmt)
+
+    #BookCopies
+    async def find_book_copy(self, copy_id: int, for_update: bool = False, loader_options: list | None = None,
+                             populate_existing: bool = False) -> BookCopy | None:
+        stmt = (
+            select(BookCopy)
+            .where((BookCopy.copy_id == copy_id))
+            .options(*(loader_options or BookCopyMapper.book_copy_loader_options))
+        )
+        if for_update:
+            stmt = stmt.with_for_update(of=BookCopy)
+        if populate_existing:
+            stmt = stmt.execution_options(populate_existing=True)
+        return await self.session.scalar(stmt)
+
+    async def find_book_copies_by_ids(self, ids: list[int], for_update: bool = False,
+                                      populate_existing: bool = False) -> list[BookCopy]:
+        stmt = (
+            select(BookCopy)
+            .where(BookCopy.copy_id.in_(ids))
+            .options(*BookCopyMapper.book_copy_loader_options)
+            .order_by(BookCopy.copy_id)
+        )
+        if for_update:
+            stmt = stmt.with_for_update(of=BookCopy)
+        if populate_existing:
+            stmt = stmt.execution_options(populate_existing=True)
+        return list((await self.session.scalars(stmt)).all())
+
+    async def find_book_copies_by_book_id(self, book_id: int, for_update: bool = False) -> list[BookCopy]:
+        stmt = (
+            select(BookCopy)
+            .where(BookCopy.book_id == book_id)
+            .options(*BookCopyMapper.book_copy_loader_options)
+        )
+        if for_update:
+            stmt = stmt.with_for_update(of=BookCopy)
+        return list((await self.session.scalars(stmt)).all())
+
+    async def find_book_copies_for_status(self, status: BookStatus, limit: int | None = None,
+                                          after: int | None = None) -> list[BookCopy]:
+        stmt = (
+            select(BookCopy)
+            .where(BookCopy.status == status)
+            .order_by(BookCopy.copy_id)
+            .limit(limit)
+            .options(*BookCopyMapper.book_copy_loader_options)
+        )
+        if after is not None:
+            stmt = stmt.where(BookCopy.copy_id > after)
+        return list((await self.session.scalars(stmt)).all())
+
+    async def find_book_copies_for_statement(self, statement: BookStatement, limit: int | None = None,
+                                             after: int | None = None) -> list[BookCopy]:
+        stmt = (
+            select(BookCopy)
+            .where(BookCopy.statement == statement)
+            .order_by(BookCopy.copy_id)
+            .limit(limit)
+            .options(*BookCopyMapper.book_copy_loader_options)
+        )
+        if after is not None:
+            stmt = stmt.where(BookCopy.copy_id > after)
+        return list((await self.session.scalars(stmt)).all())
+
+    async def create_book_copy(self, book_copy: dict) -> BookCopy:
+        stmt = (
+            insert(BookCopy)
+            .values(book_copy)
+            .returning(BookCopy.copy_id)
+        )
+        copy_id = await self.session.scalar(stmt)
+        return await self.find_book_copy(copy_id)
+
+    async def create_book_copies(self, book_copies: list[dict]) -> list[BookCopy]:
+        stmt = (
+            insert(BookCopy)
+            .values(book_copies)
+            .returning(BookCopy.copy_id)
+        )
+        ids = list((await self.session.scalars(stmt)).all())
+        return await self.find_book_copies_by_ids(ids)
+
+    async def update_book_copy(self, copy_id: int, book_copy: dict) -> BookCopy:
+        stmt = (
+            update(BookCopy)
+            .where(BookCopy.copy_id == copy_id)
+            .values(book_copy)
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.execute(stmt)
+        return await self.find_book_copy(copy_id, populate_existing=True)
+
+    async def update_book_copies(self, copy_ids: list[int], book_copy: dict) -> list[BookCopy]:
+        stmt = (
+            update(BookCopy)
+            .where(BookCopy.copy_id.in_(copy_ids))
+            .values(book_copy)
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.execute(stmt)
+        return await self.find_book_copies_by_ids(copy_ids, populate_existing=True)
+
+    async def place_book_copies(self, placements: dict[int, int], book_copy: dict) -> list[BookCopy]:
+        """Sets the values of book_copy and the placement_id of placements (copy_id: placement_id) in one UPDATE."""
+        rows = values(column("copy_id", Integer), column("placement_id", Integer),
+                      name="new_placements").data(list(placements.items()))
+        stmt = (
+            update(BookCopy)
+            .where(BookCopy.copy_id == rows.c.copy_id)
+            .values({**book_copy, "placement_id": rows.c.placement_id})
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.execute(stmt)
+        return await self.find_book_copies_by_ids(list(placements), populate_existing=True)
+
+    async def delete_book_copy(self, copy_id: int) -> BookCopy | None:
+        stmt = (
+            delete(BookCopy)
+            .where(BookCopy.copy_id == copy_id)
+            .returning(BookCopy)
+            .options(selectinload(BookCopy.book).options(selectinload(Book.authors).options(noload(Author.books)),
+                                                         noload(Book.book_copies)),
+                     noload(BookCopy.customer),
+                     noload(BookCopy.placement))
+        )
+        return await self.session.scalar(stmt)
+
+    async def delete_book_copies_by_ids(self, ids: list[int]) -> list[int]:
+        stmt = (
+            delete(BookCopy)
+            .where(BookCopy.copy_id.in_(ids))
+            .returning(BookCopy.copy_id)
+        )
+        return list((await self.session.scalars(stmt)).all())
+
+    #Customer
+    async def find_customer_by_id(self, customer_id: int, for_update: bool = False,
+                                  loader_options: list | None = None) -> Customer | None:
+        stmt = (
+            select(Customer)
+            .where(Customer.customer_id == customer_id)
+            .options(*(loader_options or CustomerMapper.customer_loader_options))
+        )
+        if for_update:
+            stmt = stmt.with_for_update(of=Customer)
+        return (await self.session.scalars(stmt)).one_or_none()
+
+    async def find_customers_by_ids(self, ids: list[int]) -> list[Customer]:
+        stmt = (
+            select(Customer)
+            .where(Customer.customer_id.in_(ids))
+            .options(*CustomerMapper.customer_loader_options)
+        )
+        return list((await self.session.scalars(stmt)).all())
+
+    async def find_customer_by_email(self, email: str, for_update: bool = False) -> Customer | None:
+        stmt = (
+            select(Customer)
+            .where(Customer.email == email)
+            .options(*CustomerMapper.customer_loader_options)
+        )
+        if for_update:
+            stmt = stmt.with_for_update(of=Customer)
+        return (await self.session.scalars(stmt)).one_or_none()
+
+    async def find_customer_by_phone(self, phone: str, for_update: bool = False) -> Customer | None:
+        stmt = (
+            select(Customer)
+            .where(Customer.phone == phone)
+            .options(*CustomerMapper.customer_loader_options)
+        )
+        if for_update:
+            stmt = stmt.with_for_update(of=Customer)
+        return (await self.session.scalars(stmt)).one_or_none()
+
+    async def find_customer_by_fullname(self, fullname: dict, for_update: bool = False) -> Customer | None:
+        stmt = (
+            select(Customer)
+            .where((Customer.first_name == fullname['first_name'])
+                   & (Customer.last_name == fullname['last_name'])
+                   & (Customer.middle_name == fullname['middle_name']))
+            .options(*CustomerMapper.customer_loader_options)
+        )
+        if for_update:
+            stmt = stmt.with_for_update(of=Customer)
+        return (await self.session.scalars(stmt)).one_or_none()
+
+    async def create_customer(self, new_customer: dict) -> Customer:
+        stmt = (
+            insert(Customer)
+            .values(new_customer)
+            .returning(Customer)
+            .options(noload(Customer.borrowed_books))
+        )
+        return await self.session.scalar(stmt)
+
+    async def update_customer(self, customer_id: int, new_customer: dict) -> Customer:
+        stmt = (
+            update(Customer)
+            .where(Customer.customer_id == customer_id)
+            .values(new_customer)
+            .returning(Customer)
+        )
+        return await self.session.scalar(stmt)
+
+    async def find_customer_names(self, ids: list[int] | None = None) -> list[Row]:
+        stmt = select(Customer.customer_id, Customer.first_name, Customer.last_name, Customer.middle_name)
+        if ids is not None:
+            stmt = stmt.where(Customer.customer_id.in_(ids))
+        return list((await self.session.execute(stmt)).all())
+
+    #Export
+    async def stream_books(self, batch_size: int) -> AsyncScalarResult[Book]:
+        stmt = (
+            select(Book)
+            .order_by(Book.book_id)
+            .options(*BookMapper.book_export_loader_options)
+            .execution_options(yield_per=batch_size)
+        )
+        return await self.session.stream_scalars(stmt)
+
+    async def stream_book_copies(self, batch_size: int) -> AsyncScalarResult[BookCopy]:
+        stmt = (
+            select(BookCopy)
+            .order_by(BookCopy.copy_id)
+            .options(*BookCopyMapper.book_copy_export_loader_options)
+            .execution_options(yield_per=batch_size)
+        )
+        return await self.session.stream_scalars(stmt)
+
+    async def stream_customers(self, batch_size: int) -> AsyncScalarResult[Customer]:
+        stmt = (
+            select(Customer)
+            .order_by(Customer.customer_id)
+            .options(*CustomerMapper.customer_export_loader_options)
+            .execution_options(yield_per=batch_size)
+        )
+        return await self.session.stream_scalars(stmt)
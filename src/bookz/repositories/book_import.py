@@ -0,0 +1,152 @@
+from typing import Iterable
+from sqlalchemy import (MetaData, Table, Column, Integer, SmallInteger, Float, String, Row, select, insert, update,
+                        delete, exists, and_, cast, literal, text, ColumnElement)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from .orm_models import Author, Book, BookAuthor, BookCopy, Placement
+from .bulk_loader import BulkLoader
+from .placement_allocator import free_places_stmt
+from ..enums.enums import BookStatus, PlacementStatus
+
+# Temporary tables of one import, dropped by PostgreSQL when the import transaction ends
+STAGING_METADATA = MetaData()
+
+staged_books = Table(
+    "staged_books", STAGING_METADATA,
+    Column("row_no", Integer, primary_key=True, autoincrement=False),
+    Column("title", String(120), nullable=False),
+    Column("publisher", String(80), nullable=False),
+    Column("place_of_publication", String(80), nullable=False),
+    Column("published_year", SmallInteger, nullable=False),
+    Column("isbn", String(20), nullable=False, unique=True),
+    Column("pages", Integer, nullable=False),
+    Column("price", Float),
+    Column("language", String(3)),
+    Column("new_copies", Integer, nullable=False),
+    Column("copy_statement", String(20), nullable=False),
+    prefixes=["TEMPORARY"], postgresql_on_commit="DROP",
+)
+
+staged_book_authors = Table(
+    "staged_book_authors", STAGING_METADATA,
+    Column("row_no", Integer, nullable=False, index=True),
+    Column("first_name", String(40), nullable=False),
+    Column("last_name", String(80), nullable=False),
+    Column("middle_name", String(40)),
+    prefixes=["TEMPORARY"], postgresql_on_commit="DROP",
+)
+
+staged_copies = Table(
+    "staged_copies", STAGING_METADATA,
+    Column("row_no", Integer, nullable=False),
+    Column("placement_id", Integer, nullable=False),
+    prefixes=["TEMPORARY"], postgresql_on_commit="DROP",
+)
+
+STAGED_BOOK_COLUMNS = [column.name for column in staged_books.columns]
+STAGED_AUTHOR_COLUMNS = [column.name for column in staged_book_authors.columns]
+BOOK_COLUMNS = ["title", "publisher", "place_of_publication", "published_year", "isbn", "pages", "price", "language"]
+
+
+def same_author(names) -> ColumnElement[bool]:
+    return and_(Author.first_name == names.c.first_name, Author.last_name == names.c.last_name,
+                Author.middle_name.is_not_distinct_from(names.c.middle_name))
+
+
+class BookImportRepository:
+    """Set-based statements of the bulk book import.
+
+    Rows are COPYed into temporary staging tables, checked and trimmed there, and then moved into the catalog tables
+    with one INSERT ... SELECT per table. Must run inside a single transaction of the session.
+    """
+
+    def __init__(self, session: Session, loader: BulkLoader):
+        self.session = session
+        self.loader = loader
+
+    def create_staging(self) -> None:
+        STAGING_METADATA.create_all(self.session.connection(), checkfirst=False)
+
+    def analyze_staging(self) -> None:
+        # Autovacuum never analyzes temporary tables, the planner needs their statistics for the joins below
+        self.session.execute(text(f"ANALYZE {', '.join(table.name for table in STAGING_METADATA.sorted_tables)}"))
+
+    def stage_books(self, rows: Iterable[tuple]) -> int:
+        return self.loader.copy_rows(staged_books, STAGED_BOOK_COLUMNS, rows)
+
+    def stage_book_authors(self, rows: Iterable[tuple]) -> int:
+        return self.loader.copy_rows(staged_book_authors, STAGED_AUTHOR_COLUMNS, rows)
+
+    def stage_copies(self, rows: Iterable[tuple]) -> int:
+        return self.loader.copy_rows(staged_copies, ["row_no", "placement_id"], rows)
+
+    def find_present_isbns(self) -> list[Row]:
+        stmt = (
+            select(staged_books.c.row_no, staged_books.c.isbn)
+            .join(Book, Book.isbn == staged_books.c.isbn)
+        )
+        return list(self.session.execute(stmt).all())
+
+    def discard_rows(self, row_nos: list[int]) -> None:
+        self.session.execute(delete(staged_book_authors).where(staged_book_authors.c.row_no.in_(row_nos)))
+        self.session.execute(delete(staged_books).where(staged_books.c.row_no.in_(row_nos)))
+
+    def find_copy_demand(self) -> list[Row]:
+        stmt = (
+            select(staged_books.c.row_no, staged_books.c.isbn, staged_books.c.new_copies)
+            .order_by(staged_books.c.row_no)
+        )
+        return list(self.session.execute(stmt).all())
+
+    def find_free_places(self, number: int) -> list[int]:
+        return list(self.session.scalars(free_places_stmt(number)).all())
+
+    def upsert_authors(self) -> int:
+        names = select(staged_book_authors.c.first_name, staged_book_authors.c.last_name,
+                       staged_book_authors.c.middle_name).distinct().subquery()
+        stmt = (
+            pg_insert(Author)
+            .from_select(["first_name", "last_name", "middle_name"],
+                         select(names).where(~exists().where(same_author(names))))
+            .on_conflict_do_nothing(constraint='uq_author_full_name')
+        )
+        return self.session.execute(stmt).rowcount
+
+    def insert_books(self) -> int:
+        stmt = insert(Book).from_select(BOOK_COLUMNS, select(*(staged_books.c[column] for column in BOOK_COLUMNS))
+                                        .order_by(staged_books.c.row_no))
+        return self.session.execute(stmt).rowcount
+
+    def insert_book_authors(self) -> int:
+        stmt = insert(BookAuthor).from_select(
+            ["book_id", "author_id"],
+            select(Book.book_id, Author.id)
+            .select_from(staged_book_authors)
+            .join(staged_books, staged_books.c.row_no == staged_book_authors.c.row_no)
+            .join(Book, Book.isbn == staged_books.c.isbn)
+            .join(Author, same_author(staged_book_authors))
+            .distinct()
+        )
+        return self.session.execute(stmt).rowcount
+
+    def insert_book_copies(self) -> int:
+        stmt = insert(BookCopy).from_select(
+            ["book_id", "status", "statement", "placement_id"],
+            select(Book.book_id, literal(BookStatus.AVAILABLE, BookCopy.__table__.c.status.type),
+                   cast(staged_books.c.copy_statement, BookCopy.__table__.c.statement.type),
+                   staged_copies.c.placement_id)
+            .select_from(staged_copies)
+            .join(staged_books, staged_books.c.row_no == staged_copies.c.row_no)
+            .join(Book, Book.isbn == staged_books.c.isbn)
+            .order_by(staged_copies.c.row_no, staged_copies.c.placement_id)
+        )
+        return self.session.execute(stmt).rowcount
+
+    def occupy_staged_places(self) -> int:
+        stmt = (
+            update(Placement)
+            .where(Placement.id.in_(select(staged_copies.c.placement_id)))
+            .values(status=PlacementStatus.OCCUPIED)
+            .execution_options(synchronize_session=False)
+        )
+        return self.session.execute(stmt).rowcount
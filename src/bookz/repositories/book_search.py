@@ -0,0 +1,31 @@
+from sqlalchemy import select, union_all, func, or_, bindparam, String, Select
+from .orm_models import (Book, BookAuthor, Author, SEARCH_CONFIG, book_search_document, author_search_document,
+                         author_search_name)
+
+
+def book_search_ranking_stmt(query: str, limit: int, offset: int = 0) -> Select:
+    """Selects (book_id, rank) of the books matching the query, best matches first.
+
+    A book matches when the query words are found in its title/publisher or in an author name (full text), or when
+    the query is close to a word sequence in them (trigram word similarity, which tolerates typos). Every branch is
+    served by its own GIN index and a book's rank is the sum of the ranks of the branches it matched.
+    """
+    text_query = bindparam("query", query, type_=String)
+    ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, text_query)
+    candidates = union_all(
+        select(Book.book_id, func.ts_rank_cd(book_search_document, ts_query).label("rank"))
+        .where(book_search_document.op('@@')(ts_query)),
+        select(Book.book_id, func.greatest(func.word_similarity(text_query, Book.title),
+                                           func.word_similarity(text_query, Book.publisher)).label("rank"))
+        .where(or_(text_query.op('<%')(Book.title), text_query.op('<%')(Book.publisher))),
+        select(BookAuthor.book_id, (func.ts_rank_cd(author_search_document, ts_query)
+                                    + func.word_similarity(text_query, author_search_name)).label("rank"))
+        .join(Author, Author.id == BookAuthor.author_id)
+        .where(or_(author_search_document.op('@@')(ts_query), text_query.op('<%')(author_search_name))),
+    ).subquery()
+    rank = func.sum(candidates.c.rank).label("rank")
+    return (select(candidates.c.book_id, rank)
+            .group_by(candidates.c.book_id)
+            .order_by(rank.desc(), candidates.c.book_id)
+            .limit(limit)
+            .offset(offset))
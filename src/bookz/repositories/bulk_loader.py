@@ -0,0 +1,119 @@
+import csv
+import io
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Iterable, Iterator
+from sqlalchemy import Table, text, insert, update, select
+from sqlalchemy.orm import Session
+from .orm_models import Placement, BookCopy
+from ..enums.enums import PlacementStatus
+from ..logger import app_logger
+
+NULL_MARKER = r'\N'
+
+
+@dataclass
+class Phase:
+    name: str
+    rows: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+@dataclass
+class PhaseTimer:
+    """Collects wall time and row counts of the seeding phases."""
+    phases: list[Phase] = field(default_factory=list)
+
+    @contextmanager
+    def measure(self, name: str) -> Iterator[Phase]:
+        phase = Phase(name)
+        start = time.perf_counter()
+        try:
+            yield phase
+        finally:
+            phase.seconds = time.perf_counter() - start
+            self.phases.append(phase)
+            app_logger.info(f"Phase '{name}': {phase.rows} rows in {phase.seconds:.3f}s "
+                            f"({phase.rows_per_second:.0f} rows/s)")
+
+    def report(self) -> dict:
+        total_rows = sum(phase.rows for phase in self.phases)
+        total_seconds = sum(phase.seconds for phase in self.phases)
+        return {
+            "phases": [{"name": phase.name, "rows": phase.rows, "seconds": round(phase.seconds, 3),
+                        "rows_per_second": round(phase.rows_per_second, 1)} for phase in self.phases],
+            "total_rows": total_rows,
+            "total_seconds": round(total_seconds, 3),
+        }
+
+
+class BulkLoader:
+    """Streams rows into PostgreSQL with COPY FROM STDIN inside the session transaction.
+
+    When the DBAPI connection has no COPY support the rows are sent as multi-row INSERT statements instead.
+    """
+
+    def __init__(self, session: Session, chunk_size: int = 10_000):
+        self.session = session
+        self.chunk_size = chunk_size
+        self.timer = PhaseTimer()
+
+    def copy_rows(self, table: Table, columns: list[str], rows: Iterable[tuple]) -> int:
+        connection = self.session.connection()
+        if connection.dialect.driver == 'psycopg2':
+            return self._copy_expert(connection.connection.dbapi_connection, table, columns, rows)
+        return self._insert_many(table, columns, rows)
+
+    def _copy_expert(self, dbapi_connection, table: Table, columns: list[str], rows: Iterable[tuple]) -> int:
+        sql = (f"COPY {table.name} ({', '.join(columns)}) FROM STDIN "
+               f"WITH (FORMAT csv, NULL '{NULL_MARKER}')")
+        total = 0
+        rows = iter(rows)
+        with dbapi_connection.cursor() as cursor:
+            while chunk := list(islice(rows, self.chunk_size)):
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerows(self._csv_row(row) for row in chunk)
+                buffer.seek(0)
+                cursor.copy_expert(sql, buffer)
+                total += len(chunk)
+        return total
+
+    def _insert_many(self, table: Table, columns: list[str], rows: Iterable[tuple]) -> int:
+        total = 0
+        rows = iter(rows)
+        while chunk := list(islice(rows, self.chunk_size)):
+            self.session.execute(insert(table), [dict(zip(columns, row)) for row in chunk])
+            total += len(chunk)
+        return total
+
+    @staticmethod
+    def _csv_row(row: tuple) -> list:
+        return [NULL_MARKER if value is None else getattr(value, 'name', value) for value in row]
+
+    def create_placements(self, lines: int, columns: int, shelves: int, positions: int) -> int:
+        stmt = text(
+            "INSERT INTO placements (line_id, column_id, shelf_id, position, status) "
+            "SELECT chr(64 + l), c, chr(64 + s), p, CAST(:status AS placement_status) "
+            "FROM generate_series(1, :lines) AS l, generate_series(1, :columns) AS c, "
+            "generate_series(1, :shelves) AS s, generate_series(1, :positions) AS p "
+            "ORDER BY l, c, s, p"
+        )
+        result = self.session.execute(stmt, {"status": PlacementStatus.FREE.name, "lines": lines,
+                                             "columns": columns, "shelves": shelves, "positions": positions})
+        return result.rowcount
+
+    def occupy_placements_of_copies(self) -> int:
+        stmt = (
+            update(Placement)
+            .where(Placement.id.in_(select(BookCopy.placement_id).where(BookCopy.placement_id.is_not(None))))
+            .values(status=PlacementStatus.OCCUPIED)
+            .execution_options(synchronize_session=False)
+        )
+        return self.session.execute(stmt).rowcount
@@ -1,68 +1,165 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future
+from itertools import islice
+from typing import Iterator
 import faker
-from ..orm_models import Author, Book, Customer
 from ...mappers.mappers import PhoneMapper
 
 
-fake_gen = faker.Faker("uk_UA")
 male_patronymic_suffixes = ['ович', 'евич', 'ич', 'ійович', 'йович', 'ов', 'ев', 'ій']
 female_patronymic_suffixes = ['івна', 'ївна', 'ична', 'ївна', 'ївна', 'ова', 'ева', 'ія']
 
 
-def generate_fake_authors(quantity: int) -> list[Author]:
-    fake_authors: list[Author] = []
-    for _ in range(quantity):
-        sex = fake_gen.random_element(elements=('M', 'F'))
-        if sex == 'M':
-            last_name = fake_gen.last_name_male()
-            first_name = fake_gen.first_name_male()
-            middle_name = fake_gen.first_name_male() + fake_gen.random_element(
-                male_patronymic_suffixes) if fake_gen.boolean(chance_of_getting_true=70) else None
-        else:
-            last_name = fake_gen.last_name_female()
-            first_name = fake_gen.first_name_female()
-            middle_name = fake_gen.first_name_male() + fake_gen.random_element(
-                female_patronymic_suffixes) if fake_gen.boolean(chance_of_getting_true=70) else None
-        author = Author(first_name=first_name, last_name=last_name, middle_name=middle_name)
-        fake_authors.append(author)
-    return fake_authors
-
-
-def generate_fake_books(quantity: int) -> list[Book]:
-    faker_books: list[Book] = []
-    for _ in range(quantity):
-        title = fake_gen.sentence(nb_words=4).rstrip('.')
-        publisher = fake_gen.company()
-        place_of_publication = fake_gen.city()
-        published_year = fake_gen.year()
-        isbn = fake_gen.isbn13(separator="-")
-        pages = fake_gen.random_int(min=50, max=1000)
-        price = round(fake_gen.pyfloat(left_digits=3, right_digits=2, positive=True, min_value=5.0, max_value=200.0),
-                      2) if fake_gen.boolean(chance_of_getting_true=80) else None
-        language = fake_gen.language_code() if fake_gen.boolean(chance_of_getting_true=70) else None
-        faker_books.append(Book(title=title, publisher=publisher, place_of_publication=place_of_publication,
-                                published_year=int(published_year), isbn=isbn, pages=pages, price=price,
-                                language=language))
-    return faker_books
-
-
-def generate_fake_customers(quantity: int) -> list[Customer]:
-    fake_customers: list[Customer] = []
-    for _ in range(quantity):
-        sex = fake_gen.random_element(elements=('M', 'F'))
-        if sex == 'M':
-            last_name = fake_gen.last_name_male()
-            first_name = fake_gen.first_name_male()
-            middle_name = fake_gen.first_name_male() + fake_gen.random_element(
-                male_patronymic_suffixes) if fake_gen.boolean(chance_of_getting_true=70) else None
-        else:
-            last_name = fake_gen.last_name_female()
-            first_name = fake_gen.first_name_female()
-            middle_name = fake_gen.first_name_female() + fake_gen.random_element(
-                female_patronymic_suffixes) if fake_gen.boolean(chance_of_getting_true=70) else None
-        email = fake_gen.unique.email()
-        phone = PhoneMapper.phone_number_to_united_style(fake_gen.unique.phone_number())
-        fake_customers.append(Customer(first_name=first_name, last_name=last_name, middle_name=middle_name,
-                                       email=email, phone=phone))
-    return fake_customers
+AUTHOR_COLUMNS = ["first_name", "last_name", "middle_name"]
+BOOK_COLUMNS = ["title", "publisher", "place_of_publication", "published_year", "isbn", "pages", "price", "language"]
+CUSTOMER_COLUMNS = ["last_name", "first_name", "middle_name", "email", "phone"]
 
+MOBILE_OPERATOR_CODES = ['50', '63', '66', '67', '68', '73', '91', '92', '93', '94', '95', '96', '97', '98', '99']
+DEFAULT_SHARD_SIZE = 5_000
+# Multipliers coprime with 10, so (index * multiplier + offset) % 10**n is a bijection over the index space
+PHONE_MULTIPLIER = 3_912_847
+ISBN_MULTIPLIER = 387_420_489
 
+
+def _shard_faker(seed: int, shard_index: int, kind: str) -> faker.Faker:
+    shard_gen = faker.Faker("uk_UA")
+    shard_gen.seed_instance(f"{kind}:{seed}:{shard_index}")
+    return shard_gen
+
+
+def _index_offset(seed: int, modulus: int) -> int:
+    return (seed * 2_654_435_761 + 104_729) % modulus
+
+
+def _fake_person(gen: faker.Faker) -> tuple[str, str, str | None, str]:
+    sex = gen.random_element(elements=('M', 'F'))
+    if sex == 'M':
+        last_name = gen.last_name_male()
+        first_name = gen.first_name_male()
+        middle_name = gen.first_name_male() + gen.random_element(
+            male_patronymic_suffixes) if gen.boolean(chance_of_getting_true=70) else None
+        alternative_last_name = gen.last_name_male()
+    else:
+        last_name = gen.last_name_female()
+        first_name = gen.first_name_female()
+        middle_name = gen.first_name_male() + gen.random_element(
+            female_patronymic_suffixes) if gen.boolean(chance_of_getting_true=70) else None
+        alternative_last_name = gen.last_name_female()
+    return first_name, last_name, middle_name, alternative_last_name
+
+
+def unique_phone(index: int, seed: int) -> str:
+    operator_code = MOBILE_OPERATOR_CODES[index % len(MOBILE_OPERATOR_CODES)]
+    subscriber = (index // len(MOBILE_OPERATOR_CODES) * PHONE_MULTIPLIER + _index_offset(seed, 10 ** 7)) % 10 ** 7
+    return PhoneMapper.phone_number_to_united_style(f"+380{operator_code}{subscriber:07d}")
+
+
+def unique_isbn(index: int, seed: int) -> str:
+    body = f"978{(index * ISBN_MULTIPLIER + _index_offset(seed, 10 ** 9)) % 10 ** 9:09d}"
+    check = (10 - sum(int(digit) * (1 if i % 2 == 0 else 3) for i, digit in enumerate(body)) % 10) % 10
+    return f"{body[:3]}-{body[3:6]}-{body[6:9]}-{body[9:]}-{check}"
+
+
+def unique_email(gen: faker.Faker, index: int) -> str:
+    local_part, domain = gen.email().split('@')
+    return f"{local_part}.{index}@{domain}"
+
+
+def _author_shard(seed: int, shard_index: int, start: int, quantity: int) -> list[tuple]:
+    gen = _shard_faker(seed, shard_index, "author")
+    return [_fake_person(gen) for _ in range(quantity)]
+
+
+def _book_shard(seed: int, shard_index: int, start: int, quantity: int) -> list[tuple]:
+    gen = _shard_faker(seed, shard_index, "book")
+    rows: list[tuple] = []
+    for index in range(start, start + quantity):
+        title = gen.sentence(nb_words=4).rstrip('.')
+        publisher = gen.company()
+        place_of_publication = gen.city()
+        published_year = int(gen.year())
+        pages = gen.random_int(min=50, max=1000)
+        price = round(gen.pyfloat(left_digits=3, right_digits=2, positive=True, min_value=5.0, max_value=200.0),
+                      2) if gen.boolean(chance_of_getting_true=80) else None
+        language = gen.language_code() if gen.boolean(chance_of_getting_true=70) else None
+        rows.append((title, publisher, place_of_publication, published_year, unique_isbn(index, seed), pages,
+                     price, language))
+    return rows
+
+
+def _customer_shard(seed: int, shard_index: int, start: int, quantity: int) -> list[tuple]:
+    gen = _shard_faker(seed, shard_index, "customer")
+    rows: list[tuple] = []
+    for index in range(start, start + quantity):
+        first_name, last_name, middle_name, alternative_last_name = _fake_person(gen)
+        rows.append((first_name, last_name, middle_name, alternative_last_name,
+                     unique_email(gen, index), unique_phone(index, seed)))
+    return rows
+
+
+def _iter_shards(shard_function, quantity: int, seed: int, workers: int | None,
+                 shard_size: int) -> Iterator[tuple[int, list[tuple]]]:
+    """Yields (start index, rows) of each shard in shard order, keeping at most two shards per worker in flight."""
+    shards = [(seed, shard_index, start, min(shard_size, quantity - start))
+              for shard_index, start in enumerate(range(0, quantity, shard_size))]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(shards) <= 1:
+        for shard in shards:
+            yield shard[2], shard_function(*shard)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending: deque[tuple[int, Future]] = deque()
+        shards_iter = iter(shards)
+        for shard in islice(shards_iter, 2 * workers):
+            pending.append((shard[2], executor.submit(shard_function, *shard)))
+        while pending:
+            start, future = pending.popleft()
+            for shard in islice(shards_iter, 1):
+                pending.append((shard[2], executor.submit(shard_function, *shard)))
+            yield start, future.result()
+
+
+def _unique_full_name(seen: set[tuple], index: int, first_name: str, last_name: str, middle_name: str | None,
+                      alternative_last_name: str, max_last_name_length: int) -> str:
+    """Returns a last name that makes the full name unique, resolving clashes in the same order for every run."""
+    for candidate in (last_name, f"{last_name}-{alternative_last_name}", f"{last_name}-{index}"):
+        candidate = candidate[:max_last_name_length]
+        if (first_name, candidate, middle_name) not in seen:
+            seen.add((first_name, candidate, middle_name))
+            return candidate
+    raise ValueError(f"Unable to generate unique full name for row {index}")
+
+
+def iter_fake_author_batches(quantity: int, seed: int, workers: int | None = None,
+                             shard_size: int = DEFAULT_SHARD_SIZE) -> Iterator[list[tuple]]:
+    """Streams rows in AUTHOR_COLUMNS order, one batch per shard; the output depends only on quantity, seed and
+    shard_size."""
+    seen: set[tuple] = set()
+    for start, shard_rows in _iter_shards(_author_shard, quantity, seed, workers, shard_size):
+        batch: list[tuple] = []
+        for offset, (first_name, last_name, middle_name, alternative_last_name) in enumerate(shard_rows):
+            last_name = _unique_full_name(seen, start + offset, first_name, last_name, middle_name,
+                                          alternative_last_name, max_last_name_length=80)
+            batch.append((first_name, last_name, middle_name))
+        yield batch
+
+
+def iter_fake_book_batches(quantity: int, seed: int, workers: int | None = None,
+                           shard_size: int = DEFAULT_SHARD_SIZE) -> Iterator[list[tuple]]:
+    """Streams rows in BOOK_COLUMNS order, one batch per shard."""
+    for _, shard_rows in _iter_shards(_book_shard, quantity, seed, workers, shard_size):
+        yield shard_rows
+
+
+def iter_fake_customer_batches(quantity: int, seed: int, workers: int | None = None,
+                               shard_size: int = DEFAULT_SHARD_SIZE) -> Iterator[list[tuple]]:
+    """Streams rows in CUSTOMER_COLUMNS order, one batch per shard."""
+    seen: set[tuple] = set()
+    for start, shard_rows in _iter_shards(_customer_shard, quantity, seed, workers, shard_size):
+        batch: list[tuple] = []
+        for offset, (first_name, last_name, middle_name, alternative_last_name, email, phone) in enumerate(shard_rows):
+            last_name = _unique_full_name(seen, start + offset, first_name, last_name, middle_name,
+                                          alternative_last_name, max_last_name_length=40)
+            batch.append((last_name, first_name, middle_name, email, phone))
+        yield batch
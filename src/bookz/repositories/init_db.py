@@ -1,17 +1,57 @@
 import random
-import string
 from pathlib import Path
+from itertools import chain
+from typing import Iterator, Sequence
 import yaml
 from pydantic import ValidationError
-from sqlalchemy import select, update
+from sqlalchemy import select
 from sqlalchemy.exc import InterfaceError, DatabaseError
 from ..enums.enums import BookStatus, BookStatement, PlacementStatus
 from ..services.dto_models import NewDepositoryDTO
+from ..services.depository_stats import depository_stats_cache
+from ..services.autocomplete import author_autocomplete, customer_autocomplete
+from ..services.dto_cache import dto_cache
 from ..db import reset_db, get_session, is_database_exists, start_db
-from .data_generator.data_generator import generate_fake_customers, generate_fake_books, generate_fake_authors
+from .data_generator.data_generator import (iter_fake_author_batches, iter_fake_book_batches,
+                                            iter_fake_customer_batches, AUTHOR_COLUMNS, BOOK_COLUMNS,
+                                            CUSTOMER_COLUMNS)
 from .orm_models import BookAuthor, Placement, Author, Book, Customer, BookCopy
+from .bulk_loader import BulkLoader
+from ..exceptions.exceptions import StorageSpaceIsNotSufficient
 from ..logger import app_logger,db_logger
 
+BOOK_COPY_COLUMNS = ["book_id", "status", "statement", "placement_id", "customer_id"]
+
+
+def book_author_rows(book_ids: Sequence[int], author_ids: Sequence[int], rng: random.Random) -> Iterator[tuple]:
+    for book_id in book_ids:
+        num_of_authors = rng.choices([1, 2, 3, 4], weights=[60, 25, 10, 5])[0]
+        for author_id in rng.sample(author_ids, min(num_of_authors, len(author_ids))):
+            yield book_id, author_id
+
+
+def book_copy_rows(book_ids: Sequence[int], placements: list[int], customers: Sequence[int],
+                   max_copies_per_book: int, rng: random.Random) -> Iterator[tuple]:
+    for book_id in book_ids:
+        num_of_copies = rng.randint(1, max_copies_per_book)
+        for _ in range(num_of_copies):
+            status = rng.choices([BookStatus.AVAILABLE, BookStatus.BORROWED,
+                                  BookStatus.LOST], weights=(70, 25, 5))[0]
+            statement = rng.choices([BookStatement.NEW, BookStatement.GOOD,
+                                     BookStatement.REPAIR, BookStatement.DAMAGED],
+                                    weights=(20, 50, 20, 10))[0]
+            if status == BookStatus.BORROWED and not customers:
+                status = BookStatus.AVAILABLE
+            if status == BookStatus.AVAILABLE:
+                if not placements:
+                    raise StorageSpaceIsNotSufficient("Depository has no free placement for generated book copies")
+                yield book_id, status, statement, placements.pop(), None
+            elif status == BookStatus.BORROWED:
+                yield book_id, status, statement, None, rng.choice(customers)
+            else:
+                yield book_id, status, statement, None, None
+
+
 def init_db_from_config():
     #Read data from init config file
     app_logger.debug(f"Calling init_db_from_config()")
@@ -21,6 +61,10 @@ def init_db_from_config():
     else:
         app_logger.info(f"Database doesn't exist, creating it.")
         start_db()
+    depo = read_depository_config()
+    init_db(depo)
+
+def read_depository_config() -> NewDepositoryDTO | None:
     path_for_config_file = Path(__file__).resolve().parent.parent.parent.parent/"config"/"init_db_config.yaml"
     app_logger.info("Start reading config file...")
     depo = None
@@ -35,108 +79,89 @@ def init_db_from_config():
     except ValidationError:
         app_logger.error("Error validating config file.")
     app_logger.info(f"Config file read. Config: {str(depo)}")
-    init_db(depo)
+    return depo
+
+def scale_depository(depo: NewDepositoryDTO, scale_factor: int) -> NewDepositoryDTO:
+    """Multiplies books, authors and customers by scale_factor and adds columns so placements keep up."""
+    return depo.model_copy(update={
+        "columns": depo.columns * scale_factor,
+        "books_number": depo.books_number * scale_factor,
+        "authors_number": depo.authors_number * scale_factor,
+        "customers_number": depo.customers_number * scale_factor,
+    })
 
-def init_db_with_reset(depo: NewDepositoryDTO):
+def init_db_with_reset(depo: NewDepositoryDTO, workers: int | None = None) -> dict | None:
     app_logger.debug(f"Calling init_db_with_reset()")
     app_logger.info("Reset database...")
     db_logger.warning("Reset database...")
     reset_db()
+    start_db()
     app_logger.info("Reset database complete.")
     db_logger.warning("Reset database complete.")
-    init_db(depo)
-
-
-def init_db(depo: NewDepositoryDTO) -> None:
+    return init_db(depo, workers=workers)
 
 
+def init_db(depo: NewDepositoryDTO, workers: int | None = None) -> dict | None:
     # Insert fake data in DB
     try:
         with get_session() as session:
             app_logger.info("Start creation fake dates for database...")
+            loader = BulkLoader(session)
+            seed = depo.seed if depo.seed is not None else random.randrange(2 ** 31)
+            rng = random.Random(seed)
+            app_logger.info(f"Fake data seed: {seed}")
+
             # Create placement
-            line_ids = list(string.ascii_uppercase[:depo.lines])
-            shelf_ids = list(string.ascii_uppercase[:depo.shelves])
-            for line in line_ids:
-                for column in range(1, depo.columns + 1): #type: ignore
-                    for shelf in shelf_ids:
-                        for position in range(1, depo.positions + 1): # type: ignore
-                            placement = Placement(line_id=line, column_id=column, shelf_id=shelf, position=position)
-                            session.add(placement)
+            with loader.timer.measure("placements") as phase:
+                phase.rows = loader.create_placements(depo.lines, depo.columns, depo.shelves, depo.positions)
 
             # Create authors
             app_logger.info(f"Start generation {depo.authors_number} fake authors...")
-            authors = generate_fake_authors(depo.authors_number)
-            for author in authors:
-                session.add(author)
+            with loader.timer.measure("authors") as phase:
+                phase.rows = loader.copy_rows(Author.__table__, AUTHOR_COLUMNS, chain.from_iterable(
+                    iter_fake_author_batches(depo.authors_number, seed=seed, workers=workers)))
 
             # Create books
             app_logger.info(f"Start generation {depo.books_number} fake books...")
-            books = generate_fake_books(depo.books_number)
-            for book in books:
-                session.add(book)
+            with loader.timer.measure("books") as phase:
+                phase.rows = loader.copy_rows(Book.__table__, BOOK_COLUMNS, chain.from_iterable(
+                    iter_fake_book_batches(depo.books_number, seed=seed, workers=workers)))
 
             # Create customers
-            customers = generate_fake_customers(depo.customers_number)
-            for customer in customers:
-                session.add(customer)
-
-            session.flush()
+            with loader.timer.measure("customers") as phase:
+                phase.rows = loader.copy_rows(Customer.__table__, CUSTOMER_COLUMNS, chain.from_iterable(
+                    iter_fake_customer_batches(depo.customers_number, seed=seed, workers=workers)))
 
             # Create book-author relations
-            author_ids = session.scalars(select(Author.id)).all()
-            book_ids = session.scalars(select(Book.book_id)).all()
-            for book_id in book_ids:
-                num_of_authors = random.choices([1, 2, 3, 4], weights=[60, 25, 10, 5])[0]
-                if not num_of_authors:
-                    continue
-                selected_authors = random.sample(author_ids, num_of_authors)
-                for author_id in selected_authors:
-                    session.add(BookAuthor(
-                        book_id=book_id,
-                        author_id=author_id
-                    ))
+            author_ids = session.scalars(select(Author.id).order_by(Author.id)).all()
+            book_ids = session.scalars(select(Book.book_id).order_by(Book.book_id)).all()
+            with loader.timer.measure("book_author") as phase:
+                phase.rows = loader.copy_rows(BookAuthor.__table__, ["book_id", "author_id"],
+                                              book_author_rows(book_ids, author_ids, rng))
 
             # Create book copies
-            book_ids = session.scalars(select(Book.book_id)).all()
-            placements = session.scalars(select(Placement.id).where(Placement.status == PlacementStatus.FREE)).all()
-            customers = session.scalars(select(Customer.customer_id)).all()
-            for book_id in book_ids:
-                num_of_copies = random.randint(1, depo.max_books_copies_per_book)
-                for copy in range(num_of_copies): #type: ignore
-                    status = random.choices([BookStatus.AVAILABLE, BookStatus.BORROWED,
-                                             BookStatus.LOST], weights=(70, 25, 5))[0]
-                    statement = random.choices([BookStatement.NEW, BookStatement.GOOD,
-                                                BookStatement.REPAIR, BookStatement.DAMAGED],
-                                                weights=(20, 50, 20, 10))[0]
-                    if status == BookStatus.AVAILABLE:
-                        placement = placements.pop(random.randint(0, len(placements) - 1))
-                        session.add(BookCopy(
-                            book_id=book_id,
-                            status=status,
-                            statement=statement,
-                            placement_id=placement
-                        ))
-                        stmt = (
-                            update(Placement)
-                            .values(status=PlacementStatus.OCCUPIED)
-                            .where(Placement.id == placement)
-                        )
-                        session.execute(stmt)
-                    elif status == BookStatus.BORROWED:
-                        session.add(BookCopy(
-                            book_id=book_id,
-                            status=status,
-                            statement=statement,
-                            customer_id=random.choice(customers)
-                        ))
-                    else:
-                        session.add(BookCopy(
-                            book_id=book_id,
-                            status=status,
-                            statement=statement
-                        ))
+            placements = list(session.scalars(select(Placement.id)
+                                              .where(Placement.status == PlacementStatus.FREE)
+                                              .order_by(Placement.id)))
+            rng.shuffle(placements)
+            customers = session.scalars(select(Customer.customer_id).order_by(Customer.customer_id)).all()
+            with loader.timer.measure("book_copies") as phase:
+                phase.rows = loader.copy_rows(BookCopy.__table__, BOOK_COPY_COLUMNS,
+                                              book_copy_rows(book_ids, placements, customers,
+                                                             depo.max_books_copies_per_book, rng))
+
+            # Mark placements of available copies as occupied
+            with loader.timer.measure("occupy_placements") as phase:
+                phase.rows = loader.occupy_placements_of_copies()
             session.commit()
+            depository_stats_cache.invalidate()
+            author_autocomplete.invalidate()
+            customer_autocomplete.invalidate()
+            dto_cache.clear()
+            report = loader.timer.report()
+            app_logger.info(f"Database initialization complete: {report['total_rows']} rows in "
+                            f"{report['total_seconds']}s")
+            return report
     except InterfaceError as e:
         app_logger.error(f"InterfaceError for database initialization. Error type {e.__class__.__name__}. "
                         f"Error message: {str(e)}")
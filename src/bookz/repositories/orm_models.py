@@ -1,8 +1,8 @@
 from __future__ import annotations
 from sqlalchemy import (TIMESTAMP, Integer, SmallInteger, Float, String, ForeignKey, UniqueConstraint,
-                        Index, Enum as PgEnum, Identity)
+                        Index, Enum as PgEnum, Identity, DDL, event)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from ..enums.enums import BookStatus, BookStatement, PlacementStatus
 from ..db import Base
 
@@ -82,6 +82,10 @@ class BookCopy(Base, TimestampMixin):
     customer: Mapped[Customer] = relationship("Customer", back_populates='borrowed_books')
     placement: Mapped[Placement] = relationship("Placement", back_populates='book_copy')
 
+    __table_args__ = (Index('ix_book_copy_status_copy_id', 'status', 'copy_id'),
+                      Index('ix_book_copy_statement_copy_id', 'statement', 'copy_id'),
+                      )
+
     def __repr__(self) -> str:
         return (f"BookCopy(id={self.copy_id}, book={self.book}, status='{self.status.value}', "
                 f"placement='{self.placement}', statement='{self.statement.value}')")
@@ -126,7 +130,113 @@ class Placement(Base, TimestampMixin):
 
     book_copy = relationship("BookCopy", back_populates="placement")
 
+    __table_args__ = (Index('ix_placement_free_slot', 'line_id', 'column_id', 'shelf_id', 'position',
+                            postgresql_where=text("status = 'FREE'")),
+                      )
+
     def __repr__(self) -> str:
         return (f"Placement(id={self.id}, line_id='{self.line_id}', column_id={self.column_id}, "
                 f"shelf_id='{self.shelf_id}', position={self.position}, "
-                f"book_copy={self.book_copy}, status='{self.status.value}')")
\ No newline at end of file
+                f"book_copy={self.book_copy}, status='{self.status.value}')")
+
+
+# Full-text and trigram search. The 'simple' configuration does no stemming, which suits the multilingual catalog.
+# Queries must use these same expressions for PostgreSQL to pick the expression indexes.
+SEARCH_CONFIG = text("'simple'::regconfig")
+
+book_search_document = (func.setweight(func.to_tsvector(SEARCH_CONFIG, Book.title), text("'A'"))
+                        .op('||')(func.setweight(func.to_tsvector(SEARCH_CONFIG, Book.publisher), text("'B'"))))
+author_search_name = Author.first_name.op('||')(text("' '")).op('||')(Author.last_name).self_group()
+author_search_document = func.to_tsvector(SEARCH_CONFIG, author_search_name)
+
+# Created with their tables by create_all, databases created before them get them from bookz-upgrade-schema
+SEARCH_INDEXES = (
+    Index('ix_book_search_document', book_search_document, postgresql_using='gin'),
+    Index('ix_book_title_trgm', Book.title, postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'}),
+    Index('ix_book_publisher_trgm', Book.publisher, postgresql_using='gin',
+          postgresql_ops={'publisher': 'gin_trgm_ops'}),
+    Index('ix_author_search_document', author_search_document, postgresql_using='gin'),
+    Index('ix_author_name_trgm', author_search_name.label('author_name'), postgresql_using='gin',
+          postgresql_ops={'author_name': 'gin_trgm_ops'}),
+)
+
+event.listen(Base.metadata, 'before_create', DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+
+# Change feed. One NOTIFY per statement on CHANGE_CHANNEL lists the ids in the given columns of the changed rows,
+# before and after an UPDATE, with the application_name of the writer as origin. Larger statements send null, meaning any row may have changed.
+CHANGE_CHANNEL = 'bookz_changes'
+CHANGE_FEED_MAX_ROWS = 200
+CHANGE_FEED_COLUMNS = {
+    'authors': ['id'],
+    'books': ['book_id'],
+    'book_author': ['book_id', 'author_id'],
+    'book_copies': ['copy_id', 'book_id', 'customer_id'],
+    'customers': ['customer_id'],
+    'placements': ['id'],
+}
+
+CHANGE_FEED_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION bookz_notify_change() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    changed jsonb;
+    total integer;
+    payload jsonb;
+    column_name text;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        SELECT count(*), jsonb_agg(to_jsonb(r)) INTO total, changed
+        FROM (SELECT * FROM old_rows LIMIT {CHANGE_FEED_MAX_ROWS + 1}) r;
+    ELSIF TG_OP = 'UPDATE' THEN
+        -- Old values too, a row moved to another customer or book changed the one it left
+        SELECT count(*), jsonb_agg(to_jsonb(r)) INTO total, changed
+        FROM (SELECT * FROM old_rows UNION ALL SELECT * FROM new_rows LIMIT {2 * CHANGE_FEED_MAX_ROWS + 1}) r;
+        total := (total + 1) / 2;
+    ELSE
+        SELECT count(*), jsonb_agg(to_jsonb(r)) INTO total, changed
+        FROM (SELECT * FROM new_rows LIMIT {CHANGE_FEED_MAX_ROWS + 1}) r;
+    END IF;
+    IF total = 0 THEN
+        RETURN NULL;
+    END IF;
+    payload := jsonb_build_object('table', TG_TABLE_NAME, 'op', TG_OP,
+                                  'origin', current_setting('application_name'));
+    FOREACH column_name IN ARRAY TG_ARGV LOOP
+        payload := payload || jsonb_build_object(column_name, CASE WHEN total > {CHANGE_FEED_MAX_ROWS} THEN NULL ELSE
+            (SELECT coalesce(jsonb_agg(DISTINCT row_data -> column_name), '[]'::jsonb)
+             FROM jsonb_array_elements(changed) row_data WHERE row_data ->> column_name IS NOT NULL) END);
+    END LOOP;
+    PERFORM pg_notify('{CHANGE_CHANNEL}', payload::text);
+    RETURN NULL;
+END $$
+"""
+CHANGE_FEED_OPERATIONS = {
+    'INSERT': 'NEW TABLE AS new_rows',
+    'UPDATE': 'OLD TABLE AS old_rows NEW TABLE AS new_rows',
+    'DELETE': 'OLD TABLE AS old_rows',
+}
+
+
+def change_feed_trigger_name(table_name: str, operation: str) -> str:
+    return f"{table_name}_notify_{operation.lower()}"
+
+
+def change_feed_triggers(table_name: str) -> list[DDL]:
+    arguments = ", ".join(f"'{column}'" for column in CHANGE_FEED_COLUMNS[table_name])
+    triggers = []
+    for operation, transition_tables in CHANGE_FEED_OPERATIONS.items():
+        trigger_name = change_feed_trigger_name(table_name, operation)
+        triggers.append(DDL(f"DROP TRIGGER IF EXISTS {trigger_name} ON {table_name};\n"
+                            f"CREATE TRIGGER {trigger_name} AFTER {operation} ON {table_name} "
+                            f"REFERENCING {transition_tables} "
+                            f"FOR EACH STATEMENT EXECUTE FUNCTION bookz_notify_change({arguments})"))
+    return triggers
+
+
+# CREATE OR REPLACE, so every create_all can run it. Tables get their triggers only when create_all creates them, so
+# that starting a worker never takes the locks of DROP/CREATE TRIGGER. Databases created before the change feed get
+# it from bookz-upgrade-schema.
+event.listen(Base.metadata, 'before_create', DDL(CHANGE_FEED_FUNCTION))
+for feed_table_name in CHANGE_FEED_COLUMNS:
+    for trigger in change_feed_triggers(feed_table_name):
+        event.listen(Base.metadata.tables[feed_table_name], 'after_create', trigger)
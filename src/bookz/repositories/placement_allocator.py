@@ -0,0 +1,48 @@
+import os
+from sqlalchemy import select, Select
+from .orm_models import Placement, BookCopy
+from ..enums.enums import PlacementStatus, PlacementLocality
+
+DEFAULT_LOCALITY = PlacementLocality(os.getenv('placement_locality', PlacementLocality.NONE.value))
+
+# Placement coordinates that must match the anchor slot, from the narrowest scope to the widest one
+LOCALITY_SCOPES: dict[PlacementLocality, list[tuple[str, ...]]] = {
+    PlacementLocality.NONE: [()],
+    PlacementLocality.LINE: [("line_id",), ()],
+    PlacementLocality.COLUMN: [("line_id", "column_id"), ("line_id",), ()],
+    PlacementLocality.SHELF: [("line_id", "column_id", "shelf_id"), ("line_id", "column_id"), ("line_id",), ()],
+}
+
+
+def free_places_stmt(number: int, anchor: Placement | None = None, scope: tuple[str, ...] = (),
+                     exclude_ids: list[int] | None = None, skip_locked: bool = True) -> Select:
+    """Selects up to `number` free slots in depository order, locking them for the current transaction.
+
+    Slots already locked by a concurrent transaction are skipped rather than waited for, so parallel writers
+    spread over the free slots instead of queueing on the first ones.
+    """
+    stmt = select(Placement.id).where(Placement.status == PlacementStatus.FREE)
+    if anchor is not None:
+        for coordinate in scope:
+            stmt = stmt.where(getattr(Placement, coordinate) == getattr(anchor, coordinate))
+    if exclude_ids:
+        stmt = stmt.where(Placement.id.not_in(exclude_ids))
+    return (stmt
+            .order_by(Placement.line_id, Placement.column_id, Placement.shelf_id, Placement.position)
+            .with_for_update(skip_locked=skip_locked)
+            .limit(number))
+
+
+def anchor_place_stmt(book_id: int) -> Select:
+    """Selects the slot of a shelved copy of the book, used as the anchor of locality-aware allocation."""
+    return (select(Placement)
+            .join(BookCopy, BookCopy.placement_id == Placement.id)
+            .where(BookCopy.book_id == book_id)
+            .order_by(Placement.id)
+            .limit(1))
+
+
+def allocation_scopes(anchor: Placement | None, locality: PlacementLocality) -> list[tuple[str, ...]]:
+    if anchor is None:
+        return [()]
+    return LOCALITY_SCOPES[locality]
@@ -1,49 +1,44 @@
-from sqlalchemy import select, insert, update, delete, func
-from sqlalchemy.orm import Session, selectinload, joinedload, noload, with_loader_criteria
+from sqlalchemy import select, insert, update, delete, func, values, column, Integer, Row, ScalarResult
+from sqlalchemy.orm import Session, selectinload, noload, with_loader_criteria
 from .orm_models import Author, Book, BookAuthor, BookCopy, Customer, Placement
-from ..enums.enums import PlacementStatus,BookStatus, BookStatement
+from ..enums.enums import PlacementStatus, BookStatus, BookStatement, PlacementLocality
+from .book_search import book_search_ranking_stmt
+from .placement_allocator import free_places_stmt, anchor_place_stmt, allocation_scopes, DEFAULT_LOCALITY
+from ..mappers.mappers import AuthorMapper, BookMapper, BookCopyMapper, CustomerMapper
 
 
 class BookRepository:
+    """Queries of BookService, the blocking twin of AsyncBookRepository for scripts.
+
+    Keep the two in step: every method runs the same statement as its async counterpart.
+    """
 
     def __init__(self, session: Session):
         self.session = session
 
     #Depository
-    def get_number_of_depository_lines(self) -> str:
-        stmt = (select(func.max(Placement.line_id)))
-        return self.session.scalar(stmt)
-
-    def get_number_of_depository_columns_in_line(self) -> int:
-        stmt = (select(func.max(Placement.column_id)))
-        return self.session.scalar(stmt)
-
-    def get_number_of_depository_shelves_in_column(self) -> str:
-        stmt = (select(func.max(Placement.shelf_id)))
-        return self.session.scalar(stmt)
-
-    def get_number_of_depository_positions_in_shelve(self) -> int:
-        stmt = (select(func.max(Placement.position)))
-        return self.session.scalar(stmt)
-
-    def get_number_of_depository_placements(self) -> int:
-        stmt = (select(func.count()).select_from(Placement))
-        return self.session.scalar(stmt)
-
-    def get_number_books_in_depository(self) -> int:
-        stmt = (select(func.count()).select_from(Placement).where(Placement.status == PlacementStatus.OCCUPIED))
-        return self.session.scalar(stmt)
-
-    def get_number_of_free_places(self) -> int:
-        stmt = (select(func.count()).select_from(Placement).where(Placement.status == PlacementStatus.FREE))
-        return self.session.scalar(stmt)
-
-    def find_free_place(self, number: int) -> list[int]:
-        stmt = (select(Placement.id)
-                .where(Placement.status == PlacementStatus.FREE)
-                .with_for_update()
-                .limit(number))
-        return list(self.session.scalars(stmt).all())
+    def get_depository_stats(self) -> Row:
+        stmt = (select(func.max(Placement.line_id).label("max_lines"),
+                       func.max(Placement.column_id).label("max_columns"),
+                       func.max(Placement.shelf_id).label("max_shelves"),
+                       func.max(Placement.position).label("max_positions"),
+                       func.count().label("total_places"),
+                       func.count().filter(Placement.status == PlacementStatus.OCCUPIED).label("books_in_storage"),
+                       func.count().filter(Placement.status == PlacementStatus.FREE).label("free_places")))
+        return self.session.execute(stmt).one()
+
+    def find_free_place(self, number: int, book_id: int | None = None,
+                        locality: PlacementLocality = DEFAULT_LOCALITY) -> list[int]:
+        anchor = None
+        if book_id is not None and locality != PlacementLocality.NONE:
+            anchor = self.session.scalar(anchor_place_stmt(book_id))
+        places: list[int] = []
+        for scope in allocation_scopes(anchor, locality):
+            stmt = free_places_stmt(number - len(places), anchor=anchor, scope=scope, exclude_ids=places)
+            places.extend(self.session.scalars(stmt).all())
+            if len(places) >= number:
+                break
+        return places
 
     def change_place_status(self, place_id: int, status: PlacementStatus) -> Placement:
         stmt = (
@@ -59,6 +54,7 @@ class BookRepository:
             update(Placement)
             .where(Placement.id.in_(place_ids))
             .values(status=status)
+            .returning(Placement)
         )
         return list(self.session.scalars(stmt).all())
 
@@ -71,35 +67,18 @@ class BookRepository:
                 & (Author.last_name == author["last_name"])
                 & (Author.middle_name == author["middle_name"])
             )
-            .options(
-                selectinload(Author.books).options(
-                    selectinload(Book.authors).options(noload(Author.books)),
-                    selectinload(Book.book_copies).options(
-                        noload(BookCopy.customer),
-                        noload(BookCopy.book),
-                        noload(BookCopy.placement),
-                    ),
-                ),
-                with_loader_criteria(BookCopy, BookCopy.status == BookStatus.AVAILABLE),
-            )
+            .options(*AuthorMapper.author_loader_options,
+                     with_loader_criteria(BookCopy, BookCopy.status == BookStatus.AVAILABLE))
         )
         return self.session.scalar(stmt)
 
-    def find_author_by_id(self, author_id: int, by_update: bool = False) -> Author | None:
+    def find_author_by_id(self, author_id: int, by_update: bool = False,
+                          loader_options: list | None = None) -> Author | None:
         stmt = (
             select(Author)
             .where((Author.id == author_id))
-            .options(
-                selectinload(Author.books).options(
-                    selectinload(Book.authors).options(noload(Author.books)),
-                    selectinload(Book.book_copies).options(
-                                                noload(BookCopy.customer),
-                                                       noload(BookCopy.book),
-                                                       noload(BookCopy.placement),
-                    ),
-                ),
-                with_loader_criteria(BookCopy, BookCopy.status == BookStatus.AVAILABLE),
-            )
+            .options(*(loader_options or AuthorMapper.author_loader_options),
+                     with_loader_criteria(BookCopy, BookCopy.status == BookStatus.AVAILABLE))
         )
         if by_update:
             stmt = stmt.with_for_update()
@@ -120,27 +99,26 @@ class BookRepository:
             insert(Author)
             .values(new_author)
             .returning(Author)
+            .options(noload(Author.books))
         )
-        author = self.session.scalar(stmt)
-        return author
+        return self.session.scalar(stmt)
 
     def update_author(self, new_author: dict) -> Author | None:
+        # The id is GENERATED ALWAYS, PostgreSQL refuses to set it even to its own value
         stmt = (
             update(Author)
-            .values(new_author)
+            .values({column: value for column, value in new_author.items() if column != "id"})
             .where(Author.id == new_author["id"])
             .returning(Author)
         )
         return self.session.scalar(stmt)
 
-    def delete_author(self, author: Author) -> Author:
-        return self.delete_author_by_id(author.id)  #type: ignore
-
     def delete_author_by_id(self, author_id: int) -> Author:
         stmt = (
             delete(Author)
             .where(Author.id == author_id)
             .returning(Author)
+            .options(noload(Author.books))
         )
         return self.session.scalar(stmt)
 
@@ -149,36 +127,58 @@ class BookRepository:
             delete(Author)
             .where(Author.id.in_(author_ids))
             .returning(Author)
+            .options(noload(Author.books))
         )
         return list(self.session.scalars(stmt).all())
 
+    def find_author_names(self, ids: list[int] | None = None) -> list[Row]:
+        stmt = select(Author.id, Author.first_name, Author.last_name, Author.middle_name)
+        if ids is not None:
+            stmt = stmt.where(Author.id.in_(ids))
+        return list(self.session.execute(stmt).all())
+
+    def find_book_author_ids(self, book_ids: list[int]) -> list[int]:
+        stmt = select(BookAuthor.author_id).where(BookAuthor.book_id.in_(book_ids)).distinct()
+        return list(self.session.scalars(stmt).all())
+
     #Book
-    def find_book_by_id(self, book_id: int, for_update: bool = False) -> Book | None:
+    def find_book_by_id(self, book_id: int, for_update: bool = False,
+                        loader_options: list | None = None) -> Book | None:
         stmt = (
             select(Book)
             .where((Book.book_id == book_id))
-            .options(selectinload(Book.authors), joinedload(Book.book_copies))
+            .options(*(loader_options or BookMapper.book_loader_options))
         )
         if for_update:
-            stmt = stmt.with_for_update(of=(Book, BookCopy))
+            stmt = stmt.with_for_update(of=Book)
         return self.session.scalars(stmt).one_or_none()
 
-    def find_book_by_isbn(self, isbn: str) -> Book | None:
+    def find_book_by_isbn(self, isbn: str, loader_options: list | None = None) -> Book | None:
         stmt = (
             select(Book)
             .where((Book.isbn == isbn))
-            .options(selectinload(Book.authors), selectinload(Book.book_copies))
+            .options(*(loader_options or BookMapper.book_loader_options))
         )
         return self.session.scalars(stmt).one_or_none()
 
+    def find_books_by_isbns(self, isbns: list[str]) -> list[Book]:
+        stmt = (
+            select(Book)
+            .where(Book.isbn.in_(isbns))
+            .options(*BookMapper.book_loader_options)
+        )
+        return list(self.session.scalars(stmt).all())
+
     def find_book_without_copy(self, for_update: bool = False) -> list[Book]:
         stmt = (
             select(Book)
             .outerjoin(Book.book_copies)
             .where(Book.book_copies == None)
+            .options(selectinload(Book.authors).options(noload(Author.books)),
+                     noload(Book.book_copies))
         )
         if for_update:
-            stmt = stmt.with_for_update()
+            stmt = stmt.with_for_update(of=Book)
         return list(self.session.scalars(stmt).all())
 
     def create_book(self, book: dict) -> Book:
@@ -194,6 +194,7 @@ class BookRepository:
             delete(Book)
             .where(Book.book_id.in_(book_ids))
             .returning(Book)
+            .options(noload(Book.authors), noload(Book.book_copies))
         )
         return list(self.session.scalars(stmt).all())
 
@@ -202,9 +203,20 @@ class BookRepository:
             delete(Book)
             .where(Book.book_id == book_id)
             .returning(Book)
+            .options(noload(Book.authors), noload(Book.book_copies))
         )
         return self.session.scalar(stmt)
 
+    def search_books(self, query: str, limit: int, offset: int = 0) -> list[Row]:
+        ranking = book_search_ranking_stmt(query, limit, offset).subquery()
+        stmt = (
+            select(Book, ranking.c.rank)
+            .join(ranking, ranking.c.book_id == Book.book_id)
+            .order_by(ranking.c.rank.desc(), Book.book_id)
+            .options(*BookMapper.book_search_loader_options)
+        )
+        return list(self.session.execute(stmt).all())
+
     #Book-Author relation
     def find_books_by_author_id(self, author_id: int) -> list[int]:
         stmt = (
@@ -222,63 +234,77 @@ class BookRepository:
         return self.session.scalar(stmt)
 
     #BookCopies
-    def find_book_copy(self, copy_id: int, for_update: bool = False) -> BookCopy | None:
+    def find_book_copy(self, copy_id: int, for_update: bool = False, loader_options: list | None = None,
+                       populate_existing: bool = False) -> BookCopy | None:
         stmt = (
             select(BookCopy)
             .where((BookCopy.copy_id == copy_id))
-            .options(joinedload(BookCopy.book).options(joinedload(Book.authors)),
-                     selectinload(BookCopy.customer))
+            .options(*(loader_options or BookCopyMapper.book_copy_loader_options))
         )
         if for_update:
-            stmt = stmt.with_for_update()
+            stmt = stmt.with_for_update(of=BookCopy)
+        if populate_existing:
+            stmt = stmt.execution_options(populate_existing=True)
         return self.session.scalar(stmt)
 
-    def find_book_copies_by_ids(self, ids: list[int]) -> list[BookCopy]:
+    def find_book_copies_by_ids(self, ids: list[int], for_update: bool = False,
+                                populate_existing: bool = False) -> list[BookCopy]:
         stmt = (
             select(BookCopy)
             .where(BookCopy.copy_id.in_(ids))
-            .options(joinedload(BookCopy.book).options(joinedload(BookCopy.authors)),
-                     selectinload(BookCopy.customer))
+            .options(*BookCopyMapper.book_copy_loader_options)
+            .order_by(BookCopy.copy_id)
         )
+        if for_update:
+            stmt = stmt.with_for_update(of=BookCopy)
+        if populate_existing:
+            stmt = stmt.execution_options(populate_existing=True)
         return list(self.session.scalars(stmt).all())
 
     def find_book_copies_by_book_id(self, book_id: int, for_update: bool = False) -> list[BookCopy]:
         stmt = (
             select(BookCopy)
             .where(BookCopy.book_id == book_id)
-            .options(joinedload(BookCopy.book).options(joinedload(Book.authors)),
-                     selectinload(BookCopy.customer))
+            .options(*BookCopyMapper.book_copy_loader_options)
         )
         if for_update:
-            stmt = stmt.with_for_update()
+            stmt = stmt.with_for_update(of=BookCopy)
         return list(self.session.scalars(stmt).all())
 
-    def find_book_copies_for_status(self, status: BookStatus) -> list[BookCopy]:
+    def find_book_copies_for_status(self, status: BookStatus, limit: int | None = None,
+                                    after: int | None = None) -> list[BookCopy]:
         stmt = (
             select(BookCopy)
             .where(BookCopy.status == status)
-            .options(joinedload(BookCopy.book).options(joinedload(Book.authors)),
-                     selectinload(BookCopy.customer))
+            .order_by(BookCopy.copy_id)
+            .limit(limit)
+            .options(*BookCopyMapper.book_copy_loader_options)
         )
+        if after is not None:
+            stmt = stmt.where(BookCopy.copy_id > after)
         return list(self.session.scalars(stmt).all())
 
-    def find_book_copies_for_statement(self, statement: BookStatement) -> list[BookCopy]:
+    def find_book_copies_for_statement(self, statement: BookStatement, limit: int | None = None,
+                                       after: int | None = None) -> list[BookCopy]:
         stmt = (
             select(BookCopy)
             .where(BookCopy.statement == statement)
-            .options(selectinload(BookCopy.customer),
-                     selectinload(BookCopy.book),
-                     selectinload(BookCopy.placement))
+            .order_by(BookCopy.copy_id)
+            .limit(limit)
+            .options(*BookCopyMapper.book_copy_loader_options)
         )
+        if after is not None:
+            stmt = stmt.where(BookCopy.copy_id > after)
         return list(self.session.scalars(stmt).all())
 
     def create_book_copy(self, book_copy: dict) -> BookCopy:
         stmt = (
             insert(BookCopy)
             .values(book_copy)
-            .returning(BookCopy)
+            .returning(BookCopy.copy_id)
         )
-        return self.session.scalar(stmt)
+        copy_id = self.session.scalar(stmt)
+        return self.find_book_copy(copy_id)
 
     def create_book_copies(self, book_copies: list[dict]) -> list[BookCopy]:
         stmt = (
@@ -294,89 +320,115 @@ class BookRepository:
             update(BookCopy)
             .where(BookCopy.copy_id == copy_id)
             .values(book_copy)
+            .execution_options(synchronize_session=False)
         )
         self.session.execute(stmt)
-        return self.find_book_copy(copy_id)
+        return self.find_book_copy(copy_id, populate_existing=True)
+
+    def update_book_copies(self, copy_ids: list[int], book_copy: dict) -> list[BookCopy]:
+        stmt = (
+            update(BookCopy)
+            .where(BookCopy.copy_id.in_(copy_ids))
+            .values(book_copy)
+            .execution_options(synchronize_session=False)
+        )
+        self.session.execute(stmt)
+        return self.find_book_copies_by_ids(copy_ids, populate_existing=True)
+
+    def place_book_copies(self, placements: dict[int, int], book_copy: dict) -> list[BookCopy]:
+        """Sets the values of book_copy and the placement_id of placements (copy_id: placement_id) in one UPDATE."""
+        rows = values(column("copy_id", Integer), column("placement_id", Integer),
+                      name="new_placements").data(list(placements.items()))
+        stmt = (
+            update(BookCopy)
+            .where(BookCopy.copy_id == rows.c.copy_id)
+            .values({**book_copy, "placement_id": rows.c.placement_id})
+            .execution_options(synchronize_session=False)
+        )
+        self.session.execute(stmt)
+        return self.find_book_copies_by_ids(list(placements), populate_existing=True)
 
     def delete_book_copy(self, copy_id: int) -> BookCopy | None:
         stmt = (
             delete(BookCopy)
             .where(BookCopy.copy_id == copy_id)
             .returning(BookCopy)
+            .options(selectinload(BookCopy.book).options(selectinload(Book.authors).options(noload(Author.books)),
+                                                         noload(Book.book_copies)),
+                     noload(BookCopy.customer),
+                     noload(BookCopy.placement))
         )
         return self.session.scalar(stmt)
 
-    def delete_book_copies_by_ids(self, ids: list[int]) -> list[BookCopy]:
+    def delete_book_copies_by_ids(self, ids: list[int]) -> list[int]:
         stmt = (
             delete(BookCopy)
             .where(BookCopy.copy_id.in_(ids))
-            .returning(BookCopy)
+            .returning(BookCopy.copy_id)
         )
         return list(self.session.scalars(stmt).all())
 
     #Customer
-    def find_customer_by_id(self, customer_id: int, for_update: bool = False) -> Customer | None:
+    def find_customer_by_id(self, customer_id: int, for_update: bool = False,
+                            loader_options: list | None = None) -> Customer | None:
         stmt = (
             select(Customer)
             .where(Customer.customer_id == customer_id)
-            .options(joinedload(Customer.borrowed_books)
-                     .options(joinedload(BookCopy.book)
-                              .options(joinedload(Book.authors)))
-                    )
+            .options(*(loader_options or CustomerMapper.customer_loader_options))
         )
         if for_update:
-            stmt = stmt.with_for_update(of=(Customer, BookCopy))
+            stmt = stmt.with_for_update(of=Customer)
         return self.session.scalars(stmt).one_or_none()
 
+    def find_customers_by_ids(self, ids: list[int]) -> list[Customer]:
+        stmt = (
+            select(Customer)
+            .where(Customer.customer_id.in_(ids))
+            .options(*CustomerMapper.customer_loader_options)
+        )
+        return list(self.session.scalars(stmt).all())
+
     def find_customer_by_email(self, email: str, for_update: bool = False) -> Customer | None:
         stmt = (
             select(Customer)
             .where(Customer.email == email)
-            .options(joinedload(Customer.borrowed_books)
-                     .options(joinedload(BookCopy.book)
-                              .options(joinedload(Book.authors)))
-                    )
+            .options(*CustomerMapper.customer_loader_options)
         )
         if for_update:
-            stmt = stmt.with_for_update(of=(Customer, BookCopy))
+            stmt = stmt.with_for_update(of=Customer)
         return self.session.scalars(stmt).one_or_none()
 
     def find_customer_by_phone(self, phone: str, for_update: bool = False) -> Customer | None:
         stmt = (
             select(Customer)
             .where(Customer.phone == phone)
-            .options(joinedload(Customer.borrowed_books)
-                     .options(joinedload(BookCopy.book)
-                              .options(joinedload(Book.authors)))
-                    )
+            .options(*CustomerMapper.customer_loader_options)
         )
         if for_update:
-            stmt = stmt.with_for_update(of=(Customer, BookCopy))
+            stmt = stmt.with_for_update(of=Customer)
         return self.session.scalars(stmt).one_or_none()
 
     def find_customer_by_fullname(self, fullname: dict, for_update: bool = False) -> Customer | None:
-        stmt=(
+        stmt = (
             select(Customer)
             .where((Customer.first_name == fullname['first_name'])
                    & (Customer.last_name == fullname['last_name'])
                    & (Customer.middle_name == fullname['middle_name']))
-            .options(joinedload(Customer.borrowed_books)
-                     .options(joinedload(BookCopy.book)
-                              .options(joinedload(Book.authors)))
-                     )
+            .options(*CustomerMapper.customer_loader_options)
         )
         if for_update:
-            stmt = stmt.with_for_update(of=(Customer, BookCopy))
+            stmt = stmt.with_for_update(of=Customer)
         return self.session.scalars(stmt).one_or_none()
 
-
     def create_customer(self, new_customer: dict) -> Customer:
         stmt = (
             insert(Customer)
             .values(new_customer)
             .returning(Customer)
+            .options(noload(Customer.borrowed_books))
         )
         return self.session.scalar(stmt)
+
     def update_customer(self, customer_id: int, new_customer: dict) -> Customer:
         stmt = (
             update(Customer)
@@ -385,3 +437,37 @@ class BookRepository:
             .returning(Customer)
         )
         return self.session.scalar(stmt)
+
+    def find_customer_names(self, ids: list[int] | None = None) -> list[Row]:
+        stmt = select(Customer.customer_id, Customer.first_name, Customer.last_name, Customer.middle_name)
+        if ids is not None:
+            stmt = stmt.where(Customer.customer_id.in_(ids))
+        return list(self.session.execute(stmt).all())
+
+    #Export
+    def stream_books(self, batch_size: int) -> ScalarResult[Book]:
+        stmt = (
+            select(Book)
+            .order_by(Book.book_id)
+            .options(*BookMapper.book_export_loader_options)
+            .execution_options(yield_per=batch_size)
+        )
+        return self.session.scalars(stmt)
+
+    def stream_book_copies(self, batch_size: int) -> ScalarResult[BookCopy]:
+        stmt = (
+            select(BookCopy)
+            .order_by(BookCopy.copy_id)
+            .options(*BookCopyMapper.book_copy_export_loader_options)
+            .execution_options(yield_per=batch_size)
+        )
+        return self.session.scalars(stmt)
+
+    def stream_customers(self, batch_size: int) -> ScalarResult[Customer]:
+        stmt = (
+            select(Customer)
+            .order_by(Customer.customer_id)
+            .options(*CustomerMapper.customer_export_loader_options)
+            .execution_options(yield_per=batch_size)
+        )
+        return self.session.scalars(stmt)
@@ -0,0 +1,24 @@
+from sqlalchemy import DDL, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import CreateIndex
+from .orm_models import SEARCH_INDEXES, CHANGE_FEED_COLUMNS, CHANGE_FEED_FUNCTION, change_feed_triggers
+from ..logger import app_logger
+
+
+def install_search_indexes(connection: Connection) -> list[str]:
+    """Creates pg_trgm and the search indexes that are missing. Returns the names of the indexes checked."""
+    connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    for index in SEARCH_INDEXES:
+        app_logger.info(f"Creating index {index.name} on {index.table.name} if it doesn't exist")
+        connection.execute(CreateIndex(index, if_not_exists=True))
+    return [index.name for index in SEARCH_INDEXES]
+
+
+def install_change_feed(connection: Connection) -> list[str]:
+    """Creates or replaces the change feed function and the triggers of every table. Returns the tables."""
+    connection.execute(DDL(CHANGE_FEED_FUNCTION))
+    for table_name in CHANGE_FEED_COLUMNS:
+        app_logger.info(f"Installing change feed triggers on {table_name}")
+        for trigger in change_feed_triggers(table_name):
+            connection.execute(trigger)
+    return list(CHANGE_FEED_COLUMNS)
@@ -1,18 +1,60 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+import io
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..exceptions.exceptions import *
 from ..services.dto_models import (DepositoryDTO, NewDepositoryDTO, AuthorDTO, NewAuthorDTO, BookDTO, NewBookDTO,
-                                   BookCopyDTO, NewBookCopyDTO, CustomerDTO, NewCustomerDTO, FullNameDTO, StringDTO)
-from ..enums.enums import BookStatus, BookStatement
-from ..services.service import BookService
-from ..db import get_session
+                                   BookCopyDTO, NewBookCopyDTO, BookCopyPageDTO, CustomerDTO, NewCustomerDTO,
+                                   FullNameDTO, StringDTO, BookSearchPageDTO, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE,
+                                   DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT, NameSuggestionDTO,
+                                   DEFAULT_AUTOCOMPLETE_LIMIT, MAX_AUTOCOMPLETE_LIMIT, IsbnBatchDTO, IdBatchDTO,
+                                   BookBatchDTO, BookCopyBatchDTO, CustomerBatchDTO, BookImportReportDTO,
+                                   BookCopyBorrowDTO, BookCopyReturnDTO, BookCopyErrorDTO, CacheStatsDTO)
+from ..enums.enums import BookStatus, BookStatement, ExportFormat
+from ..services.async_service import AsyncBookService
+from ..services.conditional import ConditionalRead
+from ..services.dto_cache import dto_cache
+from ..services.export import CatalogExporter
+from ..services.book_import import import_books as import_book_feed
+from ..db import get_async_session
 from ..repositories.init_db import init_db
 
 router = APIRouter()
 
 
-def get_service(db: Session = Depends(get_session)) -> BookService:
-    return BookService(db)
+def get_service(db: AsyncSession = Depends(get_async_session)) -> AsyncBookService:
+    return AsyncBookService(db)
+
+
+class FieldSelection:
+    """Sparse fieldset of a lookup. Only the selected fields are loaded and serialized."""
+
+    def __init__(self, fields: str | None = Query(None, description="comma separated dotted field paths, e.g. "
+                                                                    "id,full_name,books.title"),
+                 depth: int | None = Query(None, ge=0, le=5, description="levels of related objects to include")):
+        self.fields = fields
+        self.depth = depth
+
+    @property
+    def selected(self) -> bool:
+        return self.fields is not None or self.depth is not None
+
+    def response(self, dto: BaseModel, headers: dict[str, str] | None = None) -> BaseModel | Response:
+        # Unselected fields are unset in the trusted DTO and are left out instead of serialized as null
+        if not self.selected and not headers:
+            return dto
+        return Response(dto.model_dump_json(exclude_unset=self.selected), media_type="application/json",
+                        headers=headers)
+
+
+def get_conditional(if_none_match: str | None = Header(None)) -> ConditionalRead:
+    return ConditionalRead(if_none_match)
+
+
+def not_modified(conditional: ConditionalRead) -> Response:
+    return Response(status_code=304, headers=conditional.headers)
 
 
 #Depository endpoints
@@ -21,37 +63,57 @@ def create_new_depository(depo: NewDepositoryDTO):
     return init_db(depo)
 
 @router.get("/depository/status", response_model=DepositoryDTO)
-async def get_depository_status(service: BookService = Depends(get_service)) -> DepositoryDTO:
-    depo = service.depository_status()
+async def get_depository_status(service: AsyncBookService = Depends(get_service)) -> DepositoryDTO:
+    depo = await service.depository_status()
     return depo
 
+@router.get("/cache/stats")
+def get_cache_stats() -> CacheStatsDTO:
+    return dto_cache.stats()
+
 
 #Author endpoints
+@router.get("/author/autocomplete")
+async def autocomplete_authors(q: str = Query(..., min_length=1, max_length=100,
+                                              description="beginning of the first or last name"),
+                               limit: int = Query(DEFAULT_AUTOCOMPLETE_LIMIT, ge=1, le=MAX_AUTOCOMPLETE_LIMIT),
+                               service: AsyncBookService = Depends(get_service)) -> list[NameSuggestionDTO]:
+    return await service.autocomplete_authors(q, limit)
+
+
 @router.get("/author/{author_id}")
-async def get_author(author_id: int, service: BookService = Depends(get_service)) -> AuthorDTO:
+async def get_author(author_id: int, selection: FieldSelection = Depends(),
+                     conditional: ConditionalRead = Depends(get_conditional),
+                     service: AsyncBookService = Depends(get_service)) -> AuthorDTO:
     try:
-        return service.find_author_by_id(author_id)
+        dto = await service.find_author_by_id(author_id, selection.fields, selection.depth, conditional)
+        return selection.response(dto, conditional.headers)
+    except NotModified:
+        return not_modified(conditional)
+    except FieldSelectionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except AuthorNotFound:
         raise HTTPException(status_code=404, detail="Author not found")
 
 
 @router.get("/author/fullname")
-async def get_author_by_fullname(full_name: FullNameDTO, service: BookService = Depends(get_service)) -> AuthorDTO:
+async def get_author_by_fullname(full_name: FullNameDTO,
+                                 service: AsyncBookService = Depends(get_service)) -> AuthorDTO:
     try:
-        return service.find_author_by_full_name(full_name)
+        return await service.find_author_by_full_name(full_name)
     except AuthorNotFound:
         raise HTTPException(status_code=404, detail="Author not found")
 
 
 @router.post("/author/")
-async def create_author(author: NewAuthorDTO, service: BookService = Depends(get_service)) -> AuthorDTO:
-    return service.create_author(author)
+async def create_author(author: NewAuthorDTO, service: AsyncBookService = Depends(get_service)) -> AuthorDTO:
+    return await service.create_author(author)
 
 
 @router.put("/author/")
-async def change_author(author: AuthorDTO, service: BookService = Depends(get_service)) -> AuthorDTO:
+async def change_author(author: AuthorDTO, service: AsyncBookService = Depends(get_service)) -> AuthorDTO:
     try:
-        return service.update_author(author)
+        return await service.update_author(author)
     except AuthorNotFound:
         raise HTTPException(status_code=404, detail="Author whit this id not found")
     except AuthorUpdateConflict as e:
@@ -59,9 +121,9 @@ async def change_author(author: AuthorDTO, service: BookService = Depends(get_se
 
 
 @router.delete("/author/{author_id}")
-async def delete_author(author_id: int, service: BookService = Depends(get_service)) -> AuthorDTO:
+async def delete_author(author_id: int, service: AsyncBookService = Depends(get_service)) -> AuthorDTO:
     try:
-        return service.delete_author_by_id(author_id)
+        return await service.delete_author_by_id(author_id)
     except AuthorNotFound:
         raise HTTPException(status_code=404, detail="Author not found")
     except BookPresentInDatabase as e:
@@ -69,42 +131,80 @@ async def delete_author(author_id: int, service: BookService = Depends(get_servi
 
 
 @router.delete("/author/without-book")
-async def delete_authors_without_book(service: BookService = Depends(get_service)) -> list[AuthorDTO]:
+async def delete_authors_without_book(service: AsyncBookService = Depends(get_service)) -> list[AuthorDTO]:
     try:
-        return service.delete_authors_without_book()
+        return await service.delete_authors_without_book()
     except AuthorNotFound:
         raise HTTPException(status_code=404, detail="Authors without books not found")
 
 
 #Book endpoints
+@router.get("/book/search")
+async def search_books(q: str = Query(..., min_length=1, max_length=200, description="words of a title, publisher or "
+                                                                                    "author name, typos are tolerated"),
+                       limit: int = Query(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT),
+                       offset: int = Query(0, ge=0),
+                       service: AsyncBookService = Depends(get_service)) -> BookSearchPageDTO:
+    return await service.search_books(q, limit=limit, offset=offset)
+
+
 @router.get("/book/{book_id}")
-async def get_book_by_id(book_id: int, service: BookService = Depends(get_service)) -> BookDTO:
+async def get_book_by_id(book_id: int, selection: FieldSelection = Depends(),
+                         conditional: ConditionalRead = Depends(get_conditional),
+                         service: AsyncBookService = Depends(get_service)) -> BookDTO:
     try:
-        return service.find_book_by_id(book_id)
+        dto = await service.find_book_by_id(book_id, selection.fields, selection.depth, conditional)
+        return selection.response(dto, conditional.headers)
+    except NotModified:
+        return not_modified(conditional)
+    except FieldSelectionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except BookNotFound:
         raise HTTPException(status_code=404, detail="Book not found")
 
 
 @router.get("/book/isbn/{isbn}")
-async def get_book_by_isbn(isbn: str, service: BookService = Depends(get_service)) -> BookDTO:
+async def get_book_by_isbn(isbn: str, selection: FieldSelection = Depends(),
+                           conditional: ConditionalRead = Depends(get_conditional),
+                           service: AsyncBookService = Depends(get_service)) -> BookDTO:
     try:
-        return service.find_book_by_isbn(isbn)
+        dto = await service.find_book_by_isbn(isbn, selection.fields, selection.depth, conditional)
+        return selection.response(dto, conditional.headers)
+    except NotModified:
+        return not_modified(conditional)
+    except FieldSelectionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except BookNotFound:
         raise HTTPException(status_code=404, detail="Book not found")
 
 
+@router.post("/book/batch")
+async def get_books_by_isbns(batch: IsbnBatchDTO, service: AsyncBookService = Depends(get_service)) -> BookBatchDTO:
+    return await service.find_books_by_isbns(batch.isbns)
+
+
+@router.post("/book/import")
+async def import_books(request: Request, file_format: ExportFormat = Query(ExportFormat.NDJSON,
+                                                                           alias="format")) -> BookImportReportDTO:
+    feed = io.StringIO((await request.body()).decode("utf-8-sig"))
+    try:
+        return await run_in_threadpool(import_book_feed, feed, file_format)
+    except BookPresentInDatabase as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
 @router.post("/book/")
-async def create_book(book: NewBookDTO, service: BookService = Depends(get_service)) -> BookDTO:
+async def create_book(book: NewBookDTO, service: AsyncBookService = Depends(get_service)) -> BookDTO:
     try:
-        return service.create_book(book)
+        return await service.create_book(book)
     except BookPresentInDatabase as e:
         raise HTTPException(status_code=409, detail=str(e))
 
 
 @router.delete("/book/")
-async def delete_book(book_id: int, service: BookService = Depends(get_service)) -> BookDTO:
+async def delete_book(book_id: int, service: AsyncBookService = Depends(get_service)) -> BookDTO:
     try:
-        return service.delete_book(book_id)
+        return await service.delete_book(book_id)
     except BookCopyBorrowed as e:
         raise HTTPException(status_code=409, detail=str(e))
     except BookNotFound as e:
@@ -112,54 +212,103 @@ async def delete_book(book_id: int, service: BookService = Depends(get_service))
 
 
 @router.delete("/book/without-copies")
-async def delete_books_without_copies(service: BookService = Depends(get_service)) -> list[BookDTO]:
+async def delete_books_without_copies(service: AsyncBookService = Depends(get_service)) -> list[BookDTO]:
     try:
-        return service.delete_books_without_copies()
+        return await service.delete_books_without_copies()
     except BookNotFound:
         raise HTTPException(status_code=404, detail=f"Books without copies not found")
 
 
 #BookCopy endpoints
-@router.get("/book-copy/{id}")
-async def get_book_copy_by_id(book_id: int, service: BookService = Depends(get_service)) -> BookCopyDTO:
+@router.get("/book-copy/{copy_id}")
+async def get_book_copy_by_id(copy_id: int, selection: FieldSelection = Depends(),
+                              conditional: ConditionalRead = Depends(get_conditional),
+                              service: AsyncBookService = Depends(get_service)) -> BookCopyDTO:
     try:
-        return service.find_book_copy(book_id)
+        dto = await service.find_book_copy(copy_id, selection.fields, selection.depth, conditional)
+        return selection.response(dto, conditional.headers)
+    except NotModified:
+        return not_modified(conditional)
+    except FieldSelectionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except BookCopyNotFound as e:
         raise HTTPException(status_code=404, detail=str(e))
 
 
 @router.get("/book-copy/status/{status}")
-async def get_book_copy_by_status(status: BookStatus, service: BookService = Depends(get_service)) -> list[BookCopyDTO]:
+async def get_book_copy_by_status(status: BookStatus,
+                                  limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                                  cursor: int | None = Query(None, ge=0,
+                                                             description="next_cursor of the previous page"),
+                                  service: AsyncBookService = Depends(get_service)) -> BookCopyPageDTO:
     try:
-        return service.find_book_copies_for_status(status)
+        return await service.find_book_copies_for_status(status, limit=limit, cursor=cursor)
     except BookCopyNotFound as e:
         raise HTTPException(status_code=404, detail=str(e))
 
 
-@router.get("/book-copy/statement/{status}")
-async def get_book_copy_by_status(statement: BookStatement,
-                                  service: BookService = Depends(get_service)) -> list[BookCopyDTO]:
+@router.get("/book-copy/statement/{statement}")
+async def get_book_copy_by_statement(statement: BookStatement,
+                                     limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                                     cursor: int | None = Query(None, ge=0,
+                                                                description="next_cursor of the previous page"),
+                                     service: AsyncBookService = Depends(get_service)) -> BookCopyPageDTO:
     try:
-        return service.find_book_copies_for_statement(statement)
+        return await service.find_book_copies_for_statement(statement, limit=limit, cursor=cursor)
     except BookCopyNotFound as e:
         raise HTTPException(status_code=404, detail=str(e))
 
 
+@router.post("/book-copy/batch")
+async def get_book_copies_by_ids(batch: IdBatchDTO,
+                                 service: AsyncBookService = Depends(get_service)) -> BookCopyBatchDTO:
+    return await service.find_book_copies_by_ids(batch.ids)
+
+
 @router.post("/book-copy/")
-async def create_book_copy(book_copy: NewBookCopyDTO, service: BookService = Depends(get_service)) -> BookCopyDTO:
+async def create_book_copy(book_copy: NewBookCopyDTO, service: AsyncBookService = Depends(get_service)) -> BookCopyDTO:
     try:
-        return service.create_book_copy(book_copy)
+        return await service.create_book_copy(book_copy)
     except StorageSpaceIsNotSufficient as e:
         raise HTTPException(status_code=409, detail=str(e))
     except BookNotFound as e:
         raise HTTPException(status_code=409, detail=str(e))
 
 
+@router.post("/book-copy/borrow")
+async def borrow_book_copies(batch: BookCopyBorrowDTO,
+                             service: AsyncBookService = Depends(get_service)) -> list[BookCopyDTO]:
+    try:
+        return await service.borrow_book_copies(batch.copy_ids, customer_id=batch.customer_id)
+    except CustomerNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except BookCopyBatchRejected as e:
+        raise HTTPException(status_code=409, detail=[BookCopyErrorDTO(copy_id=copy_id, error=error).model_dump()
+                                                     for copy_id, error in e.errors.items()])
+
+
+@router.post("/book-copy/return")
+async def return_book_copies(batch: BookCopyReturnDTO,
+                             service: AsyncBookService = Depends(get_service)) -> list[BookCopyDTO]:
+    try:
+        return await service.return_book_copies(batch.copy_ids)
+    except StorageSpaceIsNotSufficient as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except BookCopyBatchRejected as e:
+        raise HTTPException(status_code=409, detail=[BookCopyErrorDTO(copy_id=copy_id, error=error).model_dump()
+                                                     for copy_id, error in e.errors.items()])
+
+
 @router.put("/book-copy/{copy_id}/status/{status}")
 async def change_book_copy_status(copy_id: int, status: BookStatus,
-                                  service: BookService = Depends(get_service)) -> BookCopyDTO:
+                                  customer_id: int | None = Query(None, ge=0,
+                                                                  description="borrowing customer, required for "
+                                                                              "status borrowed"),
+                                  service: AsyncBookService = Depends(get_service)) -> BookCopyDTO:
     try:
-        return service.change_book_copy_status(copy_id=copy_id, status=status)
+        return await service.change_book_copy_status(copy_id=copy_id, status=status, customer_id=customer_id)
+    except CustomerMustBeGiven as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except StorageSpaceIsNotSufficient as e:
         raise HTTPException(status_code=409, detail=str(e))
     except BookCopyNotFound as e:
@@ -170,9 +319,9 @@ async def change_book_copy_status(copy_id: int, status: BookStatus,
 
 @router.put("/book-copy/{id}/statement/{statement}")
 async def change_book_copy_statement(copy_id: int, statement: BookStatement,
-                                     service: BookService = Depends(get_service)) -> BookCopyDTO:
+                                     service: AsyncBookService = Depends(get_service)) -> BookCopyDTO:
     try:
-        return service.change_book_copy_statement(copy_id=copy_id, statement=statement)
+        return await service.change_book_copy_statement(copy_id=copy_id, statement=statement)
     except WrongNewStatement as e:
         raise HTTPException(status_code=409, detail=str(e))
     except BookCopyNotFound as e:
@@ -180,9 +329,9 @@ async def change_book_copy_statement(copy_id: int, statement: BookStatement,
 
 
 @router.delete("/book-copy/{id}")
-async def delete_book_copy(copy_id: int, service: BookService = Depends(get_service)) -> BookCopyDTO:
+async def delete_book_copy(copy_id: int, service: AsyncBookService = Depends(get_service)) -> BookCopyDTO:
     try:
-        return service.delete_book_copy(copy_id=copy_id)
+        return await service.delete_book_copy(copy_id=copy_id)
     except BookCopyNotFound as e:
         raise HTTPException(status_code=404, detail=str(e))
     except BookCopyBorrowed as e:
@@ -190,42 +339,63 @@ async def delete_book_copy(copy_id: int, service: BookService = Depends(get_serv
 
 
 #Customer endpoints
-@router.get("/customer/{id}")
-async def get_customer(customer_id: int, service: BookService = Depends(get_service)) -> CustomerDTO:
+@router.get("/customer/autocomplete")
+async def autocomplete_customers(q: str = Query(..., min_length=1, max_length=100,
+                                                description="beginning of the first or last name"),
+                                 limit: int = Query(DEFAULT_AUTOCOMPLETE_LIMIT, ge=1, le=MAX_AUTOCOMPLETE_LIMIT),
+                                 service: AsyncBookService = Depends(get_service)) -> list[NameSuggestionDTO]:
+    return await service.autocomplete_customers(q, limit)
+
+
+@router.get("/customer/{customer_id}")
+async def get_customer(customer_id: int, selection: FieldSelection = Depends(),
+                       conditional: ConditionalRead = Depends(get_conditional),
+                       service: AsyncBookService = Depends(get_service)) -> CustomerDTO:
     try:
-        return service.find_customer_by_id(customer_id)
+        dto = await service.find_customer_by_id(customer_id, selection.fields, selection.depth, conditional)
+        return selection.response(dto, conditional.headers)
+    except NotModified:
+        return not_modified(conditional)
+    except FieldSelectionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except CustomerNotFound as e:
         raise HTTPException(status_code=404, detail=str(e))
 
 
 @router.get("/customer/email/{email}")
-async def get_customer_by_email(email: str, service: BookService = Depends(get_service)) -> CustomerDTO:
+async def get_customer_by_email(email: str, service: AsyncBookService = Depends(get_service)) -> CustomerDTO:
     try:
-        return service.find_customer_by_email(email)
+        return await service.find_customer_by_email(email)
     except CustomerNotFound as e:
         raise HTTPException(status_code=404, detail=str(e))
 
 
 @router.get("/customer/phone/{phone}")
-async def get_customer_by_phone(phone: str, service: BookService = Depends(get_service)) -> CustomerDTO:
+async def get_customer_by_phone(phone: str, service: AsyncBookService = Depends(get_service)) -> CustomerDTO:
     try:
-        return service.find_customer_by_phone(phone)
+        return await service.find_customer_by_phone(phone)
     except CustomerNotFound as e:
         raise HTTPException(status_code=404, detail=str(e))
 
 
 @router.get("customer/fullname")
-async def get_customer_by_fullname(fullname: FullNameDTO, service: BookService = Depends(get_service)) -> CustomerDTO:
+async def get_customer_by_fullname(fullname: FullNameDTO,
+                                   service: AsyncBookService = Depends(get_service)) -> CustomerDTO:
     try:
-        return service.find_customer_by_fullname(fullname)
+        return await service.find_customer_by_fullname(fullname)
     except CustomerNotFound as e:
         raise HTTPException(status_code=404, detail=str(e))
 
 
+@router.post("/customer/batch")
+async def get_customers_by_ids(batch: IdBatchDTO, service: AsyncBookService = Depends(get_service)) -> CustomerBatchDTO:
+    return await service.find_customers_by_ids(batch.ids)
+
+
 @router.post("/customer/")
-async def create_customer(customer: NewCustomerDTO, service: BookService = Depends(get_service)) -> CustomerDTO:
+async def create_customer(customer: NewCustomerDTO, service: AsyncBookService = Depends(get_service)) -> CustomerDTO:
     try:
-        return service.create_customer(customer)
+        return await service.create_customer(customer)
     except EmailValidationError as e:
         raise HTTPException(status_code=422, detail=str(e))
     except PhoneValidationError as e:
@@ -240,9 +410,9 @@ async def create_customer(customer: NewCustomerDTO, service: BookService = Depen
 
 @router.put("/customer/{customer_id}/phone/")
 async def change_customer_phone_number(customer_id: int, phone: StringDTO,
-                                       service: BookService = Depends(get_service)) -> CustomerDTO:
+                                       service: AsyncBookService = Depends(get_service)) -> CustomerDTO:
     try:
-        return service.change_customer_phone_number(customer_id=customer_id, phone=phone)
+        return await service.change_customer_phone_number(customer_id=customer_id, phone=phone)
     except PhoneValidationError as e:
         raise HTTPException(status_code=422, detail=str(e))
     except CustomerNotFound as e:
@@ -251,10 +421,31 @@ async def change_customer_phone_number(customer_id: int, phone: StringDTO,
 
 @router.put("/customer/{customer_id}/email/")
 async def change_customer_email(customer_id: int, email: StringDTO,
-                                       service: BookService = Depends(get_service)) -> CustomerDTO:
+                                       service: AsyncBookService = Depends(get_service)) -> CustomerDTO:
     try:
-        return service.change_customer_email(customer_id, email)
+        return await service.change_customer_email(customer_id, email)
     except EmailValidationError as e:
         raise HTTPException(status_code=422, detail=str(e))
     except CustomerNotFound as e:
         raise HTTPException(status_code=404, detail=str(e))
+
+
+#Export endpoints
+@router.get("/export/books")
+async def export_books(file_format: ExportFormat = Query(ExportFormat.NDJSON, alias="format")) -> StreamingResponse:
+    exporter = CatalogExporter(file_format)
+    return StreamingResponse(exporter.books(), media_type=exporter.media_type)
+
+
+@router.get("/export/book-copies")
+async def export_book_copies(file_format: ExportFormat = Query(ExportFormat.NDJSON,
+                                                               alias="format")) -> StreamingResponse:
+    exporter = CatalogExporter(file_format)
+    return StreamingResponse(exporter.book_copies(), media_type=exporter.media_type)
+
+
+@router.get("/export/customers")
+async def export_customers(file_format: ExportFormat = Query(ExportFormat.NDJSON,
+                                                             alias="format")) -> StreamingResponse:
+    exporter = CatalogExporter(file_format)
+    return StreamingResponse(exporter.customers(), media_type=exporter.media_type)
@@ -0,0 +1,622 @@
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from psycopg.errors import UniqueViolation
+from .dto_models import (DepositoryDTO, AuthorDTO, NewAuthorDTO, FullNameDTO, BookDTO, NewBookDTO, BookCopyDTO,
+                         NewBookCopyDTO, BookCopyPageDTO, CustomerDTO, StringDTO, NewCustomerDTO,
+                         BookSearchHitDTO, BookSearchPageDTO, NameSuggestionDTO, BookBatchDTO,
+                         BookCopyBatchDTO, CustomerBatchDTO, DEFAULT_PAGE_SIZE,
+                         DEFAULT_SEARCH_LIMIT, DEFAULT_AUTOCOMPLETE_LIMIT)
+from ..enums.enums import BookStatus, PlacementStatus, BookStatement
+from ..repositories.async_repository import AsyncBookRepository
+from ..repositories.orm_models import Author, Book, BookCopy, Customer
+from ..mappers.mappers import AuthorMapper, FullNameMapper, BookMapper, BookCopyMapper, CustomerMapper, PhoneMapper
+from ..exceptions.exceptions import *
+from ..validators.validators import PhoneValidator, EmailValidator
+from .depository_stats import depository_stats_cache
+from .autocomplete import author_autocomplete, customer_autocomplete
+from .conditional import ConditionalRead
+from .dto_cache import dto_cache
+from ..query_audit import audited
+from ..logger import app_logger
+
+
+@audited
+class AsyncBookService:
+    """Business logic of the API routers."""
+
+    def __init__(self, session: AsyncSession) -> None:
+        self.session = session
+        self.repo = AsyncBookRepository(session)
+
+    async def depository_status(self) -> DepositoryDTO:
+        app_logger.info("Calling depository_status function")
+        depo = depository_stats_cache.get()
+        if depo:
+            return depo
+        generation = depository_stats_cache.generation()
+        depo = DepositoryDTO(**(await self.repo.get_depository_stats())._asdict())
+        depository_stats_cache.set(depo, generation)
+        return depo
+
+    async def load_autocomplete_indexes(self) -> None:
+        for index, find_names in ((author_autocomplete, self.repo.find_author_names),
+                                  (customer_autocomplete, self.repo.find_customer_names)):
+            generation = index.generation()
+            index.load(await find_names(), generation)
+
+    # Author functions
+    async def find_author_by_id(self, author_id: int, fields: str | None = None, depth: int | None = None,
+                                conditional: ConditionalRead | None = None) -> AuthorDTO:
+        app_logger.info(f"Calling find_author_by_id function with parameter: {author_id}")
+        key = ('author', author_id, fields, depth)
+        cached = dto_cache.lookup(key, conditional)
+        if cached is not None:
+            return cached
+        generation = dto_cache.generation()
+        projection = AuthorMapper.projection(fields, depth)
+        author = await self.repo.find_author_by_id(author_id, loader_options=projection.loader_options)
+        if not author:
+            app_logger.warning(f"Author with id {author_id} not found")
+            raise AuthorNotFound(f"Author with id {author_id} not found")
+        return dto_cache.store(key, projection, author, generation, conditional)
+
+    async def find_author_by_full_name(self, author: FullNameDTO) -> AuthorDTO:
+        app_logger.info(f"Calling find_author_by_full_name function with parameter: {author}")
+        find_author = await self.repo.find_author(author=FullNameMapper.dto_to_dict(author))
+        if not find_author:
+            app_logger.warning(f"Author with full name \"{author}\" not found")
+            raise AuthorNotFound(f"Author with full name {author} not found")
+        return AuthorMapper.orm_to_dto(find_author)
+
+    async def autocomplete_authors(self, query: str,
+                                   limit: int = DEFAULT_AUTOCOMPLETE_LIMIT) -> list[NameSuggestionDTO]:
+        app_logger.info(f"Calling autocomplete_authors function with parameters: query: {query}, limit: {limit}")
+        if not author_autocomplete.loaded:
+            generation = author_autocomplete.generation()
+            author_autocomplete.load(await self.repo.find_author_names(), generation)
+        return author_autocomplete.suggest(query, limit)
+
+    async def create_author(self, author: NewAuthorDTO) -> AuthorDTO:
+        app_logger.info(f"Calling create_author function with parameter: {author}")
+        try:
+            async with self.session.begin():
+                new_author = await self.repo.create_author(AuthorMapper.new_dto_to_dict(author))
+            author_autocomplete.add(new_author.id, new_author.first_name, new_author.last_name, new_author.middle_name)
+            return AuthorMapper.orm_to_dto(new_author)
+        except IntegrityError as e:
+            orig = e.orig
+            if isinstance(orig, UniqueViolation) and orig.diag.constraint_name == 'uq_author_full_name':
+                app_logger.warning(f"Author with full name {str(author.full_name)} already exists in database")
+                raise AuthorFullNameAlreadyExist(f"Author with full name: {str(author.full_name)} is already exist "
+                                                f"in database") from e
+            else: raise e
+
+    async def update_author(self, author: AuthorDTO) -> AuthorDTO:
+        app_logger.info(f"Calling update_author function with parameters: {author}")
+        try:
+            async with self.session.begin():
+                author_by_id = await self.repo.find_author_by_id(author.id, by_update=True)
+                if not author_by_id:
+                    raise AuthorNotFound(f"Author with id {author.id} not found")
+                updated_author = await self.repo.update_author(AuthorMapper.dto_to_dict(author))
+            author_autocomplete.add(updated_author.id, updated_author.first_name, updated_author.last_name,
+                                    updated_author.middle_name)
+            dto_cache.invalidate(Author, [updated_author.id])
+            return AuthorMapper.orm_to_dto(updated_author)
+        except IntegrityError as e:
+            orig = e.orig
+            if isinstance(orig, UniqueViolation) and orig.diag.constraint_name == 'uq_author_full_name':
+                app_logger.warning(f"Author with full name: {str(author.full_name)} already exists in database")
+                raise AuthorFullNameAlreadyExist(f"Author with fullname {str(author.full_name)} is "
+                                                 f"already exist in database") from e
+            else: raise e
+
+    async def delete_author_by_id(self, author_id: int) -> AuthorDTO:
+        app_logger.info(f"Calling delete_author_by_id function with parameter: {author_id}")
+        async with self.session.begin():
+            book_author = await self.repo.find_books_by_author_id(author_id)
+            if book_author:
+                app_logger.warning(f"Author with id {author_id} has {len(book_author)} book(s) in repository")
+                raise BookPresentInDatabase(f"{len(book_author)} book(s) is present in repository. Delete author "
+                                            f"books before deleting the author")
+            author = await self.repo.delete_author_by_id(author_id)
+            if not author:
+                app_logger.warning(f"Author with id {author_id} not found")
+                raise AuthorNotFound(f"Author with id {author_id} not found")
+        author_autocomplete.remove([author.id])
+        dto_cache.invalidate(Author, [author.id])
+        return AuthorMapper.orm_to_dto(author)
+
+    async def delete_authors_without_book(self) -> list[AuthorDTO]:
+        app_logger.info(f"Calling delete_authors_without_book function")
+        async with self.session.begin():
+            authors = await self.repo.find_authors_without_book(for_update=True)
+            if not authors:
+                app_logger.info(f"Author without books not found")
+                raise AuthorNotFound(f"Author without books not found")
+            authors = await self.repo.delete_authors_by_ids(authors)
+        author_autocomplete.remove([author.id for author in authors])
+        dto_cache.invalidate(Author, [author.id for author in authors])
+        return [AuthorMapper.orm_to_dto(author) for author in authors]
+
+    # Book functions
+    async def find_book_by_id(self, book_id: int, fields: str | None = None, depth: int | None = None,
+                              conditional: ConditionalRead | None = None) -> BookDTO:
+        app_logger.info(f"Calling find_book_by_id function with parameter: {book_id}")
+        key = ('book', book_id, fields, depth)
+        cached = dto_cache.lookup(key, conditional)
+        if cached is not None:
+            return cached
+        generation = dto_cache.generation()
+        projection = BookMapper.projection(fields, depth)
+        book = await self.repo.find_book_by_id(book_id, loader_options=projection.loader_options)
+        if not book:
+            app_logger.warning(f"Book with id {book_id} not found")
+            raise BookNotFound(f"Book with id {book_id} not found")
+        return dto_cache.store(key, projection, book, generation, conditional)
+
+    async def find_book_by_isbn(self, isbn: str, fields: str | None = None, depth: int | None = None,
+                                conditional: ConditionalRead | None = None) -> BookDTO:
+        app_logger.info(f"Calling find_book_by_isbn function with parameter: {isbn}")
+        key = ('book_isbn', isbn, fields, depth)
+        cached = dto_cache.lookup(key, conditional)
+        if cached is not None:
+            return cached
+        generation = dto_cache.generation()
+        projection = BookMapper.projection(fields, depth)
+        book = await self.repo.find_book_by_isbn(isbn, loader_options=projection.loader_options)
+        if not book:
+            app_logger.warning(f"Book with isbn {isbn} not found")
+            raise BookNotFound(f"Book with isbn {isbn} not found")
+        return dto_cache.store(key, projection, book, generation, conditional)
+
+    async def find_books_by_isbns(self, isbns: list[str]) -> BookBatchDTO:
+        isbns = list(dict.fromkeys(isbns))
+        app_logger.info(f"Calling find_books_by_isbns function with {len(isbns)} isbn(s)")
+        books = {book.isbn: book for book in await self.repo.find_books_by_isbns(isbns)}
+        return BookBatchDTO(items=[BookMapper.orm_to_dto(books[isbn]) for isbn in isbns if isbn in books],
+                            missing=[isbn for isbn in isbns if isbn not in books])
+
+    async def search_books(self, query: str, limit: int = DEFAULT_SEARCH_LIMIT, offset: int = 0) -> BookSearchPageDTO:
+        app_logger.info(f"Calling search_books function with parameters: query: {query}, limit: {limit}, "
+                        f"offset: {offset}")
+        rows = await self.repo.search_books(query, limit=limit + 1, offset=offset)
+        hits = [BookSearchHitDTO.model_construct(rank=rank, book=BookMapper.book_search_converter(book))
+                for book, rank in rows[:limit]]
+        return BookSearchPageDTO(items=hits, next_offset=offset + limit if len(rows) > limit else None)
+
+    async def create_book(self, book: NewBookDTO) -> BookDTO:
+        app_logger.info(f"Calling create_book function with parameter: {book}")
+        try:
+            async with self.session.begin():
+                if await self.repo.find_book_by_isbn(book.isbn):
+                    app_logger.warning(f"Book not created. Book with isbn {book.isbn} present in database")
+                    raise BookPresentInDatabase(f"Book with isbn {book.isbn} present in database")
+                new_book = await self.repo.create_book(BookMapper.new_dto_to_dict(book))
+                author_ids: list[int] = []
+                for author in book.authors or []:
+                    author_dict = AuthorMapper.new_dto_to_dict(author)
+                    ath = await self.repo.find_author(author_dict)
+                    if not ath:
+                        ath = await self.repo.create_author(author_dict)
+                    await self.repo.create_author_book_rel(book_id=new_book.book_id, author_id=ath.id)  #type: ignore
+                    author_ids.append(ath.id)
+                available_places = await self.repo.find_free_place(book.new_copies)
+                if len(available_places) < book.new_copies:
+                    raise StorageSpaceIsNotSufficient(f"Free place for {book.new_copies} of {book.title} is`t "
+                                                      f"available ")
+                new_book_copies: list[dict] = [{"book_id": new_book.book_id,
+                                                "status": BookStatus.AVAILABLE,
+                                                "statement": book.copy_statement,
+                                                "placement_id": place} for place in available_places]
+                await self.repo.create_book_copies(new_book_copies)
+                await self.repo.change_places_status(place_ids=available_places, status=PlacementStatus.OCCUPIED)
+        except IntegrityError as e:
+            orig = e.orig
+            if isinstance(orig, UniqueViolation) and orig.diag.constraint_name == 'uq_isbn':
+                app_logger.warning(f"Book with isbn {book.isbn} present in database")
+                raise BookPresentInDatabase(f"Book with isbn {book.isbn} present in database") from e
+            else: raise e
+        depository_stats_cache.invalidate()
+        dto_cache.invalidate(Author, author_ids)
+        return await self.find_book_by_isbn(book.isbn)
+
+    async def delete_book(self, book_id: int) -> BookDTO:
+        app_logger.info(f"Calling delete_book function with parameter: {book_id}")
+        async with self.session.begin():
+            book = await self.repo.find_book_by_id(book_id, for_update=True)
+            if not book:
+                raise BookNotFound(f"Book with id {book_id} not found")
+            place_ids: list[int] = []
+            copy_ids: list[int] = []
+            borrowed_copies_ids: list[int] = []
+            for copy in book.book_copies:
+                if copy.status == BookStatus.BORROWED:
+                    borrowed_copies_ids.append(copy.copy_id)
+                if copy.status == BookStatus.AVAILABLE and copy.placement_id:
+                    place_ids.append(copy.placement_id)
+                copy_ids.append(copy.copy_id)
+            if borrowed_copies_ids:
+                app_logger.warning(f"Attempt to delete book {book.title} with isbn {book.isbn} whose copies "
+                                   f"{borrowed_copies_ids} are borrowed")
+                raise BookCopyBorrowed(f"Book copies {borrowed_copies_ids}  of book '{book.title}' is borrowed. "
+                                       f"Change its status before delete")
+            deleted_book = BookMapper.orm_to_dto(book)
+            await self.repo.delete_book_copies_by_ids(ids=copy_ids)
+            await self.repo.change_places_status(place_ids=place_ids, status=PlacementStatus.FREE)
+            await self.repo.delete_book_by_id(book.book_id) #type: ignore
+        depository_stats_cache.invalidate()
+        dto_cache.invalidate(Book, [book_id])
+        dto_cache.invalidate(BookCopy, copy_ids)
+        return deleted_book
+
+    async def delete_books_without_copies(self) -> list[BookDTO]:
+        async with self.session.begin():
+            books = await self.repo.find_book_without_copy(for_update=True)
+            if not books:
+                raise BookNotFound(f"Books without copy found")
+            deleted_books = [BookMapper.orm_to_dto(book) for book in books]
+            await self.repo.delete_books(book_ids=[book.book_id for book in books])  #type: ignore
+        dto_cache.invalidate(Book, [book.book_id for book in deleted_books])
+        return deleted_books
+
+    # Book copies functions
+    async def find_book_copy(self, copy_id: int, fields: str | None = None, depth: int | None = None,
+                             conditional: ConditionalRead | None = None) -> BookCopyDTO:
+        app_logger.info(f"Calling find_book_copy function with parameter: {copy_id}")
+        key = ('book_copy', copy_id, fields, depth)
+        cached = dto_cache.lookup(key, conditional)
+        if cached is not None:
+            return cached
+        generation = dto_cache.generation()
+        projection = BookCopyMapper.projection(fields, depth)
+        book_copy = await self.repo.find_book_copy(copy_id, loader_options=projection.loader_options)
+        if not book_copy:
+            app_logger.warning(f"Book with id {copy_id} not found")
+            raise BookCopyNotFound(f"Book copy with id {copy_id} not found")
+        return dto_cache.store(key, projection, book_copy, generation, conditional)
+
+    async def find_book_copies_by_ids(self, ids: list[int]) -> BookCopyBatchDTO:
+        ids = list(dict.fromkeys(ids))
+        app_logger.info(f"Calling find_book_copies_by_ids function with {len(ids)} id(s)")
+        copies = {copy.copy_id: copy for copy in await self.repo.find_book_copies_by_ids(ids)}
+        return BookCopyBatchDTO(items=[BookCopyMapper.orm_to_dto(copies[i], trusted=True) for i in ids if i in copies],
+                                missing=[i for i in ids if i not in copies])
+
+    async def find_book_copies_for_status(self, status: BookStatus, limit: int = DEFAULT_PAGE_SIZE,
+                                          cursor: int | None = None) -> BookCopyPageDTO:
+        app_logger.info(f"Calling find_book_copies_for_status function with parameters: status: {status}, "
+                        f"limit: {limit}, cursor: {cursor}")
+        book_copies = await self.repo.find_book_copies_for_status(status, limit=limit + 1, after=cursor)
+        if not book_copies and cursor is None:
+            app_logger.warning(f"Book copies with status: {status} not found")
+            raise BookCopyNotFound(f"Book copy(ies) with status {status} not found")
+        next_cursor = book_copies[limit - 1].copy_id if len(book_copies) > limit else None
+        return BookCopyPageDTO(items=[BookCopyMapper.orm_to_dto(book_copy, trusted=True)
+                                      for book_copy in book_copies[:limit]],
+                               next_cursor=next_cursor)
+
+    async def find_book_copies_for_statement(self, statement: BookStatement, limit: int = DEFAULT_PAGE_SIZE,
+                                             cursor: int | None = None) -> BookCopyPageDTO:
+        app_logger.info(f"Calling find_book_copies_for_statement function with parameters: statement: {statement}, "
+                        f"limit: {limit}, cursor: {cursor}")
+        book_copies = await self.repo.find_book_copies_for_statement(statement, limit=limit + 1, after=cursor)
+        if not book_copies and cursor is None:
+            app_logger.warning(f"Book copies with statement: {statement} not found")
+            raise BookCopyNotFound(f"Book copy(ies) with statement {statement} not found")
+        next_cursor = book_copies[limit - 1].copy_id if len(book_copies) > limit else None
+        return BookCopyPageDTO(items=[BookCopyMapper.orm_to_dto(book_copy, trusted=True)
+                                      for book_copy in book_copies[:limit]],
+                               next_cursor=next_cursor)
+
+    async def create_book_copy(self, book_copy: NewBookCopyDTO) -> BookCopyDTO:
+        app_logger.info(f"Calling create_book_copy function with parameter: {book_copy}")
+        async with self.session.begin():
+            place = await self.repo.find_free_place(1, book_id=book_copy.book_id)
+            if not place:
+                app_logger.warning("Free place in depository for new book copy not found")
+                raise StorageSpaceIsNotSufficient(f"Free place in depository for new book copy is`t available ")
+            book = await self.repo.find_book_by_id(book_copy.book_id, for_update=True)
+            if not book:
+                app_logger.warning(f"Book with book_id: {book_copy.book_id} for this book copy not found")
+                raise BookNotFound(f"Book for this book copy not found. Add first the book")
+            new_copy = book_copy.model_dump(exclude_unset=True)
+            new_copy.update(book_id=book_copy.book_id, status=BookStatus.AVAILABLE, placement_id=place[0])
+            new_book_copy = await self.repo.create_book_copy(new_copy)
+            await self.repo.change_place_status(place_id=place[0], status=PlacementStatus.OCCUPIED)
+            author_ids = await self.repo.find_book_author_ids([book_copy.book_id])
+        depository_stats_cache.invalidate()
+        self._invalidate_book_copies([new_book_copy.copy_id], [book_copy.book_id], author_ids)
+        return BookCopyMapper.orm_to_dto(new_book_copy, trusted=True)
+
+    async def change_book_copy_status(self, copy_id: int, status: BookStatus,
+                                      customer_id: int | None = None) -> BookCopyDTO:
+        app_logger.info(f"Calling change_book_copy_status function with parameter: copy_id: {copy_id}, "
+                        f"status: {status}, customer_id: {customer_id}")
+        if status==BookStatus.BORROWED and not customer_id:
+            app_logger.warning(f"Bad function parameters. For status BORROWED customer_id must be not NULL")
+            raise CustomerMustBeGiven(f"When book copy is borrowed, customer id is required")
+        async with self.session.begin():
+            book_copy = await self.repo.find_book_copy(copy_id, for_update=True)
+            if not book_copy:
+                app_logger.warning(f"Book with copy_id: {copy_id} not found")
+                raise BookCopyNotFound(f"Book copy with id {copy_id} not found")
+            previous_customer_id = book_copy.customer_id
+            if status == BookStatus.AVAILABLE:
+                place = await self.repo.find_free_place(1, book_id=book_copy.book_id)
+                if not place:
+                    app_logger.warning("Free place in depository for new book copy is`t available ")
+                    raise StorageSpaceIsNotSufficient(f"Free place in depository for book copy is`t available ")
+                await self.repo.change_place_status(place_id=place[0], status=PlacementStatus.OCCUPIED)
+                book_copy = await self.repo.update_book_copy(copy_id=copy_id,
+                                                             book_copy={"status": status, "customer_id": None,
+                                                                        "placement_id": place[0]})
+            elif status == BookStatus.BORROWED:
+                customer = await self.repo.find_customer_by_id(customer_id)
+                if not customer:
+                    app_logger.warning(f"Customer with id {customer_id} not found")
+                    raise CustomerNotFound(f"Customer with id {customer_id} not found")
+                if book_copy.placement_id:
+                    await self.repo.change_place_status(place_id=book_copy.placement_id, status=PlacementStatus.FREE)
+                book_copy = await self.repo.update_book_copy(copy_id=copy_id,
+                                                             book_copy={"status": status, "customer_id": customer_id,
+                                                                        "placement_id": None})
+            else:
+                book_copy = await self.repo.update_book_copy(copy_id=copy_id,
+                                                             book_copy={"status": status, "customer_id": None})
+            author_ids = await self.repo.find_book_author_ids([book_copy.book_id])
+        depository_stats_cache.invalidate()
+        self._invalidate_book_copies([copy_id], [book_copy.book_id], author_ids)
+        dto_cache.invalidate(Customer, [customer_id, previous_customer_id])
+        return BookCopyMapper.orm_to_dto(book_copy, trusted=True)
+
+    async def borrow_book_copies(self, copy_ids: list[int], customer_id: int) -> list[BookCopyDTO]:
+        app_logger.info(f"Calling borrow_book_copies function with parameters: copy_ids: {copy_ids}, "
+                        f"customer_id: {customer_id}")
+        copy_ids = list(dict.fromkeys(copy_ids))
+        async with self.session.begin():
+            if not await self.repo.find_customer_by_id(customer_id):
+                app_logger.warning(f"Customer with id {customer_id} not found")
+                raise CustomerNotFound(f"Customer with id {customer_id} not found")
+            book_copies = await self.repo.find_book_copies_by_ids(copy_ids, for_update=True)
+            self._check_book_copies_status(copy_ids, book_copies, BookStatus.AVAILABLE)
+            place_ids = [book_copy.placement_id for book_copy in book_copies if book_copy.placement_id]
+            if place_ids:
+                await self.repo.change_places_status(place_ids=place_ids, status=PlacementStatus.FREE)
+            book_copies = await self.repo.update_book_copies(
+                copy_ids, {"status": BookStatus.BORROWED, "customer_id": customer_id, "placement_id": None})
+            book_ids = list({book_copy.book_id for book_copy in book_copies})
+            author_ids = await self.repo.find_book_author_ids(book_ids)
+        depository_stats_cache.invalidate()
+        self._invalidate_book_copies(copy_ids, book_ids, author_ids)
+        dto_cache.invalidate(Customer, [customer_id])
+        return self._book_copies_in_order(copy_ids, book_copies)
+
+    async def return_book_copies(self, copy_ids: list[int]) -> list[BookCopyDTO]:
+        app_logger.info(f"Calling return_book_copies function with parameter: copy_ids: {copy_ids}")
+        copy_ids = list(dict.fromkeys(copy_ids))
+        async with self.session.begin():
+            book_copies = await self.repo.find_book_copies_by_ids(copy_ids, for_update=True)
+            self._check_book_copies_status(copy_ids, book_copies, BookStatus.BORROWED)
+            customer_ids = list({book_copy.customer_id for book_copy in book_copies})
+            places = await self.repo.find_free_place(len(copy_ids))
+            if len(places) < len(copy_ids):
+                app_logger.warning(f"Free place for {len(copy_ids)} returned book copies is`t available")
+                raise StorageSpaceIsNotSufficient(f"Free place for {len(copy_ids)} book copies is`t available")
+            await self.repo.change_places_status(place_ids=places, status=PlacementStatus.OCCUPIED)
+            book_copies = await self.repo.place_book_copies(
+                dict(zip(copy_ids, places)), {"status": BookStatus.AVAILABLE, "customer_id": None})
+            book_ids = list({book_copy.book_id for book_copy in book_copies})
+            author_ids = await self.repo.find_book_author_ids(book_ids)
+        depository_stats_cache.invalidate()
+        self._invalidate_book_copies(copy_ids, book_ids, author_ids)
+        dto_cache.invalidate(Customer, customer_ids)
+        return self._book_copies_in_order(copy_ids, book_copies)
+
+    @staticmethod
+    def _check_book_copies_status(copy_ids: list[int], book_copies: list, status: BookStatus) -> None:
+        found = {book_copy.copy_id: book_copy for book_copy in book_copies}
+        errors: dict[int, str] = {}
+        for copy_id in copy_ids:
+            if copy_id not in found:
+                errors[copy_id] = f"Book copy with id {copy_id} not found"
+            elif found[copy_id].status != status:
+                errors[copy_id] = f"Book copy with id {copy_id} is {found[copy_id].status.value}, not {status.value}"
+        if errors:
+            app_logger.warning(f"Status change of book copies {list(errors)} rejected: {list(errors.values())}")
+            raise BookCopyBatchRejected(f"{len(errors)} of {len(copy_ids)} book copies can't change status, "
+                                        f"none was changed", errors)
+
+    @staticmethod
+    def _invalidate_book_copies(copy_ids: list[int], book_ids: list[int], author_ids: list[int]) -> None:
+        # Book and author DTOs list only the available copies, a copy changing status changes them too
+        dto_cache.invalidate(BookCopy, copy_ids)
+        dto_cache.invalidate(Book, book_ids)
+        dto_cache.invalidate(Author, author_ids)
+
+    @staticmethod
+    def _book_copies_in_order(copy_ids: list[int], book_copies: list) -> list[BookCopyDTO]:
+        found = {book_copy.copy_id: book_copy for book_copy in book_copies}
+        return [BookCopyMapper.orm_to_dto(found[copy_id], trusted=True) for copy_id in copy_ids]
+
+    async def change_book_copy_statement(self, copy_id: int, statement: BookStatement) -> BookCopyDTO:
+        app_logger.info(f"Calling change_book_copy_statement function with parameter: copy_id: {copy_id}, "
+                        f"statement: {statement}")
+        async with self.session.begin():
+            book_copy = await self.repo.find_book_copy(copy_id, for_update=True)
+            if not book_copy:
+                app_logger.warning(f"Book with copy_id: {copy_id} not found")
+                raise BookCopyNotFound(f"Book copy with id {copy_id} not found")
+            current_statement = book_copy.statement
+            if (current_statement == BookStatement.NEW) \
+                or (current_statement == BookStatement.GOOD and statement != BookStatement.NEW) \
+                or ((current_statement == BookStatement.DAMAGED or current_statement == BookStatement.UNUSABLE)
+                     and statement == BookStatement.REPAIR) \
+                or (current_statement == BookStatement.DAMAGED and statement == BookStatement.UNUSABLE):
+                new_book_copy = await self.repo.update_book_copy(copy_id=copy_id, book_copy={"statement": statement})
+            else :
+                app_logger.warning(f"Bad new statement {statement} for current book copy statement {current_statement}")
+                raise WrongNewStatement(f"Book copy with id {copy_id} with current statement {current_statement} do "
+                                        f"not might be changed for new statement: {statement}")
+        dto_cache.invalidate(BookCopy, [copy_id])
+        return BookCopyMapper.orm_to_dto(new_book_copy, trusted=True)
+
+    async def delete_book_copy(self, copy_id: int) -> BookCopyDTO:
+        app_logger.info(f"Calling delete_book_copy function with parameter: copy_id: {copy_id}")
+        async with self.session.begin():
+            delete_book_copy = await self.repo.find_book_copy(copy_id, for_update=True)
+            if not delete_book_copy:
+                app_logger.warning(f"Book with copy_id: {copy_id} not found")
+                raise BookCopyNotFound(f"Book copy with id {copy_id} not found")
+            if delete_book_copy.status == BookStatus.BORROWED:
+                app_logger.warning(f"Book with copy_id: {copy_id} borrowed. You cannot delete it")
+                raise BookCopyBorrowed(f"You cannot delete book copy when it is borrowed. First change status")
+            deleted_book_copy = BookCopyMapper.orm_to_dto(delete_book_copy, trusted=True)
+            await self.repo.delete_book_copy(copy_id)
+            if delete_book_copy.placement_id:
+                await self.repo.change_place_status(place_id=delete_book_copy.placement_id,
+                                                    status=PlacementStatus.FREE)
+            author_ids = await self.repo.find_book_author_ids([delete_book_copy.book_id])
+        depository_stats_cache.invalidate()
+        self._invalidate_book_copies([copy_id], [delete_book_copy.book_id], author_ids)
+        return deleted_book_copy
+
+    #Customer
+    async def find_customer_by_id(self, cust_id: int, fields: str | None = None, depth: int | None = None,
+                                  conditional: ConditionalRead | None = None) -> CustomerDTO:
+        app_logger.info(f"Calling find_customer_by_id function with parameter: copy_id: {cust_id}")
+        key = ('customer', cust_id, fields, depth)
+        cached = dto_cache.lookup(key, conditional)
+        if cached is not None:
+            return cached
+        generation = dto_cache.generation()
+        projection = CustomerMapper.projection(fields, depth)
+        customer = await self.repo.find_customer_by_id(cust_id, loader_options=projection.loader_options)
+        if not customer:
+            app_logger.warning(f"Customer with copy_id: {cust_id} not found")
+            raise CustomerNotFound(f"Customer with id {cust_id} not found")
+        return dto_cache.store(key, projection, customer, generation, conditional)
+
+    async def find_customers_by_ids(self, ids: list[int]) -> CustomerBatchDTO:
+        ids = list(dict.fromkeys(ids))
+        app_logger.info(f"Calling find_customers_by_ids function with {len(ids)} id(s)")
+        customers = {customer.customer_id: customer for customer in await self.repo.find_customers_by_ids(ids)}
+        return CustomerBatchDTO(items=[CustomerMapper.orm_to_dto(customers[i], trusted=True)
+                                       for i in ids if i in customers],
+                                missing=[i for i in ids if i not in customers])
+
+    async def find_customer_by_email(self, email: str) -> CustomerDTO:
+        app_logger.info(f"Calling find_customer_by_email function with parameter: email: {email}")
+        key = ('customer_email', email)
+        cached = dto_cache.lookup(key)
+        if cached is not None:
+            return cached
+        generation = dto_cache.generation()
+        customer = await self.repo.find_customer_by_email(email)
+        if not customer:
+            app_logger.warning(f"Customer with email: {email} not found")
+            raise CustomerNotFound(f"Customer with email {email} not found")
+        return dto_cache.store(key, CustomerMapper.projection(), customer, generation)
+
+    async def find_customer_by_phone(self, phone: str) -> CustomerDTO:
+        app_logger.info(f"Calling find_customer_by_phone function with parameter: {phone}")
+        phone = PhoneMapper.phone_number_to_united_style(phone)
+        customer = await self.repo.find_customer_by_phone(phone)
+        if not customer:
+            app_logger.warning(f"Customer with phone: {phone} not found")
+            raise CustomerNotFound(f"Customer with phone {phone} not found")
+        return CustomerMapper.orm_to_dto(customer, trusted=True)
+
+    async def find_customer_by_fullname(self, fullname: FullNameDTO) -> CustomerDTO:
+        app_logger.info(f"Calling find_customer_by_fullname function with parameter: {fullname}")
+        fullname = FullNameMapper.dto_to_dict(fullname)
+        customer = await self.repo.find_customer_by_fullname(fullname)
+        if not customer:
+            app_logger.warning(f"Customer with fullname: {fullname} not found")
+            raise CustomerNotFound(f"Customer with full name {fullname} not found")
+        return CustomerMapper.orm_to_dto(customer, trusted=True)
+
+    async def autocomplete_customers(self, query: str,
+                                     limit: int = DEFAULT_AUTOCOMPLETE_LIMIT) -> list[NameSuggestionDTO]:
+        app_logger.info(f"Calling autocomplete_customers function with parameters: query: {query}, limit: {limit}")
+        if not customer_autocomplete.loaded:
+            generation = customer_autocomplete.generation()
+            customer_autocomplete.load(await self.repo.find_customer_names(), generation)
+        return customer_autocomplete.suggest(query, limit)
+
+    async def create_customer(self, customer: NewCustomerDTO) -> CustomerDTO:
+        app_logger.info(f"Calling create_customer function with parameter: {customer}")
+        if not EmailValidator.validate_email(str(customer.email)):
+            app_logger.warning(f"Invalid email: {customer.email}")
+            raise EmailValidationError(f"Invalid email: {customer.email}")
+        if not PhoneValidator.validate_phone_number(customer.phone):
+            app_logger.warning(f"Invalid phone: {customer.phone}")
+            raise PhoneValidationError(f"Invalid phone: {customer.phone}")
+        try:
+            async with self.session.begin():
+                new_customer = await self.repo.create_customer(CustomerMapper.new_dto_to_dict(customer=customer))
+            customer_autocomplete.add(new_customer.customer_id, new_customer.first_name, new_customer.last_name,
+                                      new_customer.middle_name)
+            return CustomerMapper.orm_to_dto(new_customer, trusted=True)
+        except IntegrityError as e:
+            original_error = e.orig
+            if isinstance(original_error, UniqueViolation):
+                constraint_name = original_error.diag.constraint_name
+                if constraint_name == 'uq_email':
+                    app_logger.warning(f"Customer with email: {customer.email} already exists")
+                    raise CustomerEmailAlreadyExist(f"Customer with email: {customer.email} is already exist "
+                                                    f"in database") from e
+                elif constraint_name == 'uq_phone':
+                    app_logger.warning(f"Customer with phone: {customer.phone} already exists")
+                    raise CustomerPhoneAlreadyExist(f"Customer with phone: {customer.phone} is already exist "
+                                                    f"in database") from e
+                elif constraint_name == 'uq_customer_full_name':
+                    app_logger.warning(f"Customer with full name: {customer.full_name} already exists")
+                    raise CustomerFullNameAlreadyExist(f"Customer with fullname {str(customer.full_name)} is "
+                                                       f"already exist in database") from e
+                else: raise e
+            else: raise e
+
+    async def change_customer_phone_number(self, customer_id: int, phone: StringDTO) -> CustomerDTO:
+        app_logger.info(f"Calling change_customer_phone_number function with parameter: {phone}")
+        phone = phone.string
+        if not PhoneValidator.validate_phone_number(phone):
+            app_logger.warning(f"Invalid phone: {phone}")
+            raise PhoneValidationError(f"Invalid phone number format: {phone}")
+        phone = PhoneMapper.phone_number_to_united_style(phone)
+        try:
+            async with self.session.begin():
+                customer = await self.repo.update_customer(customer_id=customer_id, new_customer={"phone": phone})
+                if not customer:
+                    app_logger.warning(f"Customer with id: {customer_id} not found")
+                    raise CustomerNotFound(f"Customer with id {customer_id} not found")
+                customer = await self.repo.find_customer_by_id(customer_id)
+            dto_cache.invalidate(Customer, [customer_id])
+            return CustomerMapper.orm_to_dto(customer, trusted=True)
+        except IntegrityError as e:
+            orig = e.orig
+            if isinstance(orig, UniqueViolation) and orig.diag.constraint_name == 'uq_phone':
+                app_logger.warning(f"Customer with phone: {phone} already exists")
+                raise CustomerPhoneAlreadyExist(f"Customer with phone: {phone} is already exist in "
+                                                f"database") from e
+            else: raise e
+
+    async def change_customer_email(self, customer_id: int, email: StringDTO) -> CustomerDTO:
+        app_logger.info(f"Calling change_customer_email function with parameter: {email}")
+        email = email.string
+        try:
+            async with self.session.begin():
+                if not await self.repo.find_customer_by_id(customer_id, for_update=True):
+                    app_logger.warning(f"Customer with id: {customer_id} not found")
+                    raise CustomerNotFound(f"Customer with id {customer_id} not found")
+                await self.repo.update_customer(customer_id=customer_id, new_customer={"email": email})
+                customer = await self.repo.find_customer_by_id(customer_id)
+            dto_cache.invalidate(Customer, [customer_id])
+            return CustomerMapper.orm_to_dto(customer, trusted=True)
+        except IntegrityError as e:
+            orig = e.orig
+            if isinstance(orig, UniqueViolation) and orig.diag.constraint_name == 'uq_email':
+                app_logger.warning(f"Customer with email: {email} already exists in database")
+                raise CustomerEmailAlreadyExist(f"Customer with email: {email} is already exist "
+                                                f"in database") from e
+            else: raise e
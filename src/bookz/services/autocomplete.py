@@ -0,0 +1,120 @@
+import threading
+from bisect import bisect_left, insort
+from typing import Iterable
+from .dto_models import FullNameDTO, NameSuggestionDTO
+from ..logger import app_logger
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+class PrefixIndex:
+    """In-memory prefix index of full names, kept as a sorted array of (key, id) pairs.
+
+    Every name is indexed twice, as "last first middle" and as "first last middle", so typing either name first
+    finds it. A lookup is a binary search followed by a walk over the matching run of keys. The index is loaded
+    from the database on first use and then kept current by the write paths through add() and remove().
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._lock = threading.Lock()
+        self._keys: list[tuple[str, int]] = []
+        self._names: dict[int, FullNameDTO] = {}
+        self._loaded = False
+        self._generation = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    @staticmethod
+    def _index_keys(full_name: FullNameDTO) -> list[tuple[str, ...]]:
+        middle = (full_name.middle_name,) if full_name.middle_name else ()
+        return [(full_name.last_name, full_name.first_name, *middle),
+                (full_name.first_name, full_name.last_name, *middle)]
+
+    def _insert(self, entry_id: int, full_name: FullNameDTO) -> None:
+        self._names[entry_id] = full_name
+        for parts in self._index_keys(full_name):
+            insort(self._keys, (normalize(" ".join(parts)), entry_id))
+
+    def _delete(self, entry_id: int) -> None:
+        full_name = self._names.pop(entry_id, None)
+        if full_name is None:
+            return
+        for parts in self._index_keys(full_name):
+            key = (normalize(" ".join(parts)), entry_id)
+            position = bisect_left(self._keys, key)
+            if position < len(self._keys) and self._keys[position] == key:
+                del self._keys[position]
+
+    def load(self, rows: Iterable[tuple[int, str, str, str | None]], generation: int) -> None:
+        """Replaces the index with rows of (id, first_name, last_name, middle_name).
+
+        The rows are dropped when add(), remove() or invalidate() ran after they were read (generation no longer
+        matches), the next lookup loads them again.
+        """
+        names = {entry_id: FullNameDTO.model_construct(first_name=first_name, last_name=last_name,
+                                                       middle_name=middle_name)
+                 for entry_id, first_name, last_name, middle_name in rows}
+        keys = sorted((normalize(" ".join(parts)), entry_id)
+                      for entry_id, full_name in names.items() for parts in self._index_keys(full_name))
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._names = names
+            self._keys = keys
+            self._loaded = True
+        app_logger.info(f"Autocomplete index '{self.name}' loaded with {len(names)} names")
+
+    def add(self, entry_id: int, first_name: str, last_name: str, middle_name: str | None) -> None:
+        with self._lock:
+            self._generation += 1
+            if not self._loaded:
+                return
+            self._delete(entry_id)
+            self._insert(entry_id, FullNameDTO.model_construct(first_name=first_name, last_name=last_name,
+                                                               middle_name=middle_name))
+
+    def remove(self, entry_ids: Iterable[int]) -> None:
+        with self._lock:
+            self._generation += 1
+            if not self._loaded:
+                return
+            for entry_id in entry_ids:
+                self._delete(entry_id)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._loaded = False
+            self._keys = []
+            self._names = {}
+        app_logger.debug(f"Autocomplete index '{self.name}' invalidated")
+
+    def suggest(self, query: str, limit: int) -> list[NameSuggestionDTO]:
+        prefix = normalize(query)
+        suggestions = []
+        seen = set()
+        with self._lock:
+            position = bisect_left(self._keys, (prefix, -1))
+            while position < len(self._keys) and len(suggestions) < limit:
+                key, entry_id = self._keys[position]
+                if not key.startswith(prefix):
+                    break
+                if entry_id not in seen:
+                    seen.add(entry_id)
+                    suggestions.append(NameSuggestionDTO.model_construct(id=entry_id,
+                                                                         full_name=self._names[entry_id]))
+                position += 1
+        return suggestions
+
+
+author_autocomplete = PrefixIndex("authors")
+customer_autocomplete = PrefixIndex("customers")
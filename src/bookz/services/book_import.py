@@ -0,0 +1,167 @@
+import csv
+import json
+import time
+from typing import Iterable, Iterator
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from psycopg2.errors import UniqueViolation
+from .dto_models import BookImportRowDTO, BookImportErrorDTO, BookImportReportDTO
+from .depository_stats import depository_stats_cache
+from .autocomplete import author_autocomplete
+from .dto_cache import dto_cache
+from ..db import get_session
+from ..enums.enums import ExportFormat
+from ..repositories.bulk_loader import BulkLoader
+from ..repositories.book_import import BookImportRepository
+from ..exceptions.exceptions import BookPresentInDatabase
+from ..logger import app_logger
+
+
+def iter_records(lines: Iterable[str], file_format: ExportFormat) -> Iterator[tuple[int, str | dict]]:
+    """Yields (row number, record) of a feed: the raw JSON line of NDJSON or the non-empty columns of CSV."""
+    if file_format == ExportFormat.NDJSON:
+        row_no = 0
+        for line in lines:
+            if line.strip():
+                row_no += 1
+                yield row_no, line
+        return
+    for row_no, record in enumerate(csv.DictReader(lines), start=1):
+        yield row_no, {column: value for column, value in record.items() if column and value not in ("", None)}
+
+
+def validation_message(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}"
+                     for error in e.errors())
+
+
+class BookImporter:
+    """Imports a feed of books in one transaction and reports every rejected row.
+
+    Rows are validated here and COPYed into staging tables. There the isbns already in the catalog and the rows that
+    don't fit in the free placements are dropped, and the rest is inserted with one statement per table.
+    """
+
+    def __init__(self, session: Session):
+        self.session = session
+        self.loader = BulkLoader(session)
+        self.repo = BookImportRepository(session, self.loader)
+
+    def run(self, records: Iterable[tuple[int, str | dict]]) -> BookImportReportDTO:
+        start = time.perf_counter()
+        report = BookImportReportDTO()
+        timer = self.loader.timer
+        with timer.measure("validate") as phase:
+            books = self.validate(records, report)
+            phase.rows = len(books)
+        if books:
+            with self.session.begin():
+                with timer.measure("stage") as phase:
+                    self.repo.create_staging()
+                    phase.rows = self.repo.stage_books(self.book_rows(books))
+                    self.repo.stage_book_authors(self.author_rows(books))
+                    self.repo.analyze_staging()
+                with timer.measure("check_isbn") as phase:
+                    present = self.repo.find_present_isbns()
+                    for row_no, isbn in present:
+                        self.reject(report, row_no, isbn, f"Book with isbn {isbn} present in database")
+                    if present:
+                        self.repo.discard_rows([row_no for row_no, _ in present])
+                    phase.rows = len(present)
+                with timer.measure("allocate_places") as phase:
+                    phase.rows = self.allocate_places(report)
+                with timer.measure("authors") as phase:
+                    phase.rows = report.authors = self.repo.upsert_authors()
+                with timer.measure("books") as phase:
+                    phase.rows = report.books = self.repo.insert_books()
+                with timer.measure("book_author") as phase:
+                    phase.rows = self.repo.insert_book_authors()
+                with timer.measure("book_copies") as phase:
+                    phase.rows = report.copies = self.repo.insert_book_copies()
+                    self.repo.occupy_staged_places()
+            depository_stats_cache.invalidate()
+            if report.authors:
+                author_autocomplete.invalidate()
+            if report.books:
+                # New books may belong to authors that are cached, the import doesn't track which
+                dto_cache.clear()
+        report.errors.sort(key=lambda error: error.row)
+        report.seconds = round(time.perf_counter() - start, 3)
+        app_logger.info(f"Imported {report.books} of {report.rows} books with {report.copies} copies in "
+                        f"{report.seconds}s, {len(report.errors)} row(s) rejected")
+        return report
+
+    def validate(self, records: Iterable[tuple[int, str | dict]],
+                 report: BookImportReportDTO) -> dict[int, BookImportRowDTO]:
+        books: dict[int, BookImportRowDTO] = {}
+        first_rows: dict[str, int] = {}
+        for row_no, record in records:
+            report.rows += 1
+            try:
+                if isinstance(record, str):
+                    book = BookImportRowDTO.model_validate_json(record)
+                else:
+                    if isinstance(record.get("authors"), str):
+                        record["authors"] = json.loads(record["authors"])
+                    book = BookImportRowDTO.model_validate(record)
+            except ValidationError as e:
+                self.reject(report, row_no, record.get("isbn") if isinstance(record, dict) else None,
+                            validation_message(e))
+                continue
+            except ValueError as e:
+                self.reject(report, row_no, record.get("isbn"), f"authors: {e}")
+                continue
+            if book.isbn in first_rows:
+                self.reject(report, row_no, book.isbn,
+                            f"Duplicate of row {first_rows[book.isbn]} with isbn {book.isbn}")
+                continue
+            first_rows[book.isbn] = row_no
+            books[row_no] = book
+        return books
+
+    def allocate_places(self, report: BookImportReportDTO) -> int:
+        """Shelves the copies of every staged row in one pass over the free placements, in row order."""
+        demand = self.repo.find_copy_demand()
+        places = self.repo.find_free_places(sum(row.new_copies for row in demand))
+        copies: list[tuple[int, int]] = []
+        unplaced: list[int] = []
+        for row_no, isbn, new_copies in demand:
+            if len(copies) + new_copies > len(places):
+                self.reject(report, row_no, isbn, f"Free place for {new_copies} copies is`t available")
+                unplaced.append(row_no)
+                continue
+            copies.extend((row_no, place) for place in places[len(copies):len(copies) + new_copies])
+        if unplaced:
+            self.repo.discard_rows(unplaced)
+        return self.repo.stage_copies(copies)
+
+    @staticmethod
+    def book_rows(books: dict[int, BookImportRowDTO]) -> Iterator[tuple]:
+        for row_no, book in books.items():
+            yield (row_no, book.title, book.publisher, book.place_of_publication, book.published_year, book.isbn,
+                   book.pages, book.price, book.language, book.new_copies, book.copy_statement.name)
+
+    @staticmethod
+    def author_rows(books: dict[int, BookImportRowDTO]) -> Iterator[tuple]:
+        for row_no, book in books.items():
+            for author in book.authors or []:
+                yield row_no, author.full_name.first_name, author.full_name.last_name, author.full_name.middle_name
+
+    @staticmethod
+    def reject(report: BookImportReportDTO, row_no: int, isbn, error: str) -> None:
+        report.errors.append(BookImportErrorDTO(row=row_no, isbn=None if isbn is None else str(isbn), error=error))
+
+
+def import_books(lines: Iterable[str], file_format: ExportFormat) -> BookImportReportDTO:
+    app_logger.info(f"Start book import in {file_format.value} format")
+    try:
+        with get_session() as session:
+            return BookImporter(session).run(iter_records(lines, file_format))
+    except IntegrityError as e:
+        orig = e.orig
+        if isinstance(orig, UniqueViolation) and orig.diag.constraint_name == 'uq_isbn':
+            app_logger.warning(f"Book import rolled back, a concurrent writer inserted one of its isbns")
+            raise BookPresentInDatabase(f"Book import rolled back, one of its isbns was inserted meanwhile. "
+                                        f"Retry the import") from e
+        raise e
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import os
+from typing import Callable, NamedTuple
+import psycopg
+from sqlalchemy import make_url
+from .dto_cache import dto_cache
+from .depository_stats import depository_stats_cache
+from .autocomplete import PrefixIndex, author_autocomplete, customer_autocomplete
+from ..db import ASYNC_DATABASE_URL, application_name, async_session_scope
+from ..repositories.async_repository import AsyncBookRepository
+from ..repositories.orm_models import (Author, Book, BookCopy, Customer, Placement, CHANGE_CHANNEL, CHANGE_FEED_COLUMNS,
+                                       CHANGE_FEED_OPERATIONS, change_feed_trigger_name)
+from ..logger import app_logger
+
+CHANGE_FEED_RECONNECT_DELAY = float(os.getenv('change_feed_reconnect_delay', '1.0'))
+CHANGE_FEED_MAX_RECONNECT_DELAY = 30.0
+
+# Cached entities named by the id columns of each table's change events
+ENTITIES_BY_COLUMN = {
+    ('authors', 'id'): Author,
+    ('books', 'book_id'): Book,
+    ('book_author', 'book_id'): Book,
+    ('book_author', 'author_id'): Author,
+    ('book_copies', 'copy_id'): BookCopy,
+    ('book_copies', 'book_id'): Book,
+    ('book_copies', 'customer_id'): Customer,
+    ('customers', 'customer_id'): Customer,
+    ('placements', 'id'): Placement,
+}
+DEPOSITORY_TABLES = {'placements', 'book_copies'}
+CHANGE_FEED_TRIGGERS = {change_feed_trigger_name(table_name, operation)
+                        for table_name in CHANGE_FEED_COLUMNS for operation in CHANGE_FEED_OPERATIONS}
+
+
+class NameIndexFeed(NamedTuple):
+    index: PrefixIndex
+    id_column: str
+    find_names: Callable
+
+
+NAME_INDEX_FEEDS = {
+    'authors': NameIndexFeed(author_autocomplete, 'id', AsyncBookRepository.find_author_names),
+    'customers': NameIndexFeed(customer_autocomplete, 'customer_id', AsyncBookRepository.find_customer_names),
+}
+
+
+class ChangeEvent(NamedTuple):
+    table: str
+    operation: str
+    origin: str
+    ids: dict[str, list[int] | None]
+
+    @staticmethod
+    def parse(payload: str) -> 'ChangeEvent':
+        data = json.loads(payload)
+        table, operation, origin = data.pop('table'), data.pop('op'), data.pop('origin')
+        return ChangeEvent(table, operation, origin, data)
+
+
+def reset_caches() -> None:
+    dto_cache.clear()
+    depository_stats_cache.invalidate()
+    author_autocomplete.invalidate()
+    customer_autocomplete.invalidate()
+
+
+class ChangeFeedListener:
+    """Applies the change events of other processes to the caches and indexes of this one.
+
+    Triggers on the catalog tables NOTIFY CHANGE_CHANNEL once per statement with the ids of the changed rows. The
+    listener receives them over its own connection, skips the events of this process, which invalidated its caches
+    when it wrote, and drops what the others changed. Events sent while the connection is down are lost, so every
+    cache is reset when it drops and again when it is back.
+    """
+
+    def __init__(self, conninfo: str | None = None, origin: str | None = None) -> None:
+        self.conninfo = conninfo or make_url(ASYNC_DATABASE_URL).set(drivername="postgresql").render_as_string(
+            hide_password=False)
+        self.origin = origin or application_name()
+        self.events = 0
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run(), name="change-feed")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def run(self) -> None:
+        delay = CHANGE_FEED_RECONNECT_DELAY
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(self.conninfo, autocommit=True,
+                                                                 application_name=f"{self.origin}-feed") as connection:
+                    await connection.execute(f"LISTEN {CHANGE_CHANNEL}")
+                    await self.check_triggers(connection)
+                    reset_caches()
+                    delay = CHANGE_FEED_RECONNECT_DELAY
+                    app_logger.info(f"Change feed listening on {CHANGE_CHANNEL} as {self.origin}")
+                    async for notify in connection.notifies():
+                        await self.apply(notify.payload)
+            except psycopg.Error as e:
+                app_logger.warning(f"Change feed connection lost: {e}. Reconnecting in {delay}s")
+                reset_caches()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, CHANGE_FEED_MAX_RECONNECT_DELAY)
+
+    @staticmethod
+    async def check_triggers(connection: psycopg.AsyncConnection) -> set[str]:
+        """Logs an error naming the change feed triggers missing from the database, and returns them."""
+        cursor = await connection.execute("SELECT tgname FROM pg_trigger WHERE NOT tgisinternal AND tgname = ANY(%s)",
+                                          [list(CHANGE_FEED_TRIGGERS)])
+        missing = CHANGE_FEED_TRIGGERS - {row[0] for row in await cursor.fetchall()}
+        if missing:
+            app_logger.error(f"Change feed triggers {sorted(missing)} are missing, writes of other workers reach "
+                             f"this one's caches only when their TTL expires. Install them with bookz-upgrade-schema")
+        return missing
+
+    async def apply(self, payload: str) -> None:
+        try:
+            event = ChangeEvent.parse(payload)
+            if event.origin == self.origin:
+                return
+            self.events += 1
+            app_logger.debug(f"Change feed event {event.operation} on {event.table} from {event.origin}")
+            for column, ids in event.ids.items():
+                orm_class = ENTITIES_BY_COLUMN.get((event.table, column))
+                if orm_class is None:
+                    continue
+                if ids is None:
+                    dto_cache.clear()
+                else:
+                    dto_cache.invalidate(orm_class, ids)
+            if event.table in DEPOSITORY_TABLES:
+                depository_stats_cache.invalidate()
+            if event.table in NAME_INDEX_FEEDS:
+                await self.apply_names(event, NAME_INDEX_FEEDS[event.table])
+        except Exception as e:
+            app_logger.exception(f"Change feed event {payload} not applied, resetting caches: {e}")
+            reset_caches()
+
+    @staticmethod
+    async def apply_names(event: ChangeEvent, feed: NameIndexFeed) -> None:
+        ids = event.ids.get(feed.id_column)
+        if ids is None:
+            feed.index.invalidate()
+            return
+        if event.operation == 'DELETE':
+            feed.index.remove(ids)
+            return
+        if not feed.index.loaded:
+            return
+        async with async_session_scope() as session:
+            rows = await feed.find_names(AsyncBookRepository(session), ids)
+        for entry_id, first_name, last_name, middle_name in rows:
+            feed.index.add(entry_id, first_name, last_name, middle_name)
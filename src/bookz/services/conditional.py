@@ -0,0 +1,30 @@
+from ..exceptions.exceptions import NotModified
+
+
+def parse_entity_tags(header: str | None) -> set[str]:
+    """Tags of an If-None-Match header. Weak tags match by their opaque part, as RFC 9110 requires for GET."""
+    if not header:
+        return set()
+    return {tag.strip().removeprefix("W/") for tag in header.split(",") if tag.strip()}
+
+
+class ConditionalRead:
+    """If-None-Match of a read request and the ETag of the entity it found.
+
+    The service calls evaluate() with the tag of the loaded graph before the DTO is mapped. A matching tag raises
+    NotModified, so an unchanged entity costs the lookup query only.
+    """
+
+    def __init__(self, if_none_match: str | None = None) -> None:
+        self.tags = parse_entity_tags(if_none_match)
+        self.etag: str | None = None
+
+    def evaluate(self, etag: str) -> None:
+        self.etag = etag
+        if "*" in self.tags or etag in self.tags:
+            raise NotModified(f"Entity tag {etag} matches")
+
+    @property
+    def headers(self) -> dict[str, str]:
+        # no-cache lets clients store the body and revalidate it with If-None-Match on every read
+        return {"ETag": self.etag, "Cache-Control": "no-cache"} if self.etag else {}
@@ -0,0 +1,48 @@
+import os
+import threading
+import time
+from .dto_models import DepositoryDTO
+from ..logger import app_logger
+
+DEPOSITORY_STATS_TTL = float(os.getenv('depository_stats_ttl', '2.0'))
+
+
+class DepositoryStatsCache:
+    """Keeps the last depository statistics for a short TTL.
+
+    Write paths that change placement statuses call invalidate() after commit, so occupied and free counts
+    read through this cache are never older than the last local placement change.
+    """
+
+    def __init__(self, ttl: float = DEPOSITORY_STATS_TTL) -> None:
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._value: DepositoryDTO | None = None
+        self._expires_at = 0.0
+        self._generation = 0
+
+    def get(self) -> DepositoryDTO | None:
+        with self._lock:
+            if self._value is not None and time.monotonic() < self._expires_at:
+                return self._value
+            return None
+
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def set(self, value: DepositoryDTO, generation: int) -> None:
+        """Stores value unless an invalidation happened after it was read (generation no longer matches)."""
+        with self._lock:
+            if generation == self._generation:
+                self._value = value
+                self._expires_at = time.monotonic() + self.ttl
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._value = None
+        app_logger.debug("Depository stats cache invalidated")
+
+
+depository_stats_cache = DepositoryStatsCache()
@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Iterable, NamedTuple
+from pydantic import BaseModel
+from .dto_models import CacheStatsDTO
+from .conditional import ConditionalRead
+from ..mappers.mappers import Projection
+from ..logger import app_logger
+
+DTO_CACHE_SIZE = int(os.getenv('dto_cache_size', '2048'))
+DTO_CACHE_TTL = float(os.getenv('dto_cache_ttl', '30.0'))
+
+
+class CacheEntry(NamedTuple):
+    dto: BaseModel
+    etag: str
+    rows: frozenset[tuple[str, int]]
+    expires_at: float
+
+
+class DTOCache:
+    """Size bounded LRU cache of mapped entity DTOs with a TTL.
+
+    Every entry remembers the (class name, primary key) of the rows it was mapped from. Write paths call
+    invalidate() with the rows they changed after commit, which drops exactly the entries that read one of them.
+    A new row related to a cached entity is covered by invalidating the entity it was added to. Writes of other
+    processes arrive through the change feed, the TTL bounds staleness while its triggers are missing or it is down.
+    """
+
+    def __init__(self, capacity: int = DTO_CACHE_SIZE, ttl: float = DTO_CACHE_TTL) -> None:
+        self.capacity = capacity
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, CacheEntry] = OrderedDict()
+        self._keys_by_row: dict[tuple[str, int], set[Hashable]] = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _drop(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for row in entry.rows:
+            keys = self._keys_by_row.get(row)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_row[row]
+
+    def get(self, key: Hashable) -> CacheEntry | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if time.monotonic() >= entry.expires_at:
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def set(self, key: Hashable, dto: BaseModel, etag: str, rows: Iterable[tuple[str, int]], generation: int) -> None:
+        """Stores the DTO unless an invalidation happened after its rows were read (generation no longer matches)."""
+        if self.capacity <= 0:
+            return
+        rows = frozenset(rows)
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._drop(key)
+            self._entries[key] = CacheEntry(dto, etag, rows, time.monotonic() + self.ttl)
+            for row in rows:
+                self._keys_by_row.setdefault(row, set()).add(key)
+            while len(self._entries) > self.capacity:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, orm_class: type, ids: Iterable[int | None]) -> None:
+        class_name = orm_class.__name__
+        rows = [(class_name, entity_id) for entity_id in ids if entity_id is not None]
+        with self._lock:
+            self._generation += 1
+            dropped = 0
+            for row in rows:
+                for key in list(self._keys_by_row.get(row, ())):
+                    self._drop(key)
+                    dropped += 1
+            self.invalidations += dropped
+        if dropped:
+            app_logger.debug(f"DTO cache dropped {dropped} entries of changed {class_name} rows")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._keys_by_row.clear()
+        app_logger.debug("DTO cache cleared")
+
+    def stats(self) -> CacheStatsDTO:
+        with self._lock:
+            return CacheStatsDTO(size=len(self._entries), capacity=self.capacity, ttl_seconds=self.ttl,
+                                 hits=self.hits, misses=self.misses, evictions=self.evictions,
+                                 expirations=self.expirations, invalidations=self.invalidations)
+
+    def lookup(self, key: Hashable, conditional: ConditionalRead | None = None) -> BaseModel | None:
+        """Cached DTO of key. A conditional read is evaluated against the tag stored with it."""
+        entry = self.get(key)
+        if entry is None:
+            return None
+        if conditional is not None:
+            conditional.evaluate(entry.etag)
+        return entry.dto
+
+    def store(self, key: Hashable, projection: Projection, orm_instance, generation: int,
+              conditional: ConditionalRead | None = None) -> BaseModel:
+        """Maps orm_instance with the projection and caches the DTO with its tag and rows."""
+        etag = projection.etag(orm_instance)
+        if conditional is not None:
+            conditional.evaluate(etag)
+        dto = projection.convert(orm_instance)
+        self.set(key, dto, etag, projection.dependencies(orm_instance), generation)
+        return dto
+
+
+dto_cache = DTOCache()
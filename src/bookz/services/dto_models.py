@@ -4,6 +4,14 @@ from pydantic import Field, BaseModel, ConfigDict, EmailStr, computed_field
 
 from ..enums.enums import BookStatus, BookStatement
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+DEFAULT_AUTOCOMPLETE_LIMIT = 10
+MAX_AUTOCOMPLETE_LIMIT = 50
+MAX_BATCH_SIZE = 1000
+
 
 class AuthorDTO(BaseModel):
     id: int = Field(..., ge=0, description='Author id in database', examples=[1078, 204567])
@@ -40,7 +48,8 @@ class PlacementDTO(BaseModel):
 
 class BookCopyDTO(BaseModel):
     copy_id: int = Field(..., ge=0, examples=[2490, 8732])
-    book: BookDTO
+    book: BookDTO | None = Field(None, description='Book of the copy. null when the copy is listed under its book, '
+                                                   'in book and author responses')
     status: BookStatus = Field(BookStatus.UNKNOWN, examples=[BookStatus.AVAILABLE, BookStatus.BORROWED])
     statement: BookStatement = Field(BookStatement.NEW, examples=[BookStatement.NEW, BookStatement.REPAIR])
     placement: PlacementDTO | None = Field(None, examples=[{
@@ -63,6 +72,35 @@ class BookCopyDTO(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+class BookCopyPageDTO(BaseModel):
+    items: list[BookCopyDTO] = Field(default_factory=list)
+    next_cursor: int | None = Field(None, ge=0, description='copy_id to pass as cursor for the next page. '
+                                                            'None on the last page', examples=[2490, None])
+
+
+class IdBatchDTO(BaseModel):
+    ids: list[int] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE, examples=[[490, 762, 1033]])
+
+
+class BookCopyBatchDTO(BaseModel):
+    items: list[BookCopyDTO] = Field(default_factory=list, description='Found copies in the order of the request ids')
+    missing: list[int] = Field(default_factory=list, description='Requested ids without a copy', examples=[[762]])
+
+
+class BookCopyBorrowDTO(BaseModel):
+    customer_id: int = Field(..., ge=0, examples=[490])
+    copy_ids: list[int] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE, examples=[[8217, 8218]])
+
+
+class BookCopyReturnDTO(BaseModel):
+    copy_ids: list[int] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE, examples=[[8217, 8218]])
+
+
+class BookCopyErrorDTO(BaseModel):
+    copy_id: int = Field(..., ge=0, examples=[8217])
+    error: str
+
+
 class NewBookCopyDTO(BaseModel):
     book_id: int = Field(..., ge=0, examples=[490, 762])
     status: BookStatus = Field(BookStatus.UNKNOWN, examples=[BookStatus.AVAILABLE, BookStatus.BORROWED])
@@ -81,7 +119,7 @@ class BookDTO(BaseModel):
     pages: int | None = Field(None, ge=1, examples=[336])
     price: float | None = Field(None, ge=0, examples=[854.0])
     language: str | None = Field(None, min_length=2, max_length=3, examples=['en'])
-    authors: list['AuthorDTO'] = Field(None, examples=[{
+    authors: list['AuthorDTO'] | None = Field(None, examples=[{
         'id': 48,
         'full_name': {
             'first_name': "George",
@@ -108,6 +146,25 @@ class BookDTO(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class BookSearchHitDTO(BaseModel):
+    rank: float = Field(..., ge=0, description='Relevance of the book for the query, higher is better')
+    book: BookDTO
+
+
+class BookSearchPageDTO(BaseModel):
+    items: list[BookSearchHitDTO] = Field(default_factory=list)
+    next_offset: int | None = Field(None, ge=0, description='offset to pass for the next page. None on the last page')
+
+
+class IsbnBatchDTO(BaseModel):
+    isbns: list[str] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE, examples=[["978-01-41-036144"]])
+
+
+class BookBatchDTO(BaseModel):
+    items: list[BookDTO] = Field(default_factory=list, description='Found books in the order of the request isbns')
+    missing: list[str] = Field(default_factory=list, description='Requested isbns without a book')
+
+
 class NewBookDTO(BaseModel):
     title: str = Field(..., min_length=1, max_length=120)
     publisher: str = Field(..., min_length=1, max_length=80)
@@ -121,6 +178,29 @@ class NewBookDTO(BaseModel):
     copy_statement: BookStatement = Field(BookStatement.NEW)
 
 
+class BookImportRowDTO(NewBookDTO):
+    place_of_publication: str = Field(..., min_length=3, max_length=80)
+    published_year: int = Field(..., ge=1700, le=2100)
+    isbn: str = Field(..., min_length=10, max_length=20)
+    pages: int = Field(..., ge=1)
+    language: str | None = Field(None, min_length=2, max_length=3)
+
+
+class BookImportErrorDTO(BaseModel):
+    row: int = Field(..., ge=1, description='1-based number of the record in the feed, CSV header not counted')
+    isbn: str | None = Field(None)
+    error: str
+
+
+class BookImportReportDTO(BaseModel):
+    rows: int = Field(0, ge=0, description='Records read from the feed')
+    books: int = Field(0, ge=0, description='Books inserted')
+    copies: int = Field(0, ge=0, description='Book copies inserted and shelved')
+    authors: int = Field(0, ge=0, description='New authors inserted')
+    errors: list[BookImportErrorDTO] = Field(default_factory=list, description='Rejected records, not imported')
+    seconds: float = Field(0.0, ge=0)
+
+
 class CustomerDTO(BaseModel):
     customer_id: int = Field(..., ge=0, examples=[490, 762])
     full_name: FullNameDTO = Field(...)
@@ -132,6 +212,12 @@ class CustomerDTO(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class CustomerBatchDTO(BaseModel):
+    items: list[CustomerDTO] = Field(default_factory=list,
+                                     description='Found customers in the order of the request ids')
+    missing: list[int] = Field(default_factory=list, description='Requested ids without a customer')
+
+
 class NewCustomerDTO(BaseModel):
     full_name: FullNameDTO = Field(...)
     email: EmailStr
@@ -146,6 +232,11 @@ class FullNameDTO(BaseModel):
     def __str__(self) -> str:
         return f"{self.last_name.upper()} {self.first_name} {self.middle_name if self.middle_name else ''}"
 
+class NameSuggestionDTO(BaseModel):
+    id: int = Field(..., ge=0, description='Author id or customer id', examples=[48])
+    full_name: FullNameDTO
+
+
 class DepositoryDTO(BaseModel):
     max_lines: str = Field(..., min_length=1, max_length=1)
     max_columns: int = Field(..., ge=1)
@@ -156,6 +247,17 @@ class DepositoryDTO(BaseModel):
     free_places: int | None = Field(None, ge=0)
 
 
+class CacheStatsDTO(BaseModel):
+    size: int = Field(..., ge=0)
+    capacity: int = Field(..., ge=0)
+    ttl_seconds: float = Field(..., ge=0)
+    hits: int = Field(..., ge=0)
+    misses: int = Field(..., ge=0)
+    evictions: int = Field(..., ge=0, description='Entries dropped to keep the cache within its capacity')
+    expirations: int = Field(..., ge=0)
+    invalidations: int = Field(..., ge=0, description='Entries dropped because a row they were mapped from changed')
+
+
 class NewDepositoryDTO(BaseModel):
     lines: int = Field(6, ge=1, le=26, examples=[5])
     columns: int = Field(4, ge=1, examples=[6])
@@ -165,6 +267,8 @@ class NewDepositoryDTO(BaseModel):
     max_books_copies_per_book: int = Field(5, ge=1, examples=[20])
     authors_number: int = Field(50, ge=0, examples=[500])
     customers_number: int = Field(100, ge=0, examples=[1000])
+    seed: int | None = Field(None, ge=0, description='Seed of fake data generation. Random when not given',
+                             examples=[42])
 
 
 class StringDTO(BaseModel):
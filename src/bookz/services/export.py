@@ -0,0 +1,72 @@
+import csv
+import io
+import json
+import os
+import time
+from typing import AsyncIterator, Callable
+from pydantic import BaseModel
+from ..db import async_session_scope
+from ..enums.enums import ExportFormat
+from ..mappers.mappers import BookMapper, BookCopyMapper, CustomerMapper
+from ..repositories.async_repository import AsyncBookRepository
+from ..logger import app_logger
+
+EXPORT_BATCH_SIZE = int(os.getenv('export_batch_size', '1000'))
+
+MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv",
+}
+
+
+class CatalogExporter:
+    """Streams the catalog out of server-side cursors.
+
+    Only one batch of rows is held in memory at a time, so memory stays flat whatever the table size. The export
+    opens its own session because a StreamingResponse body runs after the request dependencies are closed.
+    """
+
+    def __init__(self, file_format: ExportFormat, batch_size: int = EXPORT_BATCH_SIZE):
+        self.file_format = file_format
+        self.batch_size = batch_size
+
+    @property
+    def media_type(self) -> str:
+        return MEDIA_TYPES[self.file_format]
+
+    def books(self) -> AsyncIterator[bytes]:
+        return self._export("books", AsyncBookRepository.stream_books, BookMapper.book_export_converter)
+
+    def book_copies(self) -> AsyncIterator[bytes]:
+        return self._export("book copies", AsyncBookRepository.stream_book_copies,
+                            BookCopyMapper.book_copy_export_converter)
+
+    def customers(self) -> AsyncIterator[bytes]:
+        return self._export("customers", AsyncBookRepository.stream_customers,
+                            CustomerMapper.customer_export_converter)
+
+    async def _export(self, name: str, stream: Callable, convert: Callable) -> AsyncIterator[bytes]:
+        app_logger.info(f"Start {name} export in {self.file_format.value} format, batch size {self.batch_size}")
+        rows = 0
+        start = time.perf_counter()
+        async with async_session_scope() as session:
+            result = await stream(AsyncBookRepository(session), self.batch_size)
+            async for partition in result.partitions():
+                yield self._encode([convert(orm_instance) for orm_instance in partition], header=rows == 0)
+                rows += len(partition)
+        seconds = time.perf_counter() - start
+        app_logger.info(f"Exported {rows} {name} in {seconds:.3f}s "
+                        f"({rows / seconds if seconds else 0.0:.0f} rows/s)")
+
+    def _encode(self, dtos: list[BaseModel], header: bool) -> bytes:
+        if self.file_format == ExportFormat.NDJSON:
+            return b"".join(dto.model_dump_json(exclude_unset=True).encode() + b"\n" for dto in dtos)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for i, dto in enumerate(dtos):
+            record = dto.model_dump(mode="json", exclude_unset=True)
+            if header and i == 0:
+                writer.writerow(record.keys())
+            writer.writerow(json.dumps(value, ensure_ascii=False) if isinstance(value, (dict, list)) else value
+                            for value in record.values())
+        return buffer.getvalue().encode()
@@ -2,16 +2,32 @@ from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from psycopg2.errors import UniqueViolation
 from .dto_models import (DepositoryDTO, AuthorDTO, NewAuthorDTO, FullNameDTO, BookDTO, NewBookDTO, BookCopyDTO,
-                         NewBookCopyDTO, CustomerDTO, StringDTO, NewCustomerDTO)
+                         NewBookCopyDTO, BookCopyPageDTO, CustomerDTO, StringDTO, NewCustomerDTO,
+                         BookSearchHitDTO, BookSearchPageDTO, NameSuggestionDTO, BookBatchDTO,
+                         BookCopyBatchDTO, CustomerBatchDTO, DEFAULT_PAGE_SIZE,
+                         DEFAULT_SEARCH_LIMIT, DEFAULT_AUTOCOMPLETE_LIMIT)
 from ..enums.enums import BookStatus, PlacementStatus, BookStatement
 from ..repositories.repository import BookRepository
+from ..repositories.orm_models import Author, Book, BookCopy, Customer
 from ..mappers.mappers import AuthorMapper, FullNameMapper, BookMapper, BookCopyMapper, CustomerMapper, PhoneMapper
 from ..exceptions.exceptions import *
 from ..validators.validators import PhoneValidator, EmailValidator
+from .depository_stats import depository_stats_cache
+from .autocomplete import author_autocomplete, customer_autocomplete
+from .conditional import ConditionalRead
+from .dto_cache import dto_cache
+from ..query_audit import audited
 from ..logger import app_logger
 
 
+@audited
 class BookService:
+    """Blocking twin of AsyncBookService for scripts and a Python shell.
+
+    As the routers do per request, give every call a new session of db.get_session(): the writes begin their own
+    transaction, which fails on a session a previous read left in one. Keep the two in step: every method runs the
+    same logic as its async counterpart.
+    """
 
     def __init__(self, session: Session) -> None:
         self.session = session
@@ -19,41 +35,59 @@ class BookService:
 
     def depository_status(self) -> DepositoryDTO:
         app_logger.info("Calling depository_status function")
-        depo = DepositoryDTO(
-            max_lines=self.repo.get_number_of_depository_lines(),
-            max_columns=self.repo.get_number_of_depository_columns_in_line(),
-            max_shelves=self.repo.get_number_of_depository_shelves_in_column(),
-            max_positions=self.repo.get_number_of_depository_positions_in_shelve(),
-            total_places=self.repo.get_number_of_depository_placements(),
-            books_in_storage=self.repo.get_number_books_in_depository(),
-            free_places=self.repo.get_number_of_free_places()
-        )
+        depo = depository_stats_cache.get()
+        if depo:
+            return depo
+        generation = depository_stats_cache.generation()
+        depo = DepositoryDTO(**self.repo.get_depository_stats()._asdict())
+        depository_stats_cache.set(depo, generation)
         return depo
 
+    def load_autocomplete_indexes(self) -> None:
+        for index, find_names in ((author_autocomplete, self.repo.find_author_names),
+                                  (customer_autocomplete, self.repo.find_customer_names)):
+            generation = index.generation()
+            index.load(find_names(), generation)
+
     # Author functions
-    def find_author_by_id(self, author_id: int) -> AuthorDTO:
+    def find_author_by_id(self, author_id: int, fields: str | None = None, depth: int | None = None,
+                          conditional: ConditionalRead | None = None) -> AuthorDTO:
         app_logger.info(f"Calling find_author_by_id function with parameter: {author_id}")
-        author = self.repo.find_author_by_id(author_id)
+        key = ('author', author_id, fields, depth)
+        cached = dto_cache.lookup(key, conditional)
+        if cached is not None:
+            return cached
+        generation = dto_cache.generation()
+        projection = AuthorMapper.projection(fields, depth)
+        author = self.repo.find_author_by_id(author_id, loader_options=projection.loader_options)
         if not author:
             app_logger.warning(f"Author with id {author_id} not found")
             raise AuthorNotFound(f"Author with id {author_id} not found")
-        app_logger.info(f"Author:{author}, books: {author.books}, {author.books[0].copies}")
-        return AuthorMapper.orm_to_dto(author)
+        return dto_cache.store(key, projection, author, generation, conditional)
 
     def find_author_by_full_name(self, author: FullNameDTO) -> AuthorDTO:
         app_logger.info(f"Calling find_author_by_full_name function with parameter: {author}")
         find_author = self.repo.find_author(author=FullNameMapper.dto_to_dict(author))
-        if not author:
+        if not find_author:
             app_logger.warning(f"Author with full name \"{author}\" not found")
             raise AuthorNotFound(f"Author with full name {author} not found")
         return AuthorMapper.orm_to_dto(find_author)
 
+    def autocomplete_authors(self, query: str,
+                             limit: int = DEFAULT_AUTOCOMPLETE_LIMIT) -> list[NameSuggestionDTO]:
+        app_logger.info(f"Calling autocomplete_authors function with parameters: query: {query}, limit: {limit}")
+        if not author_autocomplete.loaded:
+            generation = author_autocomplete.generation()
+            author_autocomplete.load(self.repo.find_author_names(), generation)
+        return author_autocomplete.suggest(query, limit)
+
     def create_author(self, author: NewAuthorDTO) -> AuthorDTO:
         app_logger.info(f"Calling create_author function with parameter: {author}")
         try:
             with self.session.begin():
-                author = self.repo.create_author(AuthorMapper.new_dto_to_dict(author))
-            return AuthorMapper.orm_to_dto(author)
+                new_author = self.repo.create_author(AuthorMapper.new_dto_to_dict(author))
+            author_autocomplete.add(new_author.id, new_author.first_name, new_author.last_name, new_author.middle_name)
+            return AuthorMapper.orm_to_dto(new_author)
         except IntegrityError as e:
             orig = e.orig
             if isinstance(orig, UniqueViolation) and orig.diag.constraint_name == 'uq_author_full_name':
@@ -66,29 +100,36 @@ class BookService:
         app_logger.info(f"Calling update_author function with parameters: {author}")
         try:
             with self.session.begin():
-                author_by_id = self.repo.find_author_by_id(author.id)
+                author_by_id = self.repo.find_author_by_id(author.id, by_update=True)
                 if not author_by_id:
                     raise AuthorNotFound(f"Author with id {author.id} not found")
-                author = self.repo.update_author(AuthorMapper.dto_to_dict(author))
-            return AuthorMapper.orm_to_dto(author)
+                updated_author = self.repo.update_author(AuthorMapper.dto_to_dict(author))
+            author_autocomplete.add(updated_author.id, updated_author.first_name, updated_author.last_name,
+                                    updated_author.middle_name)
+            dto_cache.invalidate(Author, [updated_author.id])
+            return AuthorMapper.orm_to_dto(updated_author)
         except IntegrityError as e:
             orig = e.orig
             if isinstance(orig, UniqueViolation) and orig.diag.constraint_name == 'uq_author_full_name':
                 app_logger.warning(f"Author with full name: {str(author.full_name)} already exists in database")
                 raise AuthorFullNameAlreadyExist(f"Author with fullname {str(author.full_name)} is "
                                                  f"already exist in database") from e
+            else: raise e
 
     def delete_author_by_id(self, author_id: int) -> AuthorDTO:
         app_logger.info(f"Calling delete_author_by_id function with parameter: {author_id}")
-        book_author = self.repo.find_books_by_author_id(author_id)
-        if book_author:
-            app_logger.warning(f"Author with id {author_id} not found")
-            raise BookPresentInDatabase(f"{len(book_author)} book(s) is present in repository. Delete author books "
-                                        f"before deleting the author")
-        author = self.repo.delete_author_by_id(author_id)
-        if not author:
-            app_logger.warning(f"Author with id {author_id} not found")
-            raise AuthorNotFound(f"Author with id {author_id} not found")
+        with self.session.begin():
+            book_author = self.repo.find_books_by_author_id(author_id)
+            if book_author:
+                app_logger.warning(f"Author with id {author_id} has {len(book_author)} book(s) in repository")
+                raise BookPresentInDatabase(f"{len(book_author)} book(s) is present in repository. Delete author "
+                                            f"books before deleting the author")
+            author = self.repo.delete_author_by_id(author_id)
+            if not author:
+                app_logger.warning(f"Author with id {author_id} not found")
+                raise AuthorNotFound(f"Author with id {author_id} not found")
+        author_autocomplete.remove([author.id])
+        dto_cache.invalidate(Author, [author.id])
         return AuthorMapper.orm_to_dto(author)
 
     def delete_authors_without_book(self) -> list[AuthorDTO]:
@@ -99,62 +140,90 @@ class BookService:
                 app_logger.info(f"Author without books not found")
                 raise AuthorNotFound(f"Author without books not found")
             authors = self.repo.delete_authors_by_ids(authors)
-            authorDTOs: list[AuthorDTO] = []
-            for author in authors:
-                authorDTOs.append(AuthorMapper.orm_to_dto(author))
-        return authorDTOs
+        author_autocomplete.remove([author.id for author in authors])
+        dto_cache.invalidate(Author, [author.id for author in authors])
+        return [AuthorMapper.orm_to_dto(author) for author in authors]
 
     # Book functions
-    def find_book_by_id(self, book_id: int) -> BookDTO:
+    def find_book_by_id(self, book_id: int, fields: str | None = None, depth: int | None = None,
+                        conditional: ConditionalRead | None = None) -> BookDTO:
         app_logger.info(f"Calling find_book_by_id function with parameter: {book_id}")
-        book = self.repo.find_book_by_id(book_id)
+        key = ('book', book_id, fields, depth)
+        cached = dto_cache.lookup(key, conditional)
+        if cached is not None:
+            return cached
+        generation = dto_cache.generation()
+        projection = BookMapper.projection(fields, depth)
+        book = self.repo.find_book_by_id(book_id, loader_options=projection.loader_options)
         if not book:
             app_logger.warning(f"Book with id {book_id} not found")
             raise BookNotFound(f"Book with id {book_id} not found")
-        return BookMapper.orm_to_dto(book)
+        return dto_cache.store(key, projection, book, generation, conditional)
 
-    def find_book_by_isbn(self, isbn: str) -> BookDTO:
+    def find_book_by_isbn(self, isbn: str, fields: str | None = None, depth: int | None = None,
+                          conditional: ConditionalRead | None = None) -> BookDTO:
         app_logger.info(f"Calling find_book_by_isbn function with parameter: {isbn}")
-        book = self.repo.find_book_by_isbn(isbn)
+        key = ('book_isbn', isbn, fields, depth)
+        cached = dto_cache.lookup(key, conditional)
+        if cached is not None:
+            return cached
+        generation = dto_cache.generation()
+        projection = BookMapper.projection(fields, depth)
+        book = self.repo.find_book_by_isbn(isbn, loader_options=projection.loader_options)
         if not book:
             app_logger.warning(f"Book with isbn {isbn} not found")
             raise BookNotFound(f"Book with isbn {isbn} not found")
-        return BookMapper.orm_to_dto(book)
+        return dto_cache.store(key, projection, book, generation, conditional)
+
+    def find_books_by_isbns(self, isbns: list[str]) -> BookBatchDTO:
+        isbns = list(dict.fromkeys(isbns))
+        app_logger.info(f"Calling find_books_by_isbns function with {len(isbns)} isbn(s)")
+        books = {book.isbn: book for book in self.repo.find_books_by_isbns(isbns)}
+        return BookBatchDTO(items=[BookMapper.orm_to_dto(books[isbn]) for isbn in isbns if isbn in books],
+                            missing=[isbn for isbn in isbns if isbn not in books])
+
+    def search_books(self, query: str, limit: int = DEFAULT_SEARCH_LIMIT, offset: int = 0) -> BookSearchPageDTO:
+        app_logger.info(f"Calling search_books function with parameters: query: {query}, limit: {limit}, "
+                        f"offset: {offset}")
+        rows = self.repo.search_books(query, limit=limit + 1, offset=offset)
+        hits = [BookSearchHitDTO.model_construct(rank=rank, book=BookMapper.book_search_converter(book))
+                for book, rank in rows[:limit]]
+        return BookSearchPageDTO(items=hits, next_offset=offset + limit if len(rows) > limit else None)
 
     def create_book(self, book: NewBookDTO) -> BookDTO:
         app_logger.info(f"Calling create_book function with parameter: {book}")
-        present_book = self.find_book_by_isbn(book.isbn)
-        if present_book:
-            app_logger.warning(f"Book not created. Book with isbn {book.isbn} present in database")
-            raise BookPresentInDatabase(f"Book with isbn {book.isbn} present in database")
         try:
             with self.session.begin():
+                if self.repo.find_book_by_isbn(book.isbn):
+                    app_logger.warning(f"Book not created. Book with isbn {book.isbn} present in database")
+                    raise BookPresentInDatabase(f"Book with isbn {book.isbn} present in database")
                 new_book = self.repo.create_book(BookMapper.new_dto_to_dict(book))
-                for author in book.authors:
-                    ath = self.repo.find_author(AuthorMapper.new_dto_to_dict(author))
+                author_ids: list[int] = []
+                for author in book.authors or []:
+                    author_dict = AuthorMapper.new_dto_to_dict(author)
+                    ath = self.repo.find_author(author_dict)
                     if not ath:
-                        ath = self.repo.create_author(AuthorMapper.new_dto_to_dict(author))
+                        ath = self.repo.create_author(author_dict)
                     self.repo.create_author_book_rel(book_id=new_book.book_id, author_id=ath.id)  #type: ignore
+                    author_ids.append(ath.id)
                 available_places = self.repo.find_free_place(book.new_copies)
-                places = available_places.copy()
                 if len(available_places) < book.new_copies:
-                    raise StorageSpaceIsNotSufficient(f"Free place for {book.new_copies} of {book.title} is`t available ")
-                new_book_copies: list[dict] = []
-                for _ in book.copies:
-                    place = available_places.pop()
-                    new_book_copies.append(BookCopyMapper.new_dto_to_dict(
-                        NewBookCopyDTO(
-                            book_id=book.id,
-                            status=BookStatus.AVAILABLE,
-                            statement=book.copy_statement,
-                            placement_id=place)))
+                    raise StorageSpaceIsNotSufficient(f"Free place for {book.new_copies} of {book.title} is`t "
+                                                      f"available ")
+                new_book_copies: list[dict] = [{"book_id": new_book.book_id,
+                                                "status": BookStatus.AVAILABLE,
+                                                "statement": book.copy_statement,
+                                                "placement_id": place} for place in available_places]
                 self.repo.create_book_copies(new_book_copies)
-                self.repo.change_places_status(place_ids=places, status=PlacementStatus.OCCUPIED)
+                self.repo.change_places_status(place_ids=available_places, status=PlacementStatus.OCCUPIED)
         except IntegrityError as e:
             orig = e.orig
-            if isinstance(orig, IntegrityError) and orig.diag.constraint_name == 'uq_isbn':
+            if isinstance(orig, UniqueViolation) and orig.diag.constraint_name == 'uq_isbn':
                 app_logger.warning(f"Book with isbn {book.isbn} present in database")
                 raise BookPresentInDatabase(f"Book with isbn {book.isbn} present in database") from e
+            else: raise e
+        depository_stats_cache.invalidate()
+        dto_cache.invalidate(Author, author_ids)
         return self.find_book_by_isbn(book.isbn)
 
     def delete_book(self, book_id: int) -> BookDTO:
@@ -168,69 +237,87 @@ class BookService:
             borrowed_copies_ids: list[int] = []
             for copy in book.book_copies:
                 if copy.status == BookStatus.BORROWED:
-                    borrowed_copies_ids.append(copy.id)
-                if copy.status == BookStatus.AVAILABLE:
+                    borrowed_copies_ids.append(copy.copy_id)
+                if copy.status == BookStatus.AVAILABLE and copy.placement_id:
                     place_ids.append(copy.placement_id)
-                copy_ids.append(copy.id)
+                copy_ids.append(copy.copy_id)
             if borrowed_copies_ids:
                 app_logger.warning(f"Attempt to delete book {book.title} with isbn {book.isbn} whose copies "
                                    f"{borrowed_copies_ids} are borrowed")
                 raise BookCopyBorrowed(f"Book copies {borrowed_copies_ids}  of book '{book.title}' is borrowed. "
                                        f"Change its status before delete")
+            deleted_book = BookMapper.orm_to_dto(book)
             self.repo.delete_book_copies_by_ids(ids=copy_ids)
-            self.repo.change_places_status(place_ids = place_ids, status=PlacementStatus.FREE)
+            self.repo.change_places_status(place_ids=place_ids, status=PlacementStatus.FREE)
             self.repo.delete_book_by_id(book.book_id) #type: ignore
-        return book
+        depository_stats_cache.invalidate()
+        dto_cache.invalidate(Book, [book_id])
+        dto_cache.invalidate(BookCopy, copy_ids)
+        return deleted_book
 
     def delete_books_without_copies(self) -> list[BookDTO]:
         with self.session.begin():
             books = self.repo.find_book_without_copy(for_update=True)
             if not books:
                 raise BookNotFound(f"Books without copy found")
-            book_ids: list[int] = []
-            for book in books:
-                book_ids.append(book.book_id)  #type: ignore
-            books = self.repo.delete_books(book_ids=book_ids)
-        deleted_books: list[BookDTO] = []
-        for book in books:
-            deleted_books.append(BookMapper.orm_to_dto(book))
+            deleted_books = [BookMapper.orm_to_dto(book) for book in books]
+            self.repo.delete_books(book_ids=[book.book_id for book in books])  #type: ignore
+        dto_cache.invalidate(Book, [book.book_id for book in deleted_books])
         return deleted_books
 
     # Book copies functions
-    def find_book_copy(self, copy_id: int) -> BookCopyDTO:
+    def find_book_copy(self, copy_id: int, fields: str | None = None, depth: int | None = None,
+                       conditional: ConditionalRead | None = None) -> BookCopyDTO:
         app_logger.info(f"Calling find_book_copy function with parameter: {copy_id}")
-        book_copy = self.repo.find_book_copy(copy_id)
+        key = ('book_copy', copy_id, fields, depth)
+        cached = dto_cache.lookup(key, conditional)
+        if cached is not None:
+            return cached
+        generation = dto_cache.generation()
+        projection = BookCopyMapper.projection(fields, depth)
+        book_copy = self.repo.find_book_copy(copy_id, loader_options=projection.loader_options)
         if not book_copy:
             app_logger.warning(f"Book with id {copy_id} not found")
             raise BookCopyNotFound(f"Book copy with id {copy_id} not found")
-        return BookCopyMapper.orm_to_dto(book_copy)
-
-    def find_book_copies_for_status(self, status: BookStatus) -> list[BookCopyDTO]:
-        app_logger.info(f"Calling find_book_copies_for_status function with parameter: {status}")
-        book_copies = self.repo.find_book_copies_for_status(status)
-        if not book_copies:
+        return dto_cache.store(key, projection, book_copy, generation, conditional)
+
+    def find_book_copies_by_ids(self, ids: list[int]) -> BookCopyBatchDTO:
+        ids = list(dict.fromkeys(ids))
+        app_logger.info(f"Calling find_book_copies_by_ids function with {len(ids)} id(s)")
+        copies = {copy.copy_id: copy for copy in self.repo.find_book_copies_by_ids(ids)}
+        return BookCopyBatchDTO(items=[BookCopyMapper.orm_to_dto(copies[i], trusted=True) for i in ids if i in copies],
+                                missing=[i for i in ids if i not in copies])
+
+    def find_book_copies_for_status(self, status: BookStatus, limit: int = DEFAULT_PAGE_SIZE,
+                                    cursor: int | None = None) -> BookCopyPageDTO:
+        app_logger.info(f"Calling find_book_copies_for_status function with parameters: status: {status}, "
+                        f"limit: {limit}, cursor: {cursor}")
+        book_copies = self.repo.find_book_copies_for_status(status, limit=limit + 1, after=cursor)
+        if not book_copies and cursor is None:
             app_logger.warning(f"Book copies with status: {status} not found")
             raise BookCopyNotFound(f"Book copy(ies) with status {status} not found")
-        copies = []
-        for book_copy in book_copies:
-            copies.append(BookCopyMapper.orm_to_dto(book_copy))
-        return copies
-
-    def find_book_copies_for_statement(self, statement: BookStatement) -> list[BookCopyDTO]:
-        app_logger.info(f"Calling find_book_copies_for_statement function with parameter: {statement}")
-        book_copies = self.repo.find_book_copies_for_statement(statement)
-        if not book_copies:
+        next_cursor = book_copies[limit - 1].copy_id if len(book_copies) > limit else None
+        return BookCopyPageDTO(items=[BookCopyMapper.orm_to_dto(book_copy, trusted=True)
+                                      for book_copy in book_copies[:limit]],
+                               next_cursor=next_cursor)
+
+    def find_book_copies_for_statement(self, statement: BookStatement, limit: int = DEFAULT_PAGE_SIZE,
+                                       cursor: int | None = None) -> BookCopyPageDTO:
+        app_logger.info(f"Calling find_book_copies_for_statement function with parameters: statement: {statement}, "
+                        f"limit: {limit}, cursor: {cursor}")
+        book_copies = self.repo.find_book_copies_for_statement(statement, limit=limit + 1, after=cursor)
+        if not book_copies and cursor is None:
             app_logger.warning(f"Book copies with statement: {statement} not found")
             raise BookCopyNotFound(f"Book copy(ies) with statement {statement} not found")
-        copies = []
-        for book_copy in book_copies:
-            copies.append(BookCopyMapper.orm_to_dto(book_copy))
-        return copies
+        next_cursor = book_copies[limit - 1].copy_id if len(book_copies) > limit else None
+        return BookCopyPageDTO(items=[BookCopyMapper.orm_to_dto(book_copy, trusted=True)
+                                      for book_copy in book_copies[:limit]],
+                               next_cursor=next_cursor)
 
     def create_book_copy(self, book_copy: NewBookCopyDTO) -> BookCopyDTO:
         app_logger.info(f"Calling create_book_copy function with parameter: {book_copy}")
         with self.session.begin():
-            place = self.repo.find_free_place(1)
+            place = self.repo.find_free_place(1, book_id=book_copy.book_id)
             if not place:
                 app_logger.warning("Free place in depository for new book copy not found")
                 raise StorageSpaceIsNotSufficient(f"Free place in depository for new book copy is`t available ")
@@ -238,48 +325,130 @@ class BookService:
             if not book:
                 app_logger.warning(f"Book with book_id: {book_copy.book_id} for this book copy not found")
                 raise BookNotFound(f"Book for this book copy not found. Add first the book")
-            book_copy.placement = place
-            book_copy = self.repo.create_book_copy(BookCopyMapper.new_dto_to_dict(book_copy))
-            self.repo.change_place_status(place_id=place.pop(), status=PlacementStatus.OCCUPIED)
-            book_copy = self.repo.find_book_by_id(book_copy.copy_id)  #type: ignore
-        return BookCopyMapper.orm_to_dto(book_copy)
-
-    def change_book_copy_status(self, copy_id: int, status: BookStatus, customer_id: int | None = None) -> BookCopyDTO:
+            new_copy = book_copy.model_dump(exclude_unset=True)
+            new_copy.update(book_id=book_copy.book_id, status=BookStatus.AVAILABLE, placement_id=place[0])
+            new_book_copy = self.repo.create_book_copy(new_copy)
+            self.repo.change_place_status(place_id=place[0], status=PlacementStatus.OCCUPIED)
+            author_ids = self.repo.find_book_author_ids([book_copy.book_id])
+        depository_stats_cache.invalidate()
+        self._invalidate_book_copies([new_book_copy.copy_id], [book_copy.book_id], author_ids)
+        return BookCopyMapper.orm_to_dto(new_book_copy, trusted=True)
+
+    def change_book_copy_status(self, copy_id: int, status: BookStatus,
+                                customer_id: int | None = None) -> BookCopyDTO:
         app_logger.info(f"Calling change_book_copy_status function with parameter: copy_id: {copy_id}, "
                         f"status: {status}, customer_id: {customer_id}")
         if status==BookStatus.BORROWED and not customer_id:
             app_logger.warning(f"Bad function parameters. For status BORROWED customer_id must be not NULL")
             raise CustomerMustBeGiven(f"When book copy is borrowed, customer id is required")
-        book_copy = self.repo.find_book_copy(copy_id, for_update=True)
-        if not book_copy:
-            app_logger.warning(f"Book with copy_id: {copy_id} not found")
-            raise BookCopyNotFound(f"Book copy with id {copy_id} not found")
         with self.session.begin():
+            book_copy = self.repo.find_book_copy(copy_id, for_update=True)
+            if not book_copy:
+                app_logger.warning(f"Book with copy_id: {copy_id} not found")
+                raise BookCopyNotFound(f"Book copy with id {copy_id} not found")
+            previous_customer_id = book_copy.customer_id
             if status == BookStatus.AVAILABLE:
-                place = self.repo.find_free_place(1)
+                place = self.repo.find_free_place(1, book_id=book_copy.book_id)
                 if not place:
                     app_logger.warning("Free place in depository for new book copy is`t available ")
                     raise StorageSpaceIsNotSufficient(f"Free place in depository for book copy is`t available ")
-                self.repo.change_place_status(place_id=place.pop(), status=PlacementStatus.OCCUPIED)
-                book_copy = self.repo.update_book_copy(copy_id=copy_id, book_copy={"status": status, "customer": None})
-                return BookCopyMapper.orm_to_dto(book_copy)
+                self.repo.change_place_status(place_id=place[0], status=PlacementStatus.OCCUPIED)
+                book_copy = self.repo.update_book_copy(copy_id=copy_id,
+                                                       book_copy={"status": status, "customer_id": None,
+                                                                        "placement_id": place[0]})
             elif status == BookStatus.BORROWED:
                 customer = self.repo.find_customer_by_id(customer_id)
                 if not customer:
                     app_logger.warning(f"Customer with id {customer_id} not found")
                     raise CustomerNotFound(f"Customer with id {customer_id} not found")
-                book_copy = self.repo.update_book_copy(copy_id=copy_id, book_copy={"status": status,
-                                                                                   "customer": customer_id})
-                return BookCopyMapper.orm_to_dto(book_copy)
+                if book_copy.placement_id:
+                    self.repo.change_place_status(place_id=book_copy.placement_id, status=PlacementStatus.FREE)
+                book_copy = self.repo.update_book_copy(copy_id=copy_id,
+                                                       book_copy={"status": status, "customer_id": customer_id,
+                                                                        "placement_id": None})
             else:
-                book_copy = self.repo.update_book_copy(copy_id=copy_id, book_copy={"status": status, "customer": None})
-        return BookCopyMapper.orm_to_dto(book_copy)
+                book_copy = self.repo.update_book_copy(copy_id=copy_id,
+                                                       book_copy={"status": status, "customer_id": None})
+            author_ids = self.repo.find_book_author_ids([book_copy.book_id])
+        depository_stats_cache.invalidate()
+        self._invalidate_book_copies([copy_id], [book_copy.book_id], author_ids)
+        dto_cache.invalidate(Customer, [customer_id, previous_customer_id])
+        return BookCopyMapper.orm_to_dto(book_copy, trusted=True)
+
+    def borrow_book_copies(self, copy_ids: list[int], customer_id: int) -> list[BookCopyDTO]:
+        app_logger.info(f"Calling borrow_book_copies function with parameters: copy_ids: {copy_ids}, "
+                        f"customer_id: {customer_id}")
+        copy_ids = list(dict.fromkeys(copy_ids))
+        with self.session.begin():
+            if not self.repo.find_customer_by_id(customer_id):
+                app_logger.warning(f"Customer with id {customer_id} not found")
+                raise CustomerNotFound(f"Customer with id {customer_id} not found")
+            book_copies = self.repo.find_book_copies_by_ids(copy_ids, for_update=True)
+            self._check_book_copies_status(copy_ids, book_copies, BookStatus.AVAILABLE)
+            place_ids = [book_copy.placement_id for book_copy in book_copies if book_copy.placement_id]
+            if place_ids:
+                self.repo.change_places_status(place_ids=place_ids, status=PlacementStatus.FREE)
+            book_copies = self.repo.update_book_copies(
+                copy_ids, {"status": BookStatus.BORROWED, "customer_id": customer_id, "placement_id": None})
+            book_ids = list({book_copy.book_id for book_copy in book_copies})
+            author_ids = self.repo.find_book_author_ids(book_ids)
+        depository_stats_cache.invalidate()
+        self._invalidate_book_copies(copy_ids, book_ids, author_ids)
+        dto_cache.invalidate(Customer, [customer_id])
+        return self._book_copies_in_order(copy_ids, book_copies)
+
+    def return_book_copies(self, copy_ids: list[int]) -> list[BookCopyDTO]:
+        app_logger.info(f"Calling return_book_copies function with parameter: copy_ids: {copy_ids}")
+        copy_ids = list(dict.fromkeys(copy_ids))
+        with self.session.begin():
+            book_copies = self.repo.find_book_copies_by_ids(copy_ids, for_update=True)
+            self._check_book_copies_status(copy_ids, book_copies, BookStatus.BORROWED)
+            customer_ids = list({book_copy.customer_id for book_copy in book_copies})
+            places = self.repo.find_free_place(len(copy_ids))
+            if len(places) < len(copy_ids):
+                app_logger.warning(f"Free place for {len(copy_ids)} returned book copies is`t available")
+                raise StorageSpaceIsNotSufficient(f"Free place for {len(copy_ids)} book copies is`t available")
+            self.repo.change_places_status(place_ids=places, status=PlacementStatus.OCCUPIED)
+            book_copies = self.repo.place_book_copies(
+                dict(zip(copy_ids, places)), {"status": BookStatus.AVAILABLE, "customer_id": None})
+            book_ids = list({book_copy.book_id for book_copy in book_copies})
+            author_ids = self.repo.find_book_author_ids(book_ids)
+        depository_stats_cache.invalidate()
+        self._invalidate_book_copies(copy_ids, book_ids, author_ids)
+        dto_cache.invalidate(Customer, customer_ids)
+        return self._book_copies_in_order(copy_ids, book_copies)
+
+    @staticmethod
+    def _check_book_copies_status(copy_ids: list[int], book_copies: list, status: BookStatus) -> None:
+        found = {book_copy.copy_id: book_copy for book_copy in book_copies}
+        errors: dict[int, str] = {}
+        for copy_id in copy_ids:
+            if copy_id not in found:
+                errors[copy_id] = f"Book copy with id {copy_id} not found"
+            elif found[copy_id].status != status:
+                errors[copy_id] = f"Book copy with id {copy_id} is {found[copy_id].status.value}, not {status.value}"
+        if errors:
+            app_logger.warning(f"Status change of book copies {list(errors)} rejected: {list(errors.values())}")
+            raise BookCopyBatchRejected(f"{len(errors)} of {len(copy_ids)} book copies can't change status, "
+                                        f"none was changed", errors)
+
+    @staticmethod
+    def _invalidate_book_copies(copy_ids: list[int], book_ids: list[int], author_ids: list[int]) -> None:
+        # Book and author DTOs list only the available copies, a copy changing status changes them too
+        dto_cache.invalidate(BookCopy, copy_ids)
+        dto_cache.invalidate(Book, book_ids)
+        dto_cache.invalidate(Author, author_ids)
+
+    @staticmethod
+    def _book_copies_in_order(copy_ids: list[int], book_copies: list) -> list[BookCopyDTO]:
+        found = {book_copy.copy_id: book_copy for book_copy in book_copies}
+        return [BookCopyMapper.orm_to_dto(found[copy_id], trusted=True) for copy_id in copy_ids]
 
     def change_book_copy_statement(self, copy_id: int, statement: BookStatement) -> BookCopyDTO:
         app_logger.info(f"Calling change_book_copy_statement function with parameter: copy_id: {copy_id}, "
                         f"statement: {statement}")
         with self.session.begin():
-            book_copy = self.repo.find_book_by_id(copy_id, for_update=True)
+            book_copy = self.repo.find_book_copy(copy_id, for_update=True)
             if not book_copy:
                 app_logger.warning(f"Book with copy_id: {copy_id} not found")
                 raise BookCopyNotFound(f"Book copy with id {copy_id} not found")
@@ -290,41 +459,69 @@ class BookService:
                      and statement == BookStatement.REPAIR) \
                 or (current_statement == BookStatement.DAMAGED and statement == BookStatement.UNUSABLE):
                 new_book_copy = self.repo.update_book_copy(copy_id=copy_id, book_copy={"statement": statement})
-                return BookCopyMapper.orm_to_dto(new_book_copy)
             else :
                 app_logger.warning(f"Bad new statement {statement} for current book copy statement {current_statement}")
                 raise WrongNewStatement(f"Book copy with id {copy_id} with current statement {current_statement} do "
                                         f"not might be changed for new statement: {statement}")
+        dto_cache.invalidate(BookCopy, [copy_id])
+        return BookCopyMapper.orm_to_dto(new_book_copy, trusted=True)
 
     def delete_book_copy(self, copy_id: int) -> BookCopyDTO:
         app_logger.info(f"Calling delete_book_copy function with parameter: copy_id: {copy_id}")
         with self.session.begin():
-            delete_book_copy = self.repo.find_book_by_id(copy_id, for_update=True)
+            delete_book_copy = self.repo.find_book_copy(copy_id, for_update=True)
             if not delete_book_copy:
                 app_logger.warning(f"Book with copy_id: {copy_id} not found")
                 raise BookCopyNotFound(f"Book copy with id {copy_id} not found")
-            if delete_book_copy.satus == BookStatus.BORROWED:
+            if delete_book_copy.status == BookStatus.BORROWED:
                 app_logger.warning(f"Book with copy_id: {copy_id} borrowed. You cannot delete it")
                 raise BookCopyBorrowed(f"You cannot delete book copy when it is borrowed. First change status")
-            deleted_book_copy = self.repo.delete_book_copy(copy_id)
-        return BookCopyMapper.orm_to_dto(deleted_book_copy)
+            deleted_book_copy = BookCopyMapper.orm_to_dto(delete_book_copy, trusted=True)
+            self.repo.delete_book_copy(copy_id)
+            if delete_book_copy.placement_id:
+                self.repo.change_place_status(place_id=delete_book_copy.placement_id,
+                                              status=PlacementStatus.FREE)
+            author_ids = self.repo.find_book_author_ids([delete_book_copy.book_id])
+        depository_stats_cache.invalidate()
+        self._invalidate_book_copies([copy_id], [delete_book_copy.book_id], author_ids)
+        return deleted_book_copy
 
     #Customer
-    def find_customer_by_id(self, cust_id: int) -> CustomerDTO:
+    def find_customer_by_id(self, cust_id: int, fields: str | None = None, depth: int | None = None,
+                            conditional: ConditionalRead | None = None) -> CustomerDTO:
         app_logger.info(f"Calling find_customer_by_id function with parameter: copy_id: {cust_id}")
-        customer = self.repo.find_customer_by_id(cust_id)
+        key = ('customer', cust_id, fields, depth)
+        cached = dto_cache.lookup(key, conditional)
+        if cached is not None:
+            return cached
+        generation = dto_cache.generation()
+        projection = CustomerMapper.projection(fields, depth)
+        customer = self.repo.find_customer_by_id(cust_id, loader_options=projection.loader_options)
         if not customer:
             app_logger.warning(f"Customer with copy_id: {cust_id} not found")
             raise CustomerNotFound(f"Customer with id {cust_id} not found")
-        return CustomerMapper.orm_to_dto(customer)
+        return dto_cache.store(key, projection, customer, generation, conditional)
+
+    def find_customers_by_ids(self, ids: list[int]) -> CustomerBatchDTO:
+        ids = list(dict.fromkeys(ids))
+        app_logger.info(f"Calling find_customers_by_ids function with {len(ids)} id(s)")
+        customers = {customer.customer_id: customer for customer in self.repo.find_customers_by_ids(ids)}
+        return CustomerBatchDTO(items=[CustomerMapper.orm_to_dto(customers[i], trusted=True)
+                                       for i in ids if i in customers],
+                                missing=[i for i in ids if i not in customers])
 
     def find_customer_by_email(self, email: str) -> CustomerDTO:
         app_logger.info(f"Calling find_customer_by_email function with parameter: email: {email}")
+        key = ('customer_email', email)
+        cached = dto_cache.lookup(key)
+        if cached is not None:
+            return cached
+        generation = dto_cache.generation()
         customer = self.repo.find_customer_by_email(email)
         if not customer:
             app_logger.warning(f"Customer with email: {email} not found")
             raise CustomerNotFound(f"Customer with email {email} not found")
-        return CustomerMapper.orm_to_dto(customer)
+        return dto_cache.store(key, CustomerMapper.projection(), customer, generation)
 
     def find_customer_by_phone(self, phone: str) -> CustomerDTO:
         app_logger.info(f"Calling find_customer_by_phone function with parameter: {phone}")
@@ -333,7 +530,7 @@ class BookService:
         if not customer:
             app_logger.warning(f"Customer with phone: {phone} not found")
             raise CustomerNotFound(f"Customer with phone {phone} not found")
-        return CustomerMapper.orm_to_dto(customer)
+        return CustomerMapper.orm_to_dto(customer, trusted=True)
 
     def find_customer_by_fullname(self, fullname: FullNameDTO) -> CustomerDTO:
         app_logger.info(f"Calling find_customer_by_fullname function with parameter: {fullname}")
@@ -342,7 +539,15 @@ class BookService:
         if not customer:
             app_logger.warning(f"Customer with fullname: {fullname} not found")
             raise CustomerNotFound(f"Customer with full name {fullname} not found")
-        return CustomerMapper.orm_to_dto(customer)
+        return CustomerMapper.orm_to_dto(customer, trusted=True)
+
+    def autocomplete_customers(self, query: str,
+                               limit: int = DEFAULT_AUTOCOMPLETE_LIMIT) -> list[NameSuggestionDTO]:
+        app_logger.info(f"Calling autocomplete_customers function with parameters: query: {query}, limit: {limit}")
+        if not customer_autocomplete.loaded:
+            generation = customer_autocomplete.generation()
+            customer_autocomplete.load(self.repo.find_customer_names(), generation)
+        return customer_autocomplete.suggest(query, limit)
 
     def create_customer(self, customer: NewCustomerDTO) -> CustomerDTO:
         app_logger.info(f"Calling create_customer function with parameter: {customer}")
@@ -353,14 +558,17 @@ class BookService:
             app_logger.warning(f"Invalid phone: {customer.phone}")
             raise PhoneValidationError(f"Invalid phone: {customer.phone}")
         try:
-            customer = self.repo.create_customer(CustomerMapper.new_dto_to_dict(customer=customer))
-            return CustomerMapper.orm_to_dto(customer)
+            with self.session.begin():
+                new_customer = self.repo.create_customer(CustomerMapper.new_dto_to_dict(customer=customer))
+            customer_autocomplete.add(new_customer.customer_id, new_customer.first_name, new_customer.last_name,
+                                      new_customer.middle_name)
+            return CustomerMapper.orm_to_dto(new_customer, trusted=True)
         except IntegrityError as e:
             original_error = e.orig
             if isinstance(original_error, UniqueViolation):
                 constraint_name = original_error.diag.constraint_name
                 if constraint_name == 'uq_email':
-                    app_logger.warning("Customer with email: {customer.email} already exists")
+                    app_logger.warning(f"Customer with email: {customer.email} already exists")
                     raise CustomerEmailAlreadyExist(f"Customer with email: {customer.email} is already exist "
                                                     f"in database") from e
                 elif constraint_name == 'uq_phone':
@@ -368,13 +576,13 @@ class BookService:
                     raise CustomerPhoneAlreadyExist(f"Customer with phone: {customer.phone} is already exist "
                                                     f"in database") from e
                 elif constraint_name == 'uq_customer_full_name':
-                    app_logger.warning(f"Customer with full name: {customer.fullname} already exists")
+                    app_logger.warning(f"Customer with full name: {customer.full_name} already exists")
                     raise CustomerFullNameAlreadyExist(f"Customer with fullname {str(customer.full_name)} is "
                                                        f"already exist in database") from e
                 else: raise e
             else: raise e
 
-    def change_customer_phone_number(self, customer_id: int, phone: StringDTO):
+    def change_customer_phone_number(self, customer_id: int, phone: StringDTO) -> CustomerDTO:
         app_logger.info(f"Calling change_customer_phone_number function with parameter: {phone}")
         phone = phone.string
         if not PhoneValidator.validate_phone_number(phone):
@@ -384,13 +592,17 @@ class BookService:
         try:
             with self.session.begin():
                 customer = self.repo.update_customer(customer_id=customer_id, new_customer={"phone": phone})
-                customer = self.repo.find_customer_by_id(customer.customer_id)  #type: ignore
-            return CustomerMapper.orm_to_dto(customer)
+                if not customer:
+                    app_logger.warning(f"Customer with id: {customer_id} not found")
+                    raise CustomerNotFound(f"Customer with id {customer_id} not found")
+                customer = self.repo.find_customer_by_id(customer_id)
+            dto_cache.invalidate(Customer, [customer_id])
+            return CustomerMapper.orm_to_dto(customer, trusted=True)
         except IntegrityError as e:
             orig = e.orig
             if isinstance(orig, UniqueViolation) and orig.diag.constraint_name == 'uq_phone':
                 app_logger.warning(f"Customer with phone: {phone} already exists")
-                raise CustomerPhoneAlreadyExist(f"Customer with phone: {customer.phone} is already exist in "
+                raise CustomerPhoneAlreadyExist(f"Customer with phone: {phone} is already exist in "
                                                 f"database") from e
             else: raise e
 
@@ -404,23 +616,12 @@ class BookService:
                     raise CustomerNotFound(f"Customer with id {customer_id} not found")
                 self.repo.update_customer(customer_id=customer_id, new_customer={"email": email})
                 customer = self.repo.find_customer_by_id(customer_id)
-            return CustomerMapper.orm_to_dto(customer)
+            dto_cache.invalidate(Customer, [customer_id])
+            return CustomerMapper.orm_to_dto(customer, trusted=True)
         except IntegrityError as e:
             orig = e.orig
             if isinstance(orig, UniqueViolation) and orig.diag.constraint_name == 'uq_email':
                 app_logger.warning(f"Customer with email: {email} already exists in database")
-                raise CustomerEmailAlreadyExist(f"Customer with email: {customer.email} is already exist "
+                raise CustomerEmailAlreadyExist(f"Customer with email: {email} is already exist "
                                                 f"in database") from e
             else: raise e
-
-
-
-
-
-
-
-
-
-
-
-
@@ -0,0 +1,188 @@
+"""Slow-query log of the engines, written to the slow_query logger configured in config/logger.yaml.
+
+Every statement slower than slow_query_ms is logged with its bound parameters and the repository method that ran it.
+A sample of the slow SELECT statements, slow_query_explain_sample of them and each statement shape at most once per
+slow_query_explain_interval seconds, is explained by a background thread over its own connection, so the request that
+ran the statement never waits for the plan. slow_query_ms=0 disables the log.
+"""
+import hashlib
+import os
+import queue
+import random
+import threading
+import time
+import traceback
+from pathlib import Path
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import NullPool
+from .logger import slow_query_logger
+from .query_audit import statement_shape
+
+SLOW_QUERY_MS = float(os.getenv('slow_query_ms', '200'))
+SLOW_QUERY_EXPLAIN_SAMPLE = float(os.getenv('slow_query_explain_sample', '0.1'))
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.getenv('slow_query_explain_interval', '300'))
+SLOW_QUERY_EXPLAIN_ANALYZE = os.getenv('slow_query_explain_analyze', 'true').lower() in ('1', 'true', 'yes', 'on')
+SLOW_QUERY_EXPLAIN_TIMEOUT_MS = int(os.getenv('slow_query_explain_timeout_ms', '10000'))
+SLOW_QUERY_EXPLAIN_QUEUE = 16
+MAX_PARAMETERS_LENGTH = 1000
+MAX_EXPLAINED_SHAPES = 1000
+
+REPOSITORIES_DIR = str(Path(__file__).resolve().parent / "repositories")
+PACKAGE_DIR = str(Path(__file__).resolve().parent)
+
+
+def caller_stack() -> list[traceback.FrameSummary]:
+    """Stack of the current thread, continued into the parent greenlets under the async engine.
+
+    The async engine runs the cursor in a greenlet whose own stack ends at the driver, the awaiting repository
+    coroutine is suspended in the parent greenlet.
+    """
+    stack = traceback.extract_stack()
+    try:
+        import greenlet
+    except ImportError:
+        return stack
+    current = greenlet.getcurrent().parent
+    while current is not None:
+        if current.gr_frame is not None:
+            stack = traceback.extract_stack(current.gr_frame) + stack
+        current = current.parent
+    return stack
+
+
+def repository_method() -> str:
+    """Innermost repository method of the stack, or the innermost bookz frame for statements run elsewhere."""
+    stack = [frame for frame in caller_stack() if frame.filename != __file__]
+    for directory in (REPOSITORIES_DIR, PACKAGE_DIR):
+        frames = [frame for frame in stack if frame.filename.startswith(directory)]
+        if frames:
+            frame = frames[-1]
+            return f"{frame.filename.removeprefix(PACKAGE_DIR + os.sep)}:{frame.lineno} {frame.name}"
+    return "<unknown>"
+
+
+def query_id(shape: str) -> str:
+    return hashlib.blake2b(shape.encode(), digest_size=6).hexdigest()
+
+
+def format_parameters(parameters) -> str:
+    text = repr(parameters)
+    if len(text) > MAX_PARAMETERS_LENGTH:
+        return text[:MAX_PARAMETERS_LENGTH] + f"... ({len(text)} chars)"
+    return text
+
+
+class ExplainWorker:
+    """Daemon thread that explains the queued statements over a connection of its own, outside any pool.
+
+    Each plan runs in a transaction that is rolled back, under a statement_timeout. The queue is bounded and a
+    statement that doesn't fit is dropped, the log must never slow down the requests.
+    """
+
+    def __init__(self, url: str, analyze: bool = SLOW_QUERY_EXPLAIN_ANALYZE,
+                 timeout_ms: int = SLOW_QUERY_EXPLAIN_TIMEOUT_MS) -> None:
+        self.url = url
+        self.analyze = analyze
+        self.timeout_ms = timeout_ms
+        self._queue: queue.Queue = queue.Queue(maxsize=SLOW_QUERY_EXPLAIN_QUEUE)
+        self._engine: Engine | None = None
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def submit(self, qid: str, statement: str, parameters) -> bool:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, name="slow-query-explain", daemon=True)
+                self._thread.start()
+        try:
+            self._queue.put_nowait((qid, statement, parameters))
+            return True
+        except queue.Full:
+            return False
+
+    def run(self) -> None:
+        while True:
+            qid, statement, parameters = self._queue.get()
+            try:
+                plan = self.explain(statement, parameters)
+                slow_query_logger.info(f"[{qid}] plan:\n{plan}")
+            except Exception as e:
+                slow_query_logger.warning(f"[{qid}] EXPLAIN failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def explain(self, statement: str, parameters) -> str:
+        if self._engine is None:
+            # Unlisted engine, the EXPLAIN statements are neither timed nor counted in the request metrics
+            self._engine = create_engine(self.url, poolclass=NullPool,
+                                         connect_args={"application_name": "bookz-slow-query-explain"})
+        options = "ANALYZE, BUFFERS" if self.analyze else "COSTS"
+        with self._engine.connect() as connection:
+            connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(self.timeout_ms)}")
+            rows = connection.exec_driver_sql(f"EXPLAIN ({options}) {statement}", parameters or {}).scalars().all()
+            connection.rollback()
+        return "\n".join(rows)
+
+
+class SlowQueryLog:
+    """Engine listener that logs the statements slower than threshold_ms and hands a sample to the ExplainWorker."""
+
+    def __init__(self, explain_url: str, threshold_ms: float = SLOW_QUERY_MS,
+                 sample: float = SLOW_QUERY_EXPLAIN_SAMPLE, interval: float = SLOW_QUERY_EXPLAIN_INTERVAL) -> None:
+        self.threshold = threshold_ms / 1000
+        self.sample = sample
+        self.interval = interval
+        self.worker = ExplainWorker(explain_url)
+        self._explained: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def attach(self, engine: Engine) -> None:
+        if not event.contains(engine, "before_cursor_execute", self.before_cursor_execute):
+            event.listen(engine, "before_cursor_execute", self.before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", self.after_cursor_execute)
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        elapsed = time.perf_counter() - conn.info["slow_query_start"].pop()
+        if elapsed < self.threshold:
+            return
+        shape = statement_shape(statement)
+        qid = query_id(shape)
+        slow_query_logger.warning(f"[{qid}] {elapsed * 1000:.1f} ms, {max(cursor.rowcount, 0)} rows in "
+                                  f"{repository_method()}: {shape}\n  parameters: {format_parameters(parameters)}")
+        if self.should_explain(shape, statement, executemany):
+            if not self.worker.submit(qid, statement, parameters):
+                slow_query_logger.info(f"[{qid}] EXPLAIN skipped, queue full")
+
+    def should_explain(self, shape: str, statement: str, executemany: bool) -> bool:
+        # EXPLAIN ANALYZE executes the statement again, only plain reads are safe to run twice
+        text = statement.lstrip().upper()
+        if executemany or not text.startswith("SELECT") or " FOR UPDATE" in text or random.random() >= self.sample:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            if now - self._explained.get(shape, -self.interval) < self.interval:
+                return False
+            if len(self._explained) >= MAX_EXPLAINED_SHAPES:
+                self._explained.clear()
+            self._explained[shape] = now
+        return True
+
+
+slow_query_log: SlowQueryLog | None = None
+
+
+def log_slow_queries(engine: Engine, explain_url: str) -> None:
+    """Logs the slow statements of this engine, explained over explain_url, a psycopg2 URL of the same database.
+
+    Pass AsyncEngine.sync_engine for an async engine. Both engines share one log, so the sampling of a shape is global.
+    """
+    global slow_query_log
+    if SLOW_QUERY_MS <= 0:
+        return
+    if slow_query_log is None:
+        slow_query_log = SlowQueryLog(explain_url)
+    slow_query_log.attach(engine)
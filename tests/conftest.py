@@ -0,0 +1,94 @@
+import os
+import uuid
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy_utils import create_database, drop_database
+
+# Server for the tests that need PostgreSQL, e.g. postgresql://postgres@localhost:5432/postgres. They are skipped
+# without it. Every test gets its own database on that server, dropped when the test is done.
+TEST_DATABASE_URL = os.getenv("BOOKZ_TEST_DATABASE_URL")
+
+
+@pytest.fixture
+def postgres_url() -> URL:
+    """URL of a new empty database on the test server, with the psycopg2 driver of the sync engine."""
+    if not TEST_DATABASE_URL:
+        pytest.skip("BOOKZ_TEST_DATABASE_URL is not set")
+    url = make_url(TEST_DATABASE_URL).set(drivername="postgresql+psycopg2",
+                                          database=f"bookz_test_{uuid.uuid4().hex[:12]}")
+    create_database(url)
+    yield url
+    drop_database(url)
+
+
+@pytest.fixture
+def db_engine(postgres_url):
+    """Engine of a test database that has the whole bookz schema."""
+    from bookz.repositories.orm_models import Base
+    engine = create_engine(postgres_url)
+    try:
+        Base.metadata.create_all(engine)
+        yield engine
+    finally:
+        engine.dispose()
+
+
+@pytest.fixture
+def async_db(db_engine, monkeypatch):
+    """Points the app's async sessions at the test database and starts from empty in-process caches."""
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+    from sqlalchemy.pool import NullPool
+    from bookz import db
+    from bookz.metrics import instrument_engine
+    from bookz.services.autocomplete import author_autocomplete, customer_autocomplete
+    from bookz.services.depository_stats import depository_stats_cache
+    from bookz.services.dto_cache import dto_cache
+    # Without a pool no connection outlives the event loop of the test that opened it
+    engine = create_async_engine(db_engine.url.set(drivername="postgresql+psycopg"), poolclass=NullPool)
+    instrument_engine(engine.sync_engine)
+    monkeypatch.setattr(db, "async_engine", engine)
+    monkeypatch.setattr(db, "AsyncSessionLocal", async_sessionmaker(bind=engine, class_=AsyncSession,
+                                                                    autoflush=False, expire_on_commit=False))
+    for cache in (author_autocomplete, customer_autocomplete, depository_stats_cache):
+        cache.invalidate()
+    dto_cache.clear()
+    yield engine
+    dto_cache.clear()
+
+
+@pytest.fixture
+def catalog(db_engine) -> dict:
+    """Seeds a small catalog: books with one author and two copies each, every copy available on its own placement,
+    and customers with phones in the stored style. Returns the ids of the rows by table."""
+    from sqlalchemy.orm import Session
+    from bookz.enums.enums import BookStatus, PlacementStatus
+    from bookz.repositories.orm_models import Author, Book, BookCopy, Customer, Placement
+    books_number = 12
+    with Session(db_engine) as session:
+        placements = [Placement(line_id="A", column_id=column_id, shelf_id=shelf_id, position=position)
+                      for column_id in (1, 2) for shelf_id in "AB" for position in range(1, 11)]
+        authors = [Author(first_name=f"Author{i}", last_name=f"Writer{i}") for i in range(books_number // 4)]
+        books = [Book(title=f"Book {i}", publisher="Penguin", place_of_publication="London", published_year=2000 + i,
+                      isbn=f"978-00-00-{i:06d}", pages=100 + i, authors=[authors[i % len(authors)]])
+                 for i in range(books_number)]
+        copies = [BookCopy(book=book, status=BookStatus.AVAILABLE, placement=placements.pop())
+                  for book in books for _ in range(2)]
+        for copy in copies:
+            copy.placement.status = PlacementStatus.OCCUPIED
+        customers = [Customer(first_name=f"Reader{i}", last_name=f"Customer{i}", email=f"reader{i}@example.com",
+                              phone=f"+380 66 123 45 {i:02d}") for i in range(books_number)]
+        session.add_all([*placements, *books, *copies, *customers])
+        session.commit()
+        return {"authors": [author.id for author in authors],
+                "books": [book.book_id for book in books],
+                "book_copies": [copy.copy_id for copy in copies],
+                "customers": [customer.customer_id for customer in customers]}
+
+
+@pytest.fixture
+def client(async_db):
+    """Client of the app on the test database. The lifespan is not run, server errors come back as 500s."""
+    from fastapi.testclient import TestClient
+    from bookz.main import app
+    return TestClient(app, raise_server_exceptions=False)
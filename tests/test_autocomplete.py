@@ -0,0 +1,74 @@
+from bookz.services.autocomplete import PrefixIndex
+
+NAMES = [(1, "Mark", "Twain", None), (2, "Marina", "Tsvetaeva", "Ivanovna"), (3, "Taras", "Shevchenko", None),
+         (4, "Mary", "Shelley", None)]
+
+
+def loaded_index() -> PrefixIndex:
+    index = PrefixIndex("test")
+    index.load(NAMES, index.generation())
+    return index
+
+
+def suggested_ids(index: PrefixIndex, query: str, limit: int = 10) -> list[int]:
+    return [suggestion.id for suggestion in index.suggest(query, limit)]
+
+
+def test_suggest_matches_either_name_first():
+    index = loaded_index()
+    assert suggested_ids(index, "mar") == [2, 1, 4]
+    assert suggested_ids(index, "she") == [4, 3]
+    assert suggested_ids(index, "twain m") == [1]
+    assert suggested_ids(index, "mark twain") == [1]
+    assert suggested_ids(index, "tsvetaeva marina iv") == [2]
+
+
+def test_suggest_normalizes_the_query_and_respects_limit():
+    index = loaded_index()
+    assert suggested_ids(index, "  MAR   ") == [2, 1, 4]
+    assert suggested_ids(index, "mar", limit=2) == [2, 1]
+    assert suggested_ids(index, "t") == [3, 2, 1]
+    assert suggested_ids(index, "zz") == []
+
+
+def test_suggestion_carries_the_full_name():
+    suggestion, = loaded_index().suggest("tsv", 1)
+    assert (suggestion.full_name.first_name, suggestion.full_name.last_name,
+            suggestion.full_name.middle_name) == ("Marina", "Tsvetaeva", "Ivanovna")
+
+
+def test_add_indexes_new_names_and_renames():
+    index = loaded_index()
+    index.add(5, "Mykola", "Gogol", None)
+    assert suggested_ids(index, "gog") == [5]
+    index.add(1, "Samuel", "Clemens", None)
+    assert suggested_ids(index, "twa") == []
+    assert suggested_ids(index, "clem") == [1]
+    assert suggested_ids(index, "mar") == [2, 4]
+
+
+def test_remove_drops_both_keys_of_a_name():
+    index = loaded_index()
+    index.remove([4, 42])
+    assert suggested_ids(index, "she") == [3]
+    assert suggested_ids(index, "mary") == []
+
+
+def test_load_is_dropped_after_a_concurrent_write():
+    index = PrefixIndex("test")
+    generation = index.generation()
+    index.add(5, "Mykola", "Gogol", None)
+    index.load(NAMES, generation)
+    assert not index.loaded
+    index.load(NAMES, index.generation())
+    assert index.loaded
+    index.invalidate()
+    assert not index.loaded and suggested_ids(index, "mar") == []
+
+
+def test_new_author_is_suggested(client, catalog):
+    assert client.get("/api/author/autocomplete", params={"q": "Writer1"}).status_code == 200
+    response = client.post("/api/author/", json={"full_name": {"first_name": "Lesya", "last_name": "Ukrainka"}})
+    assert response.status_code == 200, response.text
+    suggestions = client.get("/api/author/autocomplete", params={"q": "lesya u"}).json()
+    assert [suggestion["id"] for suggestion in suggestions] == [response.json()["id"]]
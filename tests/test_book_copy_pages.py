@@ -0,0 +1,48 @@
+import pytest
+from bookz.enums.enums import BookStatement, BookStatus
+
+
+def walk_pages(client, path: str, limit: int) -> list[dict]:
+    pages, cursor = [], None
+    while True:
+        params = {"limit": limit} if cursor is None else {"limit": limit, "cursor": cursor}
+        response = client.get(path, params=params)
+        assert response.status_code == 200, response.text
+        pages.append(response.json())
+        cursor = pages[-1]["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize("limit", [5, 8, 24, 100])
+def test_pages_cover_every_copy_once_in_id_order(client, catalog, limit):
+    pages = walk_pages(client, f"/api/book-copy/status/{BookStatus.AVAILABLE.value}", limit)
+    copy_ids = [book_copy["copy_id"] for page in pages for book_copy in page["items"]]
+    assert copy_ids == sorted(catalog["book_copies"])
+    assert len(pages) == -(-len(copy_ids) // limit)
+    assert all(len(page["items"]) == limit for page in pages[:-1])
+    assert all(page["next_cursor"] == page["items"][-1]["copy_id"] for page in pages[:-1])
+
+
+def test_page_after_a_cursor_skips_nothing_when_earlier_copies_change(client, catalog):
+    path = f"/api/book-copy/status/{BookStatus.AVAILABLE.value}"
+    first = client.get(path, params={"limit": 5}).json()
+    borrowed = [book_copy["copy_id"] for book_copy in first["items"]]
+    assert client.post("/api/book-copy/borrow",
+                       json={"copy_ids": borrowed, "customer_id": catalog["customers"][0]}).status_code == 200
+
+    second = client.get(path, params={"limit": 5, "cursor": first["next_cursor"]}).json()
+    assert [book_copy["copy_id"] for book_copy in second["items"]] == sorted(catalog["book_copies"])[5:10]
+
+
+def test_statement_pages(client, catalog):
+    pages = walk_pages(client, f"/api/book-copy/statement/{BookStatement.NEW.value}", 7)
+    assert [book_copy["copy_id"] for page in pages for book_copy in page["items"]] == sorted(catalog["book_copies"])
+
+
+def test_missing_status_is_404_only_on_the_first_page(client, catalog):
+    path = f"/api/book-copy/status/{BookStatus.LOST.value}"
+    assert client.get(path).status_code == 404
+    response = client.get(path, params={"cursor": max(catalog["book_copies"])})
+    assert response.status_code == 200
+    assert response.json() == {"items": [], "next_cursor": None}
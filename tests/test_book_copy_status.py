@@ -0,0 +1,49 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from bookz.enums.enums import BookStatus, PlacementStatus
+from bookz.repositories.orm_models import BookCopy, Placement
+
+
+def test_borrow_and_return_book_copies(client, db_engine, catalog):
+    copy_ids = catalog["book_copies"][:3]
+    customer_id = catalog["customers"][0]
+
+    response = client.post("/api/book-copy/borrow", json={"copy_ids": copy_ids, "customer_id": customer_id})
+    assert response.status_code == 200, response.text
+    borrowed = response.json()
+    assert [book_copy["copy_id"] for book_copy in borrowed] == copy_ids
+    assert {book_copy["status"] for book_copy in borrowed} == {BookStatus.BORROWED.value}
+    assert {book_copy["customer"]["customer_id"] for book_copy in borrowed} == {customer_id}
+    assert all(book_copy["placement"] is None for book_copy in borrowed)
+
+    response = client.post("/api/book-copy/return", json={"copy_ids": copy_ids})
+    assert response.status_code == 200, response.text
+    returned = response.json()
+    assert {book_copy["status"] for book_copy in returned} == {BookStatus.AVAILABLE.value}
+    assert all(book_copy["customer"] is None and book_copy["placement"] for book_copy in returned)
+    with Session(db_engine) as session:
+        placement_ids = session.scalars(select(BookCopy.placement_id).where(BookCopy.copy_id.in_(copy_ids))).all()
+        statuses = session.scalars(select(Placement.status).where(Placement.id.in_(placement_ids))).all()
+    assert statuses == [PlacementStatus.OCCUPIED] * len(copy_ids)
+
+
+def test_borrow_rejects_the_whole_batch(client, db_engine, catalog):
+    copy_ids = catalog["book_copies"][:2]
+    customer_id = catalog["customers"][0]
+    assert client.post("/api/book-copy/borrow",
+                       json={"copy_ids": copy_ids[:1], "customer_id": customer_id}).status_code == 200
+
+    response = client.post("/api/book-copy/borrow", json={"copy_ids": copy_ids, "customer_id": customer_id})
+    assert response.status_code == 409
+    assert [error["copy_id"] for error in response.json()["detail"]] == copy_ids[:1]
+    with Session(db_engine) as session:
+        assert session.get(BookCopy, copy_ids[1]).status == BookStatus.AVAILABLE
+
+
+def test_borrow_one_book_copy_by_status(client, catalog):
+    copy_id, customer_id = catalog["book_copies"][0], catalog["customers"][0]
+    response = client.put(f"/api/book-copy/{copy_id}/status/{BookStatus.BORROWED.value}",
+                          params={"customer_id": customer_id})
+    assert response.status_code == 200, response.text
+    assert response.json()["customer"]["customer_id"] == customer_id
+    assert response.json()["placement"] is None
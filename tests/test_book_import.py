@@ -0,0 +1,145 @@
+import io
+import json
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from bookz.enums.enums import BookStatement, BookStatus, ExportFormat, PlacementStatus
+from bookz.repositories.orm_models import Author, Book, BookAuthor, BookCopy, Placement
+from bookz.services.book_import import BookImporter, iter_records
+from bookz.services.dto_models import BookImportReportDTO
+
+TOLKIEN = {"full_name": {"first_name": "John", "last_name": "Tolkien", "middle_name": "Ronald"}}
+
+
+def feed_book(isbn: str, authors: list[dict] | None = None, **fields) -> dict:
+    return {"title": f"Book {isbn}", "publisher": "Allen & Unwin", "place_of_publication": "London",
+            "published_year": 1954, "isbn": isbn, "pages": 423, "new_copies": 2,
+            "authors": [TOLKIEN] if authors is None else authors, **fields}
+
+
+def ndjson(*books: dict) -> io.StringIO:
+    return io.StringIO("\n".join(json.dumps(book) for book in books) + "\n")
+
+
+def validated(lines, file_format: ExportFormat = ExportFormat.NDJSON) -> tuple[dict, BookImportReportDTO]:
+    report = BookImportReportDTO()
+    return BookImporter(None).validate(iter_records(lines, file_format), report), report
+
+
+def errors(report: BookImportReportDTO) -> list[tuple[int, str | None, str]]:
+    return [(error.row, error.isbn, error.error) for error in report.errors]
+
+
+def test_ndjson_rows_are_numbered_without_blank_lines():
+    records = list(iter_records(io.StringIO('{"a": 1}\n\n  \n{"b": 2}\n'), ExportFormat.NDJSON))
+    assert records == [(1, '{"a": 1}\n'), (2, '{"b": 2}\n')]
+
+
+def test_csv_rows_leave_out_empty_columns():
+    lines = io.StringIO("title,isbn,price\nThe Hobbit,978-00-00-000001,\n")
+    assert list(iter_records(lines, ExportFormat.CSV)) == [(1, {"title": "The Hobbit", "isbn": "978-00-00-000001"})]
+
+
+@pytest.mark.parametrize("isbn, message", [
+    ("978-00", "isbn: String should have at least 10 characters"),
+    ("978-00-00-000000-000001", "isbn: String should have at most 20 characters"),
+])
+def test_bad_isbn_is_reported_with_its_row(isbn, message):
+    books, report = validated(ndjson(feed_book("978-00-00-000001"), feed_book(isbn)))
+    assert list(books) == [1]
+    assert errors(report) == [(2, None, message)]
+    assert report.rows == 2
+
+
+def test_invalid_csv_row_keeps_its_isbn_in_the_report():
+    lines = io.StringIO("title,publisher,place_of_publication,published_year,isbn,pages,new_copies\n"
+                        "The Hobbit,Allen & Unwin,London,1937,978-00-00-000001,310,0\n")
+    books, report = validated(lines, ExportFormat.CSV)
+    assert books == {}
+    assert errors(report) == [(1, "978-00-00-000001", "new_copies: Input should be greater than or equal to 1")]
+
+
+def test_duplicate_isbn_in_one_feed_keeps_the_first_row():
+    books, report = validated(ndjson(feed_book("978-00-00-000001"), feed_book("978-00-00-000002"),
+                                     feed_book("978-00-00-000001", title="Reprint")))
+    assert list(books) == [1, 2]
+    assert books[1].title == "Book 978-00-00-000001"
+    assert errors(report) == [(3, "978-00-00-000001", "Duplicate of row 1 with isbn 978-00-00-000001")]
+
+
+def test_csv_authors_column_is_json():
+    header = "title,publisher,place_of_publication,published_year,isbn,pages,new_copies,authors\n"
+    row = 'The Hobbit,Allen & Unwin,London,1937,{isbn},310,1,"{authors}"\n'
+    lines = io.StringIO(header + row.format(isbn="978-00-00-000001", authors=json.dumps([TOLKIEN]).replace('"', '""'))
+                        + row.format(isbn="978-00-00-000002", authors="[{not json"))
+    books, report = validated(lines, ExportFormat.CSV)
+    assert books[1].authors[0].full_name.last_name == "Tolkien"
+    (row_no, isbn, error), = errors(report)
+    assert (row_no, isbn) == (2, "978-00-00-000002")
+    assert error.startswith("authors: ")
+
+
+def test_author_rows_split_every_author_of_a_book():
+    lewis = {"full_name": {"first_name": "Clive", "last_name": "Lewis"}}
+    books, _ = validated(ndjson(feed_book("978-00-00-000001", [TOLKIEN, lewis]),
+                                feed_book("978-00-00-000002", []),
+                                feed_book("978-00-00-000003", [lewis])))
+    assert list(BookImporter.author_rows(books)) == [(1, "John", "Tolkien", "Ronald"), (1, "Clive", "Lewis", None),
+                                                     (3, "Clive", "Lewis", None)]
+    row, = [row for row in BookImporter.book_rows(books) if row[0] == 2]
+    assert row[-2:] == (2, BookStatement.NEW.name)
+
+
+def catalog_counts(session: Session) -> dict[str, int]:
+    return {model.__name__: session.scalar(select(func.count()).select_from(model))
+            for model in (Author, Book, BookAuthor, BookCopy)}
+
+
+def run_import(db_engine, lines) -> BookImportReportDTO:
+    with Session(db_engine) as session:
+        return BookImporter(session).run(iter_records(lines, ExportFormat.NDJSON))
+
+
+def test_import_stages_and_inserts_the_feed(db_engine, catalog):
+    existing = {"full_name": {"first_name": "Author0", "last_name": "Writer0"}}
+    feed = [feed_book("978-10-00-000001", [TOLKIEN, existing]), feed_book("978-10-00-000002"),
+            feed_book("978-10-00-000003", [], new_copies=3, copy_statement=BookStatement.GOOD.value),
+            feed_book("978-00-00-000000"), feed_book("978-10-00-000004", new_copies=1000)]
+    with Session(db_engine) as session:
+        before = catalog_counts(session)
+
+    report = run_import(db_engine, ndjson(*feed))
+    assert (report.rows, report.authors, report.books, report.copies) == (5, 1, 3, 7)
+    assert errors(report) == [(4, "978-00-00-000000", "Book with isbn 978-00-00-000000 present in database"),
+                              (5, "978-10-00-000004", "Free place for 1000 copies is`t available")]
+
+    with Session(db_engine) as session:
+        assert catalog_counts(session) == {"Author": before["Author"] + 1, "Book": before["Book"] + 3,
+                                           "BookAuthor": before["BookAuthor"] + 3,
+                                           "BookCopy": before["BookCopy"] + 7}
+        first = session.scalars(select(Book).where(Book.isbn == "978-10-00-000001")).one()
+        assert sorted(author.last_name for author in first.authors) == ["Tolkien", "Writer0"]
+        copies = session.scalars(select(BookCopy).join(Book).where(Book.isbn.like("978-10-%"))).all()
+        assert {copy.status for copy in copies} == {BookStatus.AVAILABLE}
+        assert [copy.statement for copy in copies if copy.book.isbn == "978-10-00-000003"] == [
+            BookStatement.GOOD] * 3
+        placements = {copy.placement_id for copy in copies}
+        assert len(placements) == 7
+        assert set(session.scalars(select(Placement.status).where(Placement.id.in_(placements)))) == {
+            PlacementStatus.OCCUPIED}
+
+
+def test_reimport_of_the_same_feed_changes_nothing(db_engine, catalog):
+    feed = [feed_book("978-10-00-000001"), feed_book("978-10-00-000002")]
+    assert run_import(db_engine, ndjson(*feed)).books == 2
+    with Session(db_engine) as session:
+        before = catalog_counts(session)
+        free = session.scalar(select(func.count()).where(Placement.status == PlacementStatus.FREE))
+
+    report = run_import(db_engine, ndjson(*feed))
+    assert (report.authors, report.books, report.copies) == (0, 0, 0)
+    assert [error.error for error in report.errors] == [f"Book with isbn {book['isbn']} present in database"
+                                                        for book in feed]
+    with Session(db_engine) as session:
+        assert catalog_counts(session) == before
+        assert session.scalar(select(func.count()).where(Placement.status == PlacementStatus.FREE)) == free
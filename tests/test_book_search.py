@@ -0,0 +1,108 @@
+import re
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+from bookz.repositories.book_search import book_search_ranking_stmt
+from bookz.repositories.orm_models import SEARCH_INDEXES, Author, Book
+
+QUERY = "tolkien \"the hobbit\" -silmarillion or 'x'); DROP TABLE books; --"
+
+
+def compiled(query: str, limit: int = 10, offset: int = 0):
+    return book_search_ranking_stmt(query, limit, offset).compile(dialect=postgresql.dialect())
+
+
+def index_expression(name: str) -> str:
+    index, = [index for index in SEARCH_INDEXES if index.name == name]
+    expression, = index.expressions
+    return str(expression.compile(dialect=postgresql.dialect())).removesuffix(" AS author_name")
+
+
+def test_query_string_is_one_bound_parameter():
+    statement = compiled(QUERY, limit=21, offset=40)
+    sql = str(statement)
+    assert statement.params["query"] == QUERY
+    assert "DROP TABLE" not in sql
+    assert (statement.params["param_1"], statement.params["param_2"]) == (21, 40)
+    # The same words go to the full-text parser, that never fails on a syntax error, and to the trigram operators
+    assert sql.count("websearch_to_tsquery('simple'::regconfig, %(query)s)") == 4
+    assert sql.count("%(query)s <%% ") == 3
+
+
+def test_every_branch_can_use_its_index():
+    sql = str(compiled("hobbit"))
+    for name in ("ix_book_search_document", "ix_author_search_document"):
+        assert re.search(re.escape(index_expression(name)) + r"\)? @@ websearch_to_tsquery", sql)
+    for name in ("ix_book_title_trgm", "ix_book_publisher_trgm", "ix_author_name_trgm"):
+        assert f"(%(query)s <%% {index_expression(name)})" in sql
+
+
+def test_a_book_is_ranked_by_the_sum_of_its_branches():
+    sql = str(compiled("hobbit"))
+    # a word of the title or an author name matches its full-text and its trigram branch, a typo only the latter
+    assert sql.count("UNION ALL") == 2
+    assert "sum(anon_1.rank) AS rank" in sql
+    assert "GROUP BY anon_1.book_id ORDER BY rank DESC, anon_1.book_id" in sql
+
+
+@pytest.fixture
+def shelf(db_engine) -> dict[str, int]:
+    """Books whose titles, publishers and authors share words, by title."""
+    with Session(db_engine) as session:
+        tolkien = Author(first_name="John", last_name="Tolkien")
+        herbert = Author(first_name="Frank", last_name="Herbert")
+        books = [Book(title="The Hobbit", publisher="Allen & Unwin", authors=[tolkien]),
+                 Book(title="Gardening", publisher="Hobbit Press", authors=[]),
+                 Book(title="The Silmarillion", publisher="Allen & Unwin", authors=[tolkien]),
+                 Book(title="Dune", publisher="Chilton Books", authors=[herbert])]
+        for number, book in enumerate(books):
+            book.place_of_publication, book.published_year, book.isbn, book.pages = (
+                "London", 1937 + number, f"978-20-00-{number:06d}", 300)
+        session.add_all(books)
+        session.commit()
+        return {book.title: book.book_id for book in books}
+
+
+def search(db_engine, query: str, limit: int = 10, offset: int = 0) -> list[tuple[int, float]]:
+    with Session(db_engine) as session:
+        return [tuple(row) for row in session.execute(book_search_ranking_stmt(query, limit, offset))]
+
+
+def test_title_match_outranks_publisher_match(db_engine, shelf):
+    (first, first_rank), (second, second_rank) = search(db_engine, "hobbit")
+    assert (first, second) == (shelf["The Hobbit"], shelf["Gardening"])
+    assert first_rank > second_rank > 0
+
+
+def test_author_name_finds_the_books(db_engine, shelf):
+    hits = search(db_engine, "tolkien")
+    assert [book_id for book_id, _ in hits] == [shelf["The Hobbit"], shelf["The Silmarillion"]]
+    assert hits[0][1] == hits[1][1]
+    assert [book_id for book_id, _ in search(db_engine, "John Tolkien")] == [book_id for book_id, _ in hits]
+    assert search(db_engine, "herbert") == search(db_engine, "frank herbert")[:1] != []
+
+
+def test_typo_falls_back_to_trigram_similarity(db_engine, shelf):
+    hits = search(db_engine, "hobit")
+    assert [book_id for book_id, _ in hits] == [shelf["The Hobbit"], shelf["Gardening"]]
+    assert all(0 < rank < 1 for _, rank in hits)
+    assert [book_id for book_id, _ in search(db_engine, "silmarilion")] == [shelf["The Silmarillion"]]
+    assert search(db_engine, "zzzz") == []
+
+
+def test_pages_follow_the_ranking(db_engine, shelf):
+    ranking = [book_id for book_id, _ in search(db_engine, "hobbit")]
+    assert len(ranking) == 2
+    assert [book_id for book_id, _ in search(db_engine, "hobbit", limit=1)] == ranking[:1]
+    assert [book_id for book_id, _ in search(db_engine, "hobbit", limit=1, offset=1)] == ranking[1:]
+
+
+def test_search_endpoint_pages(client, shelf):
+    first = client.get("/api/book/search", params={"q": "allen unwin", "limit": 1}).json()
+    assert [hit["book"]["title"] for hit in first["items"]] == ["The Hobbit"]
+    assert first["items"][0]["book"]["authors"][0]["full_name"]["last_name"] == "Tolkien"
+    assert first["next_offset"] == 1
+    last = client.get("/api/book/search", params={"q": "allen unwin", "limit": 1, "offset": 1}).json()
+    assert [hit["book"]["title"] for hit in last["items"]] == ["The Silmarillion"]
+    assert last["next_offset"] is None
+    assert client.get("/api/book/search", params={"q": ""}).status_code == 422
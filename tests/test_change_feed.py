@@ -0,0 +1,61 @@
+import json
+import psycopg
+import pytest
+from sqlalchemy import text
+from bookz.repositories.orm_models import CHANGE_CHANNEL, CHANGE_FEED_MAX_ROWS
+
+
+@pytest.fixture
+def changes(db_engine):
+    """Connection listening on the change feed channel of the test database."""
+    url = db_engine.url
+    with psycopg.connect(host=url.host, port=url.port, user=url.username, password=url.password,
+                         dbname=url.database, autocommit=True) as connection:
+        connection.execute(f"LISTEN {CHANGE_CHANNEL}")
+        yield connection
+
+
+def notified(connection, db_engine, statement: str, **parameters) -> list[dict]:
+    """Payloads sent for the statement, after the ones still pending from earlier statements."""
+    list(connection.notifies(timeout=0.1))
+    with db_engine.begin() as session:
+        session.execute(text(statement), parameters)
+    return [json.loads(notify.payload) for notify in connection.notifies(timeout=2, stop_after=1)]
+
+
+def test_update_payload_lists_old_and_new_foreign_keys(changes, db_engine, catalog):
+    copy_id, book_id = catalog["book_copies"][0], catalog["books"][-1]
+    customer_id, next_customer_id = catalog["customers"][:2]
+    notified(changes, db_engine, "UPDATE book_copies SET customer_id = :customer_id WHERE copy_id = :copy_id",
+             customer_id=customer_id, copy_id=copy_id)
+
+    event, = notified(changes, db_engine, "UPDATE book_copies SET customer_id = :customer_id, book_id = :book_id "
+                                          "WHERE copy_id = :copy_id",
+                      customer_id=next_customer_id, book_id=book_id, copy_id=copy_id)
+    assert (event["table"], event["op"]) == ("book_copies", "UPDATE")
+    assert event["copy_id"] == [copy_id]
+    assert sorted(event["customer_id"]) == [customer_id, next_customer_id]
+    assert sorted(event["book_id"]) == sorted([catalog["books"][0], book_id])
+
+    event, = notified(changes, db_engine, "UPDATE book_copies SET customer_id = NULL WHERE copy_id = :copy_id",
+                      copy_id=copy_id)
+    assert event["customer_id"] == [next_customer_id]
+
+
+def test_insert_and_delete_payloads(changes, db_engine, catalog):
+    event, = notified(changes, db_engine, "INSERT INTO authors (first_name, last_name) VALUES ('Lesya', 'Ukrainka')")
+    assert (event["op"], len(event["id"])) == ("INSERT", 1)
+    event, = notified(changes, db_engine, "DELETE FROM authors WHERE id = :id", id=event["id"][0])
+    assert event["op"] == "DELETE"
+
+
+def test_large_update_sends_null_ids(changes, db_engine, catalog):
+    with db_engine.begin() as session:
+        session.execute(text("INSERT INTO placements (line_id, column_id, shelf_id, position, status) "
+                             "SELECT 'Z', 1, 'A', position, 'FREE' FROM generate_series(1, :count) position"),
+                        {"count": CHANGE_FEED_MAX_ROWS})
+    event, = notified(changes, db_engine, "UPDATE placements SET position = position WHERE line_id = 'Z'")
+    assert len(event["id"]) == CHANGE_FEED_MAX_ROWS
+
+    event, = notified(changes, db_engine, "UPDATE placements SET position = position")
+    assert event["id"] is None
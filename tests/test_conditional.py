@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+import pytest
+from bookz.enums.enums import BookStatus
+from bookz.exceptions.exceptions import NotModified
+from bookz.mappers.mappers import BookMapper
+from bookz.repositories.orm_models import Author, Book, BookCopy
+from bookz.services.conditional import ConditionalRead, parse_entity_tags
+from bookz.services.dto_cache import dto_cache
+
+TAG = '"0ad28cfd6b4a858f8cbb1d508bd2537d"'
+
+
+def test_parse_entity_tags():
+    assert parse_entity_tags(None) == set()
+    assert parse_entity_tags("") == set()
+    assert parse_entity_tags(f' {TAG} , W/"weak",,*') == {TAG, '"weak"', "*"}
+
+
+@pytest.mark.parametrize("if_none_match", [TAG, f'"other", {TAG}', f"W/{TAG}", "*"])
+def test_matching_tag_raises_not_modified(if_none_match):
+    conditional = ConditionalRead(if_none_match)
+    with pytest.raises(NotModified):
+        conditional.evaluate(TAG)
+    assert conditional.headers == {"ETag": TAG, "Cache-Control": "no-cache"}
+
+
+@pytest.mark.parametrize("if_none_match", [None, '"other"'])
+def test_other_tag_passes(if_none_match):
+    conditional = ConditionalRead(if_none_match)
+    assert conditional.headers == {}
+    conditional.evaluate(TAG)
+    assert conditional.headers["ETag"] == TAG
+
+
+def test_entity_tag_follows_the_loaded_graph():
+    updated_at = datetime(2026, 1, 1)
+    book = Book(book_id=1, title="1984", publisher="Penguin", updated_at=updated_at,
+                authors=[Author(id=2, first_name="George", last_name="Orwell", updated_at=updated_at)])
+    BookCopy(copy_id=3, book=book, status=BookStatus.AVAILABLE, updated_at=updated_at)
+    etag = BookMapper.book_etag(book)
+    assert BookMapper.book_etag(book) == etag
+    assert BookMapper.projection("title").etag(book) != etag
+
+    book.book_copies[0].updated_at = updated_at + timedelta(seconds=1)
+    assert BookMapper.book_etag(book) != etag
+
+
+def test_unchanged_book_is_not_modified(client, catalog):
+    path = f"/api/book/{catalog['books'][0]}"
+    response = client.get(path)
+    etag = response.headers["ETag"]
+    assert response.headers["Cache-Control"] == "no-cache"
+
+    # once from the DTO cache and once from the database
+    for _ in range(2):
+        revalidated = client.get(path, headers={"If-None-Match": etag})
+        assert revalidated.status_code == 304
+        assert revalidated.headers["ETag"] == etag
+        assert revalidated.content == b""
+        dto_cache.clear()
+
+
+def test_changed_book_gets_a_new_tag(client, catalog):
+    path = f"/api/book/{catalog['books'][0]}"
+    book = client.get(path)
+    copy_id = book.json()["book_copies"][0]["copy_id"]
+    assert client.put(f"/api/book-copy/{copy_id}/status/{BookStatus.BORROWED.value}",
+                      params={"customer_id": catalog["customers"][0]}).status_code == 200
+
+    response = client.get(path, headers={"If-None-Match": book.headers["ETag"]})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != book.headers["ETag"]
+    statuses = {book_copy["copy_id"]: book_copy["status"] for book_copy in response.json()["book_copies"]}
+    assert statuses[copy_id] == BookStatus.BORROWED.value
+
+
+def test_field_selection_has_its_own_tag(client, catalog):
+    path = f"/api/book/{catalog['books'][0]}"
+    etag = client.get(path).headers["ETag"]
+    response = client.get(path, params={"fields": "title"}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json() == {"title": "Book 0"}
+    assert response.headers["ETag"] != etag
@@ -0,0 +1,124 @@
+import pytest
+from bookz.enums.enums import BookStatus
+from bookz.repositories.orm_models import Author, Book, Customer
+from bookz.services import dto_cache as dto_cache_module
+from bookz.services.dto_cache import DTOCache, dto_cache
+from bookz.services.dto_models import FullNameDTO
+
+
+def dto(name: str) -> FullNameDTO:
+    return FullNameDTO(first_name=f"Name {name}", last_name="Cached")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(dto_cache_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = DTOCache(capacity=2, ttl=60)
+    for key in ("a", "b"):
+        cache.set(key, dto(key), key, [], cache.generation())
+    assert cache.get("a") is not None
+    cache.set("c", dto("c"), "c", [], cache.generation())
+    assert cache.get("b") is None
+    assert cache.get("a").dto == dto("a")
+    assert cache.get("c").etag == "c"
+    assert cache.stats().evictions == 1
+
+
+def test_entry_expires_after_ttl(clock):
+    cache = DTOCache(capacity=2, ttl=30)
+    cache.set("a", dto("a"), "a", [("Book", 1)], cache.generation())
+    clock[0] += 29
+    assert cache.get("a") is not None
+    clock[0] += 1
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert (stats.size, stats.expirations, stats.hits, stats.misses) == (0, 1, 1, 1)
+
+
+def test_invalidate_drops_the_entries_that_read_the_row():
+    cache = DTOCache(capacity=10, ttl=60)
+    cache.set("book 1", dto("book"), "1", [("Book", 1), ("Author", 7)], cache.generation())
+    cache.set("book 2", dto("book"), "2", [("Book", 2)], cache.generation())
+    cache.set("author 7", dto("author"), "7", [("Author", 7)], cache.generation())
+
+    cache.invalidate(Author, [7, None])
+    assert cache.get("book 1") is None
+    assert cache.get("author 7") is None
+    assert cache.get("book 2") is not None
+    assert cache.stats().invalidations == 2
+
+    cache.invalidate(Book, [1])
+    assert cache.get("book 2") is not None
+
+
+def test_set_after_an_invalidation_is_dropped():
+    cache = DTOCache(capacity=10, ttl=60)
+    generation = cache.generation()
+    cache.invalidate(Customer, [3])
+    cache.set("customer 3", dto("stale"), "3", [("Customer", 3)], generation)
+    assert cache.get("customer 3") is None
+    cache.set("customer 3", dto("fresh"), "3", [("Customer", 3)], cache.generation())
+    assert cache.get("customer 3").dto == dto("fresh")
+
+
+def test_zero_capacity_caches_nothing():
+    cache = DTOCache(capacity=0, ttl=60)
+    cache.set("a", dto("a"), "a", [], cache.generation())
+    assert cache.stats().size == 0
+
+
+def get_cached(client, path: str) -> dict:
+    """GETs path twice, the second time from the DTO cache."""
+    response = client.get(path)
+    assert response.status_code == 200, response.text
+    hits = dto_cache.stats().hits
+    assert client.get(path).json() == response.json()
+    assert dto_cache.stats().hits == hits + 1
+    return response.json()
+
+
+def test_copy_status_change_evicts_its_book_and_customer(client, catalog):
+    book_id, customer_id = catalog["books"][0], catalog["customers"][0]
+    book = get_cached(client, f"/api/book/{book_id}")
+    assert get_cached(client, f"/api/customer/{customer_id}")["borrowed_books"] == []
+    copy_id = book["book_copies"][0]["copy_id"]
+
+    response = client.put(f"/api/book-copy/{copy_id}/status/{BookStatus.BORROWED.value}",
+                          params={"customer_id": customer_id})
+    assert response.status_code == 200, response.text
+
+    copies = {book_copy["copy_id"]: book_copy
+              for book_copy in client.get(f"/api/book/{book_id}").json()["book_copies"]}
+    assert copies[copy_id]["status"] == BookStatus.BORROWED.value
+    borrowed = client.get(f"/api/customer/{customer_id}").json()["borrowed_books"]
+    assert [book_copy["copy_id"] for book_copy in borrowed] == [copy_id]
+
+
+def test_author_update_evicts_its_author_and_books(client, catalog):
+    author_id, book_id = catalog["authors"][0], catalog["books"][0]
+    author = get_cached(client, f"/api/author/{author_id}")
+    assert get_cached(client, f"/api/book/{book_id}")["authors"][0]["id"] == author_id
+
+    renamed = {"id": author_id, "full_name": {**author["full_name"], "first_name": "Renamed"}}
+    assert client.put("/api/author/", json=renamed).status_code == 200
+
+    assert client.get(f"/api/author/{author_id}").json()["full_name"]["first_name"] == "Renamed"
+    assert client.get(f"/api/book/{book_id}").json()["authors"][0]["full_name"]["first_name"] == "Renamed"
+
+
+def test_email_change_evicts_the_customer(client, catalog):
+    customer_id = catalog["customers"][0]
+    customer = get_cached(client, f"/api/customer/{customer_id}")
+    get_cached(client, f"/api/customer/email/{customer['email']}")
+
+    response = client.put(f"/api/customer/{customer_id}/email/", json={"string": "changed@example.com"})
+    assert response.status_code == 200, response.text
+
+    assert client.get(f"/api/customer/{customer_id}").json()["email"] == "changed@example.com"
+    assert client.get(f"/api/customer/email/{customer['email']}").status_code == 404
+    assert client.get("/api/customer/email/changed@example.com").json()["customer_id"] == customer_id
@@ -0,0 +1,27 @@
+import asyncio
+import csv
+import io
+import json
+import pytest
+from bookz.enums.enums import ExportFormat
+from bookz.services.export import CatalogExporter
+
+
+async def collect(stream) -> bytes:
+    return b"".join([chunk async for chunk in stream])
+
+
+@pytest.mark.parametrize("table", ["books", "book_copies", "customers"])
+def test_ndjson_export_streams_every_batch(async_db, catalog, table):
+    exporter = CatalogExporter(ExportFormat.NDJSON, batch_size=5)
+    lines = asyncio.run(collect(getattr(exporter, table)())).splitlines()
+    assert len(catalog[table]) > exporter.batch_size
+    assert len(lines) == len(catalog[table])
+    assert json.loads(lines[-1])
+
+
+def test_csv_export_writes_one_header(async_db, catalog):
+    exporter = CatalogExporter(ExportFormat.CSV, batch_size=5)
+    rows = list(csv.reader(io.StringIO(asyncio.run(collect(exporter.book_copies())).decode())))
+    assert rows[0][0] == "copy_id"
+    assert [int(row[0]) for row in rows[1:]] == sorted(catalog["book_copies"])
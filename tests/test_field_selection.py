@@ -0,0 +1,85 @@
+import pytest
+from bookz.exceptions.exceptions import FieldSelectionError
+from bookz.mappers.mappers import CustomORMMapper, BookMapper, configuration
+from bookz.repositories.orm_models import Author, Book
+
+
+def test_parse_fields_builds_a_selection_tree():
+    assert CustomORMMapper.parse_fields("title,authors.full_name,book_copies.placement.position") == {
+        "title": None, "authors": {"full_name": None}, "book_copies": {"placement": {"position": None}}}
+
+
+def test_parse_fields_ignores_blanks_and_duplicates():
+    assert CustomORMMapper.parse_fields(" title , ,title,isbn,") == {"isbn": None, "title": None}
+
+
+def test_whole_field_wins_over_its_subfields():
+    assert CustomORMMapper.parse_fields("authors.full_name,authors") == {"authors": None}
+    assert CustomORMMapper.parse_fields("authors,authors.full_name") == {"authors": None}
+
+
+def test_prune_excludes_unselected_fields_and_relationships():
+    config = CustomORMMapper.prune(configuration["BOOK"], CustomORMMapper.parse_fields("title,authors.full_name"))
+    assert "title" not in config["exclude"]
+    assert {"book_id", "isbn", "book_copies"} <= set(config["exclude"])
+    assert list(config["relationships"]) == ["authors"]
+    authors = config["relationships"]["authors"]
+    assert set(authors["exclude"]) == {"id", "books"}
+    assert authors["nested_transform"] == configuration["BOOK"]["relationships"]["authors"]["nested_transform"]
+
+
+def test_prune_selects_everything_under_a_whole_relationship():
+    config = CustomORMMapper.prune(configuration["BOOK"], {"book_copies": None})
+    book_copies = config["relationships"]["book_copies"]
+    assert set(book_copies["exclude"]) == {"book", "customer"}
+    assert list(book_copies["relationships"]) == ["placement"]
+
+
+@pytest.mark.parametrize("depth, relationships", [(0, []), (1, ["authors", "book_copies"]),
+                                                  (None, ["authors", "book_copies"])])
+def test_prune_limits_depth(depth, relationships):
+    config = CustomORMMapper.prune(configuration["BOOK"], None, depth)
+    assert list(config["relationships"]) == relationships
+    if depth == 1:
+        assert config["relationships"]["book_copies"]["relationships"] == {}
+        assert "placement" in config["relationships"]["book_copies"]["exclude"]
+
+
+def test_dto_with_computed_fields_is_mapped_whole():
+    config = CustomORMMapper.prune(configuration["BOOK"],
+                                   CustomORMMapper.parse_fields("book_copies.placement.position_code"))
+    assert config["relationships"]["book_copies"]["relationships"]["placement"]["exclude"] == []
+
+
+def test_prune_leaves_the_configuration_alone():
+    before = repr(configuration["BOOK"])
+    CustomORMMapper.prune(configuration["BOOK"], CustomORMMapper.parse_fields("title"), 0)
+    assert repr(configuration["BOOK"]) == before
+
+
+@pytest.mark.parametrize("fields", ["title,subtitle", "authors.nickname", "title.length"])
+def test_prune_rejects_unknown_fields(fields):
+    with pytest.raises(FieldSelectionError):
+        CustomORMMapper.prune(configuration["BOOK"], CustomORMMapper.parse_fields(fields))
+
+
+def test_sparse_projection_sets_only_the_selected_fields():
+    book = Book(book_id=1, title="1984", publisher="Penguin", isbn="978-01-41-036144",
+                authors=[Author(id=2, first_name="George", last_name="Orwell")])
+    dto = BookMapper.projection("title,authors.full_name").convert(book)
+    assert dto.model_dump(exclude_unset=True) == {
+        "title": "1984", "authors": [{"full_name": {"first_name": "George", "last_name": "Orwell",
+                                                    "middle_name": None}}]}
+
+
+def test_book_endpoint_returns_the_selected_fields(client, catalog):
+    book_id = catalog["books"][0]
+    response = client.get(f"/api/book/{book_id}", params={"fields": "title,book_copies.placement.position"})
+    assert response.status_code == 200, response.text
+    book = response.json()
+    assert set(book) == {"title", "book_copies"}
+    assert [set(book_copy) for book_copy in book["book_copies"]] == [{"placement"}] * 2
+    assert all(book_copy["placement"]["position_code"] for book_copy in book["book_copies"])
+
+    assert "authors" not in client.get(f"/api/book/{book_id}", params={"depth": 0}).json()
+    assert client.get(f"/api/book/{book_id}", params={"fields": "subtitle"}).status_code == 400
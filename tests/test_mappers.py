@@ -0,0 +1,151 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy.orm import make_transient_to_detached
+from bookz.enums.enums import BookStatement, BookStatus, PlacementStatus
+from bookz.mappers.mappers import CustomORMMapper, configuration
+from bookz.services.dto_models import AuthorDTO, BookDTO, FullNameDTO
+from bookz.repositories.orm_models import Author, Book, BookCopy, Customer, Placement
+
+ROOT_CLASSES = {"AUTHOR": Author, "BOOK": Book, "BOOK_COPY": BookCopy, "CUSTOMER": Customer,
+                "BOOK_EXPORT": Book, "BOOK_SEARCH": Book, "BOOK_COPY_EXPORT": BookCopy, "CUSTOMER_EXPORT": Customer}
+UPDATED_AT = datetime(2026, 1, 1)
+
+
+def library() -> dict[type, list]:
+    """Detached ORM graph of two books that share an author, with copies on shelves and one customer borrowing.
+
+    Every instance has the identity of its primary key, like one loaded from the database, and every attribute a
+    converter reads is set.
+    """
+    orwell = Author(id=1, first_name="George", last_name="Orwell", middle_name=None)
+    huxley = Author(id=2, first_name="Aldous", last_name="Huxley", middle_name="Leonard")
+    books = [Book(book_id=1, title="1984", publisher="Penguin", place_of_publication="London", published_year=2008,
+                  isbn="978-01-41-036144", pages=336, price=854.0, language="en", authors=[orwell]),
+             Book(book_id=2, title="Brave New World", publisher="Vintage", place_of_publication="London",
+                  published_year=2007, isbn="978-00-99-518471", pages=288, price=None, language="en",
+                  authors=[huxley, orwell])]
+    customer = Customer(customer_id=1, first_name="John", last_name="Doe", middle_name=None,
+                        email="john.doe@example.com", phone="+380661234567")
+    copies = []
+    for copy_id in range(1, 5):
+        placement = Placement(id=copy_id, line_id="A", column_id=copy_id, shelf_id="B", position=copy_id,
+                              status=PlacementStatus.OCCUPIED)
+        copies.append(BookCopy(copy_id=copy_id, book=books[copy_id % 2], status=BookStatus.AVAILABLE,
+                               statement=BookStatement.GOOD, placement=placement))
+    for book_copy in copies[1:]:
+        book_copy.customer = None
+    copies[0].status, copies[0].customer = BookStatus.BORROWED, customer
+    graph = {Author: [orwell, huxley], Book: books, BookCopy: copies, Customer: [customer],
+             Placement: [book_copy.placement for book_copy in copies]}
+    for instance in (instance for instances in graph.values() for instance in instances):
+        instance.updated_at = UPDATED_AT
+        make_transient_to_detached(instance)
+    return graph
+
+
+@pytest.mark.parametrize("config_name", sorted(ROOT_CLASSES))
+def test_trusted_converter_gives_the_validated_dto(config_name):
+    config = configuration[config_name]
+    validating, trusting = CustomORMMapper.compile(config), CustomORMMapper.compile(config, trusted=True)
+    for instance in library()[ROOT_CLASSES[config_name]]:
+        validated, trusted = validating(instance), trusting(instance)
+        assert trusted == validated
+        assert trusted.model_fields_set == validated.model_fields_set
+        assert trusted.model_dump_json() == validated.model_dump_json()
+
+
+def self_referential_config() -> dict:
+    """Authors with their books with their authors and so on, as deep as max_depth lets it go."""
+    author = {"dto": AuthorDTO, "nested_transform": {"full_name": {
+        "dto": FullNameDTO, "orm_fields": ["first_name", "last_name", "middle_name"]}}}
+    author["relationships"] = {"books": {"dto": BookDTO, "exclude": ["book_copies"],
+                                         "relationships": {"authors": author}}}
+    return author
+
+
+@pytest.mark.parametrize("config_name", sorted(ROOT_CLASSES))
+def test_compiled_converter_matches_map_recursively(config_name):
+    config = configuration[config_name]
+    convert = CustomORMMapper.compile(config)
+    for instance in library()[ROOT_CLASSES[config_name]]:
+        assert convert(instance) == CustomORMMapper.map_recursively(instance, config)
+
+
+@pytest.mark.parametrize("max_depth", [1, 2, 3])
+def test_compiled_converter_stops_at_max_depth(max_depth):
+    config = configuration["CUSTOMER"]
+    customer, = library()[Customer]
+    dto = CustomORMMapper.compile(config, max_depth)(customer)
+    assert dto == CustomORMMapper.map_recursively(customer, config, max_depth)
+    # customer -> borrowed_books -> book -> authors, the first level past max_depth is None
+    levels = [dto, dto.borrowed_books[0] if dto.borrowed_books else None]
+    levels.append(levels[-1].book if levels[-1] else None)
+    levels.append(levels[-1].authors if levels[-1] else None)
+    assert [level is not None for level in levels] == [depth < max_depth for depth in range(4)]
+
+
+@pytest.mark.parametrize("max_depth", [1, 3, 5])
+def test_cyclic_graph_is_mapped_up_to_max_depth(max_depth):
+    config = self_referential_config()
+    orwell = library()[Author][0]
+    dto = CustomORMMapper.compile(config, max_depth)(orwell)
+    assert dto == CustomORMMapper.map_recursively(orwell, config, max_depth)
+    # author -> books -> authors -> books ..., the first level past max_depth is None
+    depth, node = 1, dto
+    while (nested := node.books if depth % 2 else node.authors) is not None:
+        depth, node = depth + 1, nested[0]
+    assert depth == max_depth
+    assert CustomORMMapper.compile_dependencies(config, max_depth)(orwell) == (
+        {("Author", 1)} if max_depth == 1 else {("Author", 1), ("Author", 2), ("Book", 1), ("Book", 2)})
+    assert CustomORMMapper.compile_version(config, max_depth)(orwell) is not None
+
+
+@pytest.mark.parametrize("config_name, root, rows", [
+    ("BOOK", 0, {("Book", 1), ("Author", 1), ("BookCopy", 2), ("BookCopy", 4), ("Placement", 2), ("Placement", 4)}),
+    ("CUSTOMER", 0, {("Customer", 1), ("BookCopy", 1), ("Book", 2), ("Author", 1), ("Author", 2)}),
+    ("BOOK_COPY_EXPORT", 0, {("BookCopy", 1), ("Placement", 1), ("Book", 2)}),
+])
+def test_dependencies_are_the_rows_the_converter_reads(config_name, root, rows):
+    config = configuration[config_name]
+    instances = library()[ROOT_CLASSES[config_name]]
+    assert CustomORMMapper.compile_dependencies(config)(instances[root]) == rows
+    assert CustomORMMapper.compile_dependencies(config, max_depth=1)(instances[root]) == {
+        row for row in rows if row[0] == ROOT_CLASSES[config_name].__name__}
+
+
+def test_version_follows_only_the_rows_the_converter_reads():
+    graph = library()
+    version = CustomORMMapper.compile_version(configuration["BOOK"])
+    book = graph[Book][1]
+    before = version(book)
+    assert version(book) == before
+
+    # the customer of a copy is excluded from the BOOK representation
+    graph[Customer][0].updated_at = UPDATED_AT + timedelta(seconds=1)
+    assert version(book) == before
+    book.book_copies[0].placement.updated_at = UPDATED_AT + timedelta(seconds=1)
+    assert version(book) != before
+    changed = version(book)
+    book.authors.pop()
+    assert version(book) != changed
+
+
+def test_copy_has_its_book_only_outside_of_it():
+    graph = library()
+    book_copy = graph[BookCopy][1]
+    assert CustomORMMapper.compile(configuration["BOOK_COPY"])(book_copy).book.book_id == 1
+    book = CustomORMMapper.compile(configuration["BOOK"])(graph[Book][0])
+    assert [(listed.copy_id, listed.book) for listed in book.book_copies] == [(2, None), (4, None)]
+    author = CustomORMMapper.compile(configuration["AUTHOR"])(graph[Author][0])
+    assert {listed.book for listed in author.books[0].book_copies} == {None}
+
+
+def test_copies_listed_under_a_book_leave_out_the_book(client, catalog):
+    book_id, author_id = catalog["books"][0], catalog["authors"][0]
+    book_copies = client.get(f"/api/book/{book_id}").json()["book_copies"]
+    assert book_copies and all(book_copy["book"] is None for book_copy in book_copies)
+    books = client.get(f"/api/author/{author_id}").json()["books"]
+    assert books and all(book_copy["book"] is None for book in books for book_copy in book["book_copies"])
+
+    book_copy = client.get(f"/api/book-copy/{book_copies[0]['copy_id']}").json()
+    assert book_copy["book"]["book_id"] == book_id
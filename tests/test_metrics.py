@@ -0,0 +1,81 @@
+import re
+import pytest
+from sqlalchemy import create_engine, text
+from bookz.metrics import MetricsRegistry, RequestStats, instrument_engine, metrics_registry, request_stats
+
+
+def samples(rendered: str) -> dict[str, float]:
+    return {name: float(value) for name, value in
+            (line.rsplit(" ", 1) for line in rendered.splitlines() if not line.startswith("#"))}
+
+
+def request(queries: int, rows: int = 0) -> RequestStats:
+    stats = RequestStats()
+    stats.queries, stats.rows, stats.db_seconds = queries, rows, 0.001 * queries
+    return stats
+
+
+def test_render_counts_and_buckets_per_route():
+    registry = MetricsRegistry()
+    for queries in (0, 3, 3, 250):
+        registry.record("GET", "/api/book/{book_id}", request(queries, rows=2))
+    registry.record("POST", "/api/book/", request(5))
+    rendered = registry.render(["bookz_extra 1"])
+    assert "# TYPE bookz_db_queries_per_request histogram" in rendered
+    assert rendered.endswith("bookz_extra 1\n")
+
+    book = samples(rendered)
+    labels = 'method="GET",route="/api/book/{book_id}"'
+    assert book[f"bookz_http_requests_total{{{labels}}}"] == 4
+    assert book[f"bookz_db_queries_total{{{labels}}}"] == 256
+    assert book[f"bookz_db_rows_total{{{labels}}}"] == 8
+    buckets = {bound: book[f'bookz_db_queries_per_request_bucket{{{labels},le="{bound}"}}']
+               for bound in ("1", "2", "3", "5", "200", "+Inf")}
+    assert buckets == {"1": 1, "2": 1, "3": 3, "5": 3, "200": 3, "+Inf": 4}
+    assert book[f"bookz_db_queries_per_request_sum{{{labels}}}"] == 256
+    assert book[f"bookz_db_queries_per_request_count{{{labels}}}"] == 4
+    assert book['bookz_db_queries_per_request_count{method="POST",route="/api/book/"}'] == 1
+
+
+def test_rows_without_a_rowcount_are_counted_as_fetched():
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+    stats = RequestStats()
+    with engine.connect() as connection:
+        connection.execute(text("CREATE TABLE shelves (id INTEGER PRIMARY KEY)"))
+        connection.execute(text("INSERT INTO shelves (id) VALUES (1), (2), (3), (4), (5)"))
+        token = request_stats.set(stats)
+        try:
+            result = connection.execute(text("SELECT id FROM shelves"))
+            assert stats.rows == 0
+            assert [row.id for row in result.fetchmany(2)] == [1, 2]
+            assert len(result.fetchall()) == 3
+        finally:
+            request_stats.reset(token)
+    assert (stats.queries, stats.rows) == (1, 5)
+
+
+@pytest.fixture
+def registry():
+    metrics_registry.reset()
+    yield metrics_registry
+    metrics_registry.reset()
+
+
+def test_request_is_recorded_under_its_route(client, catalog, registry):
+    assert client.get(f"/api/book/{catalog['books'][0]}").status_code == 200
+    assert len(client.get("/api/export/books").content.splitlines()) == len(catalog["books"])
+    assert client.get("/api/book/not-a-number").status_code == 422
+
+    rendered = samples(client.get("/metrics").text)
+    book = 'method="GET",route="/api/book/{book_id}"'
+    assert rendered[f"bookz_http_requests_total{{{book}}}"] == 2
+    assert rendered[f"bookz_db_queries_total{{{book}}}"] >= 1
+    assert rendered[f"bookz_db_rows_total{{{book}}}"] >= 1
+    assert rendered[f'bookz_db_queries_per_request_bucket{{{book},le="+Inf"}}'] == 2
+    assert rendered[f"bookz_db_queries_per_request_count{{{book}}}"] == 2
+    # the export streams its books from a server-side cursor that reports no rowcount
+    export = 'method="GET",route="/api/export/books"'
+    assert rendered[f"bookz_db_rows_total{{{export}}}"] >= len(catalog["books"])
+    assert rendered[f"bookz_mapper_seconds_total{{{export}}}"] > 0
+    assert not any(re.search(r'route="/metrics"', name) for name in rendered)
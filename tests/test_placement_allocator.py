@@ -0,0 +1,135 @@
+import asyncio
+import threading
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+from bookz.enums.enums import BookStatus, PlacementLocality, PlacementStatus
+from bookz.repositories.async_repository import AsyncBookRepository
+from bookz.repositories.orm_models import Book, BookCopy, Placement
+from bookz.repositories.placement_allocator import LOCALITY_SCOPES, allocation_scopes, free_places_stmt
+
+ANCHOR = Placement(id=7, line_id="B", column_id=2, shelf_id="C", position=4)
+
+
+def compiled(stmt) -> str:
+    return str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+@pytest.mark.parametrize("locality", list(PlacementLocality))
+def test_scopes_widen_from_the_anchor_to_the_whole_depository(locality):
+    scopes = allocation_scopes(ANCHOR, locality)
+    assert scopes[-1] == ()
+    assert all(set(wider) < set(narrower) for narrower, wider in zip(scopes, scopes[1:]))
+    assert allocation_scopes(None, locality) == [()]
+
+
+def test_locality_scope_filters_on_the_anchor_slot():
+    sql = compiled(free_places_stmt(3, anchor=ANCHOR, scope=LOCALITY_SCOPES[PlacementLocality.SHELF][0],
+                                    exclude_ids=[11, 12]))
+    assert ("WHERE placements.status = 'FREE' AND placements.line_id = 'B' AND placements.column_id = 2 "
+            "AND placements.shelf_id = 'C' AND (placements.id NOT IN (11, 12))") in sql
+    # Depository order is the column order of ix_placement_free_slot, the index gives the slots already sorted
+    assert "ORDER BY placements.line_id, placements.column_id, placements.shelf_id, placements.position" in sql
+    assert sql.endswith("LIMIT 3 FOR UPDATE SKIP LOCKED")
+    assert "SKIP LOCKED" not in compiled(free_places_stmt(3, skip_locked=False))
+
+
+def seed_depository(db_engine, occupied: int = 0) -> dict[str, int]:
+    """Free slots in lines A and B, 2 columns, shelves C and D and 5 positions each, and a book shelved on B2C.
+
+    The first `occupied` slots in depository order are taken, to give the planner a realistic share of free ones.
+    """
+    with Session(db_engine) as session:
+        places = [Placement(line_id=line_id, column_id=column_id, shelf_id=shelf_id, position=position,
+                            status=PlacementStatus.FREE)
+                  for line_id in "AB" for column_id in (1, 2) for shelf_id in "CD" for position in range(1, 6)]
+        for place in places[:occupied]:
+            place.status = PlacementStatus.OCCUPIED
+        anchor = next(place for place in places if (place.line_id, place.column_id, place.shelf_id,
+                                                     place.position) == ("B", 2, "C", 3))
+        anchor.status = PlacementStatus.OCCUPIED
+        book = Book(title="The Hobbit", publisher="Allen & Unwin", place_of_publication="London",
+                    published_year=1937, isbn="978-30-00-000001", pages=310)
+        session.add_all([*places, BookCopy(book=book, status=BookStatus.AVAILABLE, placement=anchor)])
+        session.commit()
+        return {"book": book.book_id, **{f"{place.line_id}{place.column_id}{place.shelf_id}{place.position}": place.id
+                                         for place in places}}
+
+
+def find_free_place(async_db, number: int, book_id: int, locality: PlacementLocality) -> list[int]:
+    from bookz import db
+
+    async def allocate() -> list[int]:
+        async with db.AsyncSessionLocal() as session, session.begin():
+            return await AsyncBookRepository(session).find_free_place(number, book_id, locality)
+
+    return asyncio.run(allocate())
+
+
+@pytest.mark.parametrize("locality, expected", [
+    (PlacementLocality.NONE, ["A1C1", "A1C2", "A1C3", "A1C4", "A1C5", "A1D1"]),
+    (PlacementLocality.LINE, ["B1C1", "B1C2", "B1C3", "B1C4", "B1C5", "B1D1"]),
+    (PlacementLocality.COLUMN, ["B2C1", "B2C2", "B2C4", "B2C5", "B2D1", "B2D2"]),
+    (PlacementLocality.SHELF, ["B2C1", "B2C2", "B2C4", "B2C5", "B2D1", "B2D2"]),
+])
+def test_copies_go_next_to_their_book(async_db, db_engine, locality, expected):
+    depository = seed_depository(db_engine)
+    assert find_free_place(async_db, 6, depository["book"], locality) == [depository[slot] for slot in expected]
+
+
+def test_full_shelf_spills_over_to_the_next_scope(async_db, db_engine):
+    depository = seed_depository(db_engine)
+    places = find_free_place(async_db, 12, depository["book"], PlacementLocality.SHELF)
+    # the anchor shelf, then its column, then its line, then the depository
+    assert places == [depository[slot] for slot in ("B2C1", "B2C2", "B2C4", "B2C5", "B2D1", "B2D2", "B2D3",
+                                                    "B2D4", "B2D5", "B1C1", "B1C2", "B1C3")]
+    assert len(find_free_place(async_db, 100, depository["book"], PlacementLocality.SHELF)) == 39
+
+
+def test_concurrent_allocations_get_distinct_slots(db_engine):
+    seed_depository(db_engine)
+    writers, batch = 8, 4
+    selected_all = threading.Barrier(writers, timeout=10)
+    allocations: list[list[int]] = []
+
+    def allocate() -> None:
+        with Session(db_engine) as session, session.begin():
+            places = list(session.scalars(free_places_stmt(batch)).all())
+            allocations.append(places)
+            # every writer holds its locks until all of them have selected theirs
+            selected_all.wait()
+
+    threads = [threading.Thread(target=allocate) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [len(places) for places in allocations] == [batch] * writers
+    assert len({place for places in allocations for place in places}) == writers * batch
+
+
+def test_locked_slots_block_without_skip_locked(db_engine):
+    seed_depository(db_engine)
+    with Session(db_engine) as first, first.begin():
+        taken = first.scalars(free_places_stmt(2)).all()
+        with Session(db_engine) as second, second.begin():
+            assert set(second.scalars(free_places_stmt(2)).all()).isdisjoint(taken)
+            second.execute(text("SET LOCAL lock_timeout = '100ms'"))
+            with pytest.raises(Exception, match="lock"):
+                second.scalars(free_places_stmt(2, skip_locked=False)).all()
+
+
+def test_free_slots_are_found_through_the_partial_index(db_engine):
+    # Most slots are occupied, as in a filled depository, so the partial index of the free ones is the cheap path
+    seed_depository(db_engine, occupied=36)
+    with Session(db_engine) as session, session.begin():
+        session.execute(text("INSERT INTO placements (line_id, column_id, shelf_id, position, status) "
+                             "SELECT 'Z', c, 'A', p, 'OCCUPIED' FROM generate_series(1, 50) c, "
+                             "generate_series(1, 100) p"))
+        session.execute(text("ANALYZE placements"))
+    stmt = free_places_stmt(3).compile(db_engine, compile_kwargs={"literal_binds": True})
+    with Session(db_engine) as session, session.begin():
+        plan = "\n".join(session.scalars(text(f"EXPLAIN {stmt}")))
+    assert "ix_placement_free_slot" in plan
+    assert "Sort" not in plan
@@ -0,0 +1,99 @@
+import pytest
+from sqlalchemy import ForeignKey, create_engine, select
+from sqlalchemy.orm import DeclarativeBase, Mapped, Session, joinedload, mapped_column, relationship, selectinload
+from bookz.exceptions.exceptions import QueryPatternDetected
+from bookz.query_audit import QueryAudit, audit_engine
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+class Shelf(Base):
+    __tablename__ = "shelves"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    volumes: Mapped[list["Volume"]] = relationship(back_populates="shelf")
+    labels: Mapped[list["Label"]] = relationship()
+
+
+class Volume(Base):
+    __tablename__ = "volumes"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    shelf_id: Mapped[int] = mapped_column(ForeignKey("shelves.id"))
+    shelf: Mapped[Shelf] = relationship(back_populates="volumes")
+
+
+class Label(Base):
+    __tablename__ = "labels"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    shelf_id: Mapped[int] = mapped_column(ForeignKey("shelves.id"))
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    audit_engine(engine)
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all([Shelf(id=shelf_id, volumes=[Volume(id=shelf_id * 10 + i) for i in range(3)])
+                         for shelf_id in range(1, 7)])
+        # Shelves whose volumes and labels joined together multiply into 25 and 16 rows
+        session.add_all([Shelf(id=shelf_id, volumes=[Volume(id=shelf_id * 10 + i) for i in range(size)],
+                               labels=[Label(id=shelf_id * 10 + i) for i in range(size)])
+                         for shelf_id, size in ((7, 5), (8, 4))])
+        session.commit()
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+def test_lazy_load_per_instance_raises_n_plus_one(session):
+    with pytest.raises(QueryPatternDetected, match=r"N\+1: 8x SELECT"):
+        with QueryAudit("list_shelves", mode="raise", repeats=5):
+            for shelf in session.scalars(select(Shelf)).all():
+                len(shelf.volumes)
+
+
+def test_eager_load_passes(session):
+    with QueryAudit("list_shelves", mode="raise", repeats=5) as audit:
+        for shelf in session.scalars(select(Shelf).options(selectinload(Shelf.volumes))).all():
+            len(shelf.volumes)
+    assert len(audit.statements) == 2
+    assert audit.findings() == []
+
+
+def test_nested_audit_joins_the_outer_one(session):
+    with QueryAudit("outer", mode="raise") as outer:
+        with QueryAudit("inner", mode="raise") as inner:
+            session.scalars(select(Shelf)).all()
+    assert len(outer.statements) == 1
+    assert inner.statements == []
+
+
+def find_shelf(session, shelf_id: int, *options) -> Shelf:
+    shelf = session.scalars(select(Shelf).where(Shelf.id == shelf_id).options(*options)).unique().one()
+    len(shelf.volumes), len(shelf.labels)
+    return shelf
+
+
+def test_joinedload_of_two_collections_raises_row_explosion(session):
+    with pytest.raises(QueryPatternDetected, match="Row explosion: 25 rows for 5 distinct (Volume|Label)"):
+        with QueryAudit("find_shelf", mode="raise", row_ratio=3.0, min_rows=20):
+            find_shelf(session, 7, joinedload(Shelf.volumes), joinedload(Shelf.labels))
+
+
+def test_selectinload_of_two_collections_passes(session):
+    with QueryAudit("find_shelf", mode="raise", row_ratio=3.0, min_rows=20) as audit:
+        find_shelf(session, 7, selectinload(Shelf.volumes), selectinload(Shelf.labels))
+    assert [record.rows for record in audit.statements] == [1, 5, 5]
+    assert audit.findings() == []
+
+
+def test_rows_below_min_rows_are_not_flagged(session):
+    with QueryAudit("find_shelf", mode="raise", row_ratio=3.0, min_rows=20) as audit:
+        find_shelf(session, 8, joinedload(Shelf.volumes), joinedload(Shelf.labels))
+    assert [record.rows for record in audit.statements] == [16]
+    assert audit.findings() == []
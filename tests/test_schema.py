@@ -0,0 +1,21 @@
+from sqlalchemy import create_engine, text
+from bookz.repositories.orm_models import (Base, CHANGE_FEED_COLUMNS, CHANGE_FEED_OPERATIONS,
+                                           change_feed_trigger_name)
+
+
+def test_create_all_builds_an_empty_database(postgres_url):
+    engine = create_engine(postgres_url)
+    try:
+        Base.metadata.create_all(engine)
+        with engine.connect() as connection:
+            triggers = set(connection.scalars(text("SELECT tgname FROM pg_trigger WHERE NOT tgisinternal")))
+            tables = set(connection.scalars(text("SELECT tablename FROM pg_tables WHERE schemaname = 'public'")))
+    finally:
+        engine.dispose()
+    assert tables == set(Base.metadata.tables)
+    assert triggers == {change_feed_trigger_name(table_name, operation)
+                        for table_name in CHANGE_FEED_COLUMNS for operation in CHANGE_FEED_OPERATIONS}
+
+
+def test_create_all_runs_again_on_an_existing_database(db_engine):
+    Base.metadata.create_all(db_engine)
@@ -0,0 +1,111 @@
+import logging
+import time
+from pathlib import Path
+from types import SimpleNamespace
+import pytest
+from bookz import slow_query
+from bookz.slow_query import SlowQueryLog
+
+SELECT = "SELECT books.book_id, books.title FROM books WHERE books.isbn IN (%(isbn_1)s, %(isbn_2)s)"
+
+
+class Worker:
+    """Stands in for the ExplainWorker, the explained statements are only collected."""
+
+    def __init__(self) -> None:
+        self.submitted = []
+
+    def submit(self, qid: str, statement: str, parameters) -> bool:
+        self.submitted.append((statement, parameters))
+        return True
+
+
+@pytest.fixture
+def slow_log(caplog, monkeypatch):
+    # The slow_query logger doesn't propagate to the root logger that caplog listens on
+    slow_query.slow_query_logger.addHandler(caplog.handler)
+    # Frames of this file count as repository methods, so the caller is found as in the repositories
+    monkeypatch.setattr(slow_query, "REPOSITORIES_DIR", str(Path(__file__).resolve().parent))
+    log = SlowQueryLog("postgresql://localhost/bookz", threshold_ms=50, sample=1.0, interval=300)
+    log.worker = Worker()
+    caplog.set_level(logging.INFO, logger="slow_query")
+    yield log
+    slow_query.slow_query_logger.removeHandler(caplog.handler)
+
+
+def run_statement(log: SlowQueryLog, statement: str = SELECT, parameters=None, seconds: float = 0.1,
+                  executemany: bool = False) -> None:
+    """Calls the listener as the engine does after a statement that took this long."""
+    connection = SimpleNamespace(info={"slow_query_start": [time.perf_counter() - seconds]})
+    log.after_cursor_execute(connection, SimpleNamespace(rowcount=2), statement,
+                             {"isbn_1": "978-01-41-036144", "isbn_2": "978-00-99-518471"} if parameters is None
+                             else parameters, None, executemany)
+
+
+def test_slow_statement_is_logged_with_parameters_and_caller(slow_log, caplog):
+    run_statement(slow_log)
+    record, = caplog.records
+    assert record.levelno == logging.WARNING
+    assert "ms, 2 rows in" in record.getMessage()
+    assert "run_statement" in record.getMessage()
+    assert "WHERE books.isbn IN (...)" in record.getMessage()
+    assert "parameters: {'isbn_1': '978-01-41-036144', 'isbn_2': '978-00-99-518471'}" in record.getMessage()
+    assert slow_log.worker.submitted == [(SELECT, {"isbn_1": "978-01-41-036144", "isbn_2": "978-00-99-518471"})]
+
+
+def test_fast_statement_is_not_logged(slow_log, caplog):
+    run_statement(slow_log, seconds=0.01)
+    assert caplog.records == []
+    assert slow_log.worker.submitted == []
+
+
+def test_long_parameters_are_truncated(slow_log, caplog):
+    run_statement(slow_log, parameters={"ids": list(range(1000))})
+    assert f"... ({len(repr({'ids': list(range(1000))}))} chars)" in caplog.records[0].getMessage()
+
+
+@pytest.mark.parametrize("statement, executemany", [
+    ("UPDATE book_copies SET status = %(status)s WHERE book_copies.copy_id = %(copy_id)s", False),
+    ("INSERT INTO authors (first_name, last_name) VALUES (%(first_name)s, %(last_name)s)", True),
+    ("DELETE FROM book_copies WHERE book_copies.copy_id = %(copy_id)s", False),
+    ("SELECT book_copies.copy_id FROM book_copies WHERE book_copies.copy_id = %(copy_id)s FOR UPDATE", False),
+    ("SELECT customers.customer_id FROM customers FOR UPDATE OF customers SKIP LOCKED", False),
+    ("WITH moved AS (UPDATE placements SET status = 'FREE' RETURNING id) SELECT count(*) FROM moved", False),
+])
+def test_only_plain_reads_are_explained(slow_log, caplog, statement, executemany):
+    run_statement(slow_log, statement, parameters={}, executemany=executemany)
+    assert len(caplog.records) == 1
+    assert slow_log.worker.submitted == []
+
+
+def test_explain_follows_the_sample(slow_log, monkeypatch):
+    slow_log.sample = 0.5
+    monkeypatch.setattr(slow_query.random, "random", lambda: 0.7)
+    run_statement(slow_log)
+    assert slow_log.worker.submitted == []
+    monkeypatch.setattr(slow_query.random, "random", lambda: 0.3)
+    run_statement(slow_log)
+    assert len(slow_log.worker.submitted) == 1
+
+    slow_log.sample = 0.0
+    run_statement(slow_log, "SELECT authors.id FROM authors")
+    assert len(slow_log.worker.submitted) == 1
+
+
+def test_each_shape_is_explained_once_per_interval(slow_log, caplog, monkeypatch):
+    run_statement(slow_log)
+    run_statement(slow_log, parameters={"isbn_1": "978-00-00-000000", "isbn_2": "978-00-00-000001"})
+    run_statement(slow_log, "SELECT authors.id FROM authors")
+    assert [statement for statement, _ in slow_log.worker.submitted] == [SELECT, "SELECT authors.id FROM authors"]
+    assert len(caplog.records) == 3
+
+    now = time.monotonic()
+    monkeypatch.setattr(slow_query.time, "monotonic", lambda: now + slow_log.interval + 1)
+    run_statement(slow_log)
+    assert len(slow_log.worker.submitted) == 3
+
+
+def test_full_queue_is_logged(slow_log, caplog):
+    slow_log.worker.submit = lambda qid, statement, parameters: False
+    run_statement(slow_log)
+    assert caplog.records[-1].getMessage().endswith("EXPLAIN skipped, queue full")
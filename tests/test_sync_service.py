@@ -0,0 +1,55 @@
+import inspect
+import pytest
+from sqlalchemy.orm import sessionmaker
+from bookz.enums.enums import BookStatus
+from bookz.exceptions.exceptions import BookPresentInDatabase
+from bookz.repositories.async_repository import AsyncBookRepository
+from bookz.repositories.repository import BookRepository
+from bookz.services.async_service import AsyncBookService
+from bookz.services.dto_models import FullNameDTO, NewAuthorDTO, NewBookDTO
+from bookz.services.service import BookService
+
+
+def methods(cls) -> dict[str, list[inspect.Parameter]]:
+    # The return types differ where the async methods give an async result
+    return {name: list(inspect.signature(method).parameters.values())
+            for name, method in inspect.getmembers(cls, inspect.isfunction) if not name.startswith("__")}
+
+
+@pytest.mark.parametrize("sync_cls, async_cls", [(BookService, AsyncBookService),
+                                                 (BookRepository, AsyncBookRepository)])
+def test_sync_twin_has_the_methods_of_the_async_class(sync_cls, async_cls):
+    assert methods(sync_cls) == methods(async_cls)
+
+
+@pytest.fixture
+def service(db_engine, async_db):
+    """Gives a BookService on a new session of the test database per call, as db.get_session() does in a script."""
+    sessions = []
+
+    def new_service() -> BookService:
+        sessions.append(sessionmaker(bind=db_engine, autoflush=False)())
+        return BookService(sessions[-1])
+
+    yield new_service
+    for session in sessions:
+        session.close()
+
+
+def test_script_creates_and_borrows_through_the_sync_service(service, catalog):
+    tolkien = NewAuthorDTO(full_name=FullNameDTO(first_name="John", last_name="Tolkien", middle_name=None))
+    hobbit = dict(title="The Hobbit", publisher="Allen & Unwin", place_of_publication="London", published_year=1937,
+                  isbn="978-30-00-000001", pages=310)
+    book = service().create_book(NewBookDTO(**hobbit, authors=[tolkien], new_copies=2))
+    assert [author.full_name.last_name for author in book.authors] == ["Tolkien"]
+    assert service().find_author_by_full_name(tolkien.full_name).id == book.authors[0].id
+    with pytest.raises(BookPresentInDatabase):
+        service().create_book(NewBookDTO(**{**hobbit, "title": "Reprint"}, new_copies=1))
+
+    copy_ids = [copy.copy_id for copy in service().find_book_by_isbn("978-30-00-000001").book_copies]
+    customer_id = catalog["customers"][0]
+    borrowed = service().borrow_book_copies(copy_ids, customer_id)
+    assert {(copy.status, copy.customer.customer_id) for copy in borrowed} == {(BookStatus.BORROWED, customer_id)}
+    assert {copy.status for copy in service().return_book_copies(copy_ids)} == {BookStatus.AVAILABLE}
+    assert [hit.book.title for hit in service().search_books("hobbit").items] == ["The Hobbit"]
+    assert service().depository_status().total_places == 40